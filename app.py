@@ -1,11 +1,42 @@
 # app.py
+import pandas as pd
 import streamlit as st
 
+from utils.warmup import start_warmup
+
 st.set_page_config(
     page_title="Аэропорт Дашборд",
     page_icon="🛫",
     layout="wide"
 )
 
+# Прогрев всех источников в фоне: страницы открываются уже из готовых кэшей
+warmup = start_warmup()
+
 st.title("Добро пожаловать в дашборд аэропорта Анапа")
 st.markdown("Выберите раздел в меню слева для анализа данных.")
+
+
+# Пока прогрев идёт, блок обновляется раз в секунду; после него таймер не нужен
+refresh = None if warmup.finished else 1
+
+
+@st.fragment(run_every=refresh)
+def render_warmup():
+    share, rows = warmup.progress()
+    if refresh and warmup.finished:
+        # Прогрев закончился: перезапуск страницы определит фрагмент уже без таймера
+        st.rerun()
+    if warmup.finished:
+        failed = [row["Источник"] for row in rows if row["Ошибка"]]
+        if failed:
+            st.warning("Не удалось загрузить: " + ", ".join(failed))
+        else:
+            st.success("Данные загружены, все разделы готовы к работе")
+    else:
+        st.progress(share, text=f"Загрузка данных: {share:.0%}")
+    with st.expander("Состояние источников", expanded=not warmup.finished):
+        st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+
+render_warmup()
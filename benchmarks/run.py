@@ -0,0 +1,249 @@
+# benchmarks/run.py
+#
+# Замеры путей данных дашборда без браузера:
+# python -m benchmarks.run --sizes 100k,1m [--repeat 3] [--compare benchmarks/results/baseline.json]
+#
+# Для каждого размера генерируется синтетический transformed.csv, затем по этапам замеряются
+# время и пик RSS процесса: загрузка CSV, Arrow-кэш, индекс фильтров, куб, дозагрузка,
+# и вычисления каждого render_* метода PassengerDashboard (Streamlit работает в bare mode,
+# виджеты возвращают значения по умолчанию). Методы дашборда замеряются дважды: <метод> — с кэшами
+# секций, st.cache_data и производных ресурсов, очищенными перед каждым запуском (хранилище рейсов
+# остаётся), и <метод>.cached — повторный вызов с готовыми кэшами. render_by_time считает только
+# выбранное представление, поэтому замеряется для каждого: render_by_time:<представление>.
+
+import argparse
+import gc
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+import psutil
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = os.path.join(ROOT, "benchmarks", ".work")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.synthetic import parse_size, write_csv  # noqa: E402
+
+RENDER_METHODS = [
+    "render_sidebar_filters", "render_main_metrics", "render_by_time", "render_delay_relation",
+    "render_airline_comparison", "render_anomaly_detection", "render_forecast",
+]
+
+# Представления render_by_time: (номер варианта переключателя, уровень детализации или None)
+TIME_VIEWS = {
+    "year": (0, "Год"), "month": (0, "Месяц"), "week": (0, "Неделя"), "day": (0, "День"),
+    "weekday": (1, None), "time_of_day": (2, None), "heatmap": (3, None), "month_by_year": (4, None),
+}
+
+
+class PeakRSS:
+    # Фоновый опрос RSS: пик памяти этапа относительно его начала
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.process = psutil.Process()
+
+    def __enter__(self):
+        gc.collect()
+        self.start = self.peak = self.process.memory_info().rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._poll, daemon=True)
+        self._thread.start()
+        return self
+
+    def _poll(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, self.process.memory_info().rss)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, self.process.memory_info().rss)
+        self.delta = self.peak - self.start
+
+
+class Bench:
+    def __init__(self, size, repeat):
+        self.size = size
+        self.repeat = repeat
+        self.results = []
+
+    def stage(self, name, fn, repeat=None, setup=None):
+        # Лучшее время из repeat запусков; память — по первому запуску.
+        # setup (например, очистка кэшей) выполняется перед каждым запуском и в замер не входит
+        times, peak, result = [], None, None
+        for attempt in range(repeat or self.repeat):
+            if setup is not None:
+                setup()
+            with PeakRSS() as memory:
+                started = time.perf_counter()
+                result = fn()
+                times.append(time.perf_counter() - started)
+            if peak is None:
+                peak = memory.delta
+        row = {"size": self.size, "stage": name, "seconds": min(times), "peak_mb": peak / 2 ** 20}
+        self.results.append(row)
+        print(f"{self.size:>6} {name:<38} {row['seconds']:>9.3f} s {row['peak_mb']:>9.1f} MB", flush=True)
+        return result
+
+
+def _reset_caches():
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+def _reset_derived_caches(dashboard):
+    # Всё, что строится поверх хранилища рейсов; само хранилище (его загрузка замерена отдельно) остаётся
+    import streamlit as st
+    from components import passenger_dashboard
+    from utils.sections import clear_section_caches
+    st.cache_data.clear()
+    clear_section_caches()
+    passenger_dashboard.get_anomaly_detector.clear()
+    passenger_dashboard.get_forecast_actuals.clear()
+    snapshot = dashboard.snapshot
+    for index in (snapshot.index, snapshot.cube_index, snapshot.sketch_index):
+        if index is not None:
+            index.cache_clear()
+
+
+def _choosing(fn, view, level):
+    # fn с выбранным представлением: в bare mode виджеты иначе всегда возвращают первый вариант
+    import streamlit as st
+
+    def run():
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch.object(st, "radio", lambda label, options, **kwargs: options[view]))
+            if level is not None:
+                stack.enter_context(mock.patch.object(st, "selectbox", lambda label, options, **kwargs: level))
+            return fn()
+    return run
+
+
+def _render_stages(dashboard):
+    # (этап, функция): методы дашборда, render_by_time — по представлениям
+    for method in RENDER_METHODS:
+        if method == "render_by_time":
+            for name, (view, level) in TIME_VIEWS.items():
+                yield f"{method}:{name}", _choosing(dashboard.render_by_time, view, level)
+        else:
+            yield method, getattr(dashboard, method)
+
+
+def run_size(label, repeat, days):
+    import pandas as pd
+    from utils import cube as cube_module
+    from utils.filter_index import FilterIndex
+    from utils.ingest import PassengerStore
+    from utils.preprocessing import read_passenger_data
+    from utils.sketch import build_sketch, sketch_quantiles
+    from components.passenger_dashboard import PassengerDashboard
+
+    rows = parse_size(label)
+    workdir = os.path.join(WORK_DIR, label)
+    csv_path = os.path.join(workdir, "data", "transformed.csv")
+    if not os.path.exists(csv_path):
+        print(f"Генерация {rows:,} строк в {csv_path}...", flush=True)
+        write_csv(csv_path, rows, days)
+    os.chdir(workdir)
+    cache_dir = os.path.join(workdir, "data", ".cache")
+    for name in ("transformed.arrow", "transformed.meta.json"):
+        if os.path.exists(os.path.join(cache_dir, name)):
+            os.remove(os.path.join(cache_dir, name))
+
+    bench = Bench(label, repeat)
+    bench.stage("load_csv", lambda: pd.read_csv(csv_path, parse_dates=["Date"]), repeat=1)
+    bench.stage("arrow_cache_build", lambda: read_passenger_data(csv_path), repeat=1)
+    df = bench.stage("arrow_cache_load", lambda: read_passenger_data(csv_path))
+
+    index = bench.stage("filter_index_build", lambda: FilterIndex(df))
+    options = {col: index.options(col) for col in index.columns}
+    selective = {col: values[: max(len(values) // 2, 1)] for col, values in options.items()}
+    bench.stage("filter_default", lambda: index.select({col: values for col, values in options.items()}))
+    bench.stage("filter_selective_cold", lambda: index._compute(index._normalize(selective)))
+    bench.stage("filter_selective_cached", lambda: index.select(selective))
+    bench.stage("filter_isin_baseline", lambda: df[
+        df[list(selective)].apply(lambda col: col.isin(selective[col.name])).all(axis=1)])
+
+    cube = bench.stage("cube_build", lambda: cube_module.build_cube(df))
+    bench.stage("cube_rollup_date", lambda: cube_module.rollup(cube, ["Date"]))
+    sketch = bench.stage("sketch_build", lambda: build_sketch(df))
+    bench.stage("sketch_quantiles_airline", lambda: sketch_quantiles(sketch, ["Airline_name"]))
+
+    store = bench.stage("store_init", lambda: PassengerStore(csv_path), repeat=1)
+    # Дозагрузка: дописываем в конец файла 1% строк и читаем только их
+    with open(csv_path, "rb") as f:
+        header = f.readline()
+        tail = f.read(max(os.path.getsize(csv_path) // 100, 1))
+    tail = tail[tail.find(b"\n") + 1: tail.rfind(b"\n") + 1]
+    with open(csv_path, "ab") as f:
+        f.write(tail)
+    bench.stage("store_append_1pct", store.refresh, repeat=1)
+    # Возвращаем исходный файл, чтобы следующие запуски были сопоставимы
+    with open(csv_path, "rb+") as f:
+        f.truncate(os.path.getsize(csv_path) - len(tail))
+    del store
+    gc.collect()
+
+    # Методы дашборда: первый проход холодный (строится хранилище), затем замеры по методам
+    _reset_caches()
+    bench.stage("dashboard_init_cold", PassengerDashboard, repeat=1)
+    dashboard = PassengerDashboard()
+    for name, fn in _render_stages(dashboard):
+        bench.stage(name, fn, setup=lambda: _reset_derived_caches(dashboard))
+        bench.stage(f"{name}.cached", fn)
+    _reset_caches()
+    return bench.results
+
+
+def compare(results, baseline_path, tolerance):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = {(row["size"], row["stage"]): row for row in json.load(f)}
+    regressions = []
+    for row in results:
+        base = baseline.get((row["size"], row["stage"]))
+        if base is None or base["seconds"] < 0.01:
+            continue
+        ratio = row["seconds"] / base["seconds"]
+        if ratio > tolerance:
+            regressions.append((row["size"], row["stage"], base["seconds"], row["seconds"], ratio))
+    for size, stage, before, after, ratio in regressions:
+        print(f"РЕГРЕССИЯ {size} {stage}: {before:.3f} s → {after:.3f} s (×{ratio:.2f})")
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк путей данных дашборда")
+    parser.add_argument("--sizes", default="100k,1m", help="через запятую: 100k, 1m, 10m, 50m")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--compare", help="JSON с результатами прошлого запуска")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="допустимое замедление этапа")
+    args = parser.parse_args()
+
+    from utils.metrics import silence_bare_mode
+    silence_bare_mode()
+    results = []
+    for label in args.sizes.split(","):
+        results += run_size(label.strip(), args.repeat, args.days)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    out_path = os.path.join(RESULTS_DIR, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=1)
+    print(f"Результаты: {out_path}")
+
+    if args.compare and not compare(results, args.compare, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# benchmarks/synthetic.py
+#
+# Генератор синтетических рейсов в схеме data/transformed.csv:
+# python -m benchmarks.synthetic --rows 1m --out benchmarks/.work/flights_1m.csv
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+SIZES = {"100k": 100_000, "1m": 1_000_000, "10m": 10_000_000, "50m": 50_000_000}
+CHUNK_ROWS = 1_000_000
+
+WEEKDAYS = np.array(["Понедельник", "Вторник", "Среда", "Четверг", "Пятница", "Суббота", "Воскресенье"])
+AIRLINES = np.array([f"Авиакомпания {i:02d}" for i in range(60)])
+DELAY_BINS = [-np.inf, 0, 15, 60, np.inf]
+DELAY_LABELS = np.array(["Без задержки", "До 15 мин", "15–60 мин", "Более 1 часа"])
+
+
+def parse_size(value):
+    return SIZES.get(value.lower()) or int(value)
+
+
+def generate_chunk(rng, first_row, n, total_rows, start, days):
+    # Строки упорядочены по дате, как в реальной выгрузке: номер строки определяет день
+    day = (np.arange(first_row, first_row + n) * days // total_rows).astype("int64")
+    dates = pd.DatetimeIndex(start + pd.to_timedelta(day, unit="D"))
+
+    # Часы вылета: утренний и вечерний пики
+    hour = np.clip(np.where(rng.random(n) < 0.5, rng.normal(8, 2.5, n), rng.normal(18, 3, n)), 0, 23).astype("int64")
+    time_of_day = np.select([hour < 6, hour < 12, hour < 18], ["Ночь", "Утро", "День"], "Вечер")
+
+    airline = rng.zipf(1.3, n) % len(AIRLINES)
+    capacity = 120 + (airline * 37) % 180
+    season = 1 + 0.25 * np.sin(2 * np.pi * (dates.dayofyear.to_numpy() - 100) / 365.25)
+    weekend = np.where(dates.dayofweek.to_numpy() >= 4, 1.1, 1.0)
+    load = np.clip(rng.normal(0.78, 0.12, n) * season * weekend, 0.05, 1.0)
+    passengers = (capacity * load).round().astype("int64")
+
+    cancelled = rng.random(n) < 0.015
+    delay = np.where(rng.random(n) < 0.6, 0.0, rng.exponential(20, n) * (0.5 + load)).round()
+    passengers[cancelled] = 0
+    delay[cancelled] = np.nan
+    category = DELAY_LABELS[np.clip(np.digitize(np.nan_to_num(delay), DELAY_BINS[1:-1], right=True), 0, 3)]
+    category = np.where(cancelled, "Отменён", category)
+
+    return pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Hour": hour,
+        "Year": dates.year,
+        "Month": dates.month,
+        "YearMonth": dates.strftime("%Y-%m"),
+        "DayOfWeek": WEEKDAYS[dates.dayofweek],
+        "TimeOfDay": time_of_day,
+        "Airline_name": AIRLINES[airline],
+        "Departure_Arrival": np.where(rng.random(n) < 0.5, "Вылет", "Прилет"),
+        "Reg_type": np.where(rng.random(n) < 0.8, "Внутренний", "Международный"),
+        "Reg_sr_type": np.where(rng.random(n) < 0.9, "Регулярный", "Чартерный"),
+        "Total_Passengers": passengers,
+        "DelayTime": delay,
+        "IsCancelled": cancelled,
+        "DelayCategory": category,
+    })
+
+
+def write_csv(path, total_rows, days=1095, start="2022-01-01", seed=0):
+    # Пишем порциями, чтобы 50M строк не держать в памяти целиком
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp(start)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    for first_row in range(0, total_rows, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, total_rows - first_row)
+        chunk = generate_chunk(rng, first_row, n, total_rows, start, days)
+        chunk.to_csv(tmp_path, mode="w" if first_row == 0 else "a", header=first_row == 0, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические рейсы в схеме transformed.csv")
+    parser.add_argument("--rows", default="100k", help="100k, 1m, 10m, 50m или число строк")
+    parser.add_argument("--days", type=int, default=1095)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+    write_csv(args.out, parse_size(args.rows), args.days, seed=args.seed)
+    print(f"Записано {parse_size(args.rows):,} строк в {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,20 +1,101 @@
 # components/complaints_dashboard.py
 
+import time
+
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-from utils.preprocessing import load_complaints
+from utils.complaints import get_complaints_store
+from utils.metrics import instrumented
+
+# Сколько найденных жалоб показывать в таблице (самые свежие)
+MAX_RESULTS = 200
+TOP_TERMS = 10
 
 
+@instrumented
 class ComplaintsDashboard:
+    # Поиск — по обратному индексу (utils/complaints.py), а не подстрокой по тексту:
+    # время ответа определяется длиной списков терминов запроса, а не размером архива
+
     def __init__(self):
-        pass
+        store = get_complaints_store()
+        store.refresh()
+        self.index = store.index
+        self.rows = None
+
+    def metric_rows(self):
+        return len(self.rows) if self.rows is not None else None
+
+    def render_sidebar_filters(self):
+        st.sidebar.header("🔎 Фильтры")
+        dates = self.index.docs["Date"].dropna()
+        self.start = self.end = None
+        if not dates.empty:
+            first_day, last_day = dates.min().date(), dates.max().date()
+            period = st.sidebar.date_input("Период", value=(first_day, last_day),
+                                           min_value=first_day, max_value=last_day)
+            self.start, self.end = (period if len(period) == 2 else (period[0], period[0]))
+        self.categories = st.sidebar.multiselect("Категория", list(self.index.docs["Category"].cat.categories),
+                                                 default=None)
 
     def load_data(self):
-        pass
+        self.query = st.text_input("Поиск по тексту жалоб",
+                                   placeholder='Слова ищутся во всех формах, фразы — в кавычках: "потерян багаж"')
+        started = time.perf_counter()
+        selected = self.index.select(self.start, self.end, self.categories)
+        self.rows = self.index.search(self.query, selected)
+        self.search_ms = (time.perf_counter() - started) * 1000
+
+    def render_main_metrics(self):
+        col1, col2 = st.columns(2)
+        col1.metric("🗣️ Жалоб найдено", f"{len(self.rows):,}")
+        col2.metric("📚 Всего в архиве", f"{len(self.index):,}")
+        st.caption(f"Поиск и фильтры: {self.search_ms:.1f} мс")
+
+    def render_by_day(self):
+        st.subheader("📅 По дням")
+        df_day = self.index.counts(self.rows, "Date")
+        fig = px.line(df_day, x="Date", y="Жалоб", labels={"Date": "Дата"}, title="Жалобы по дням")
+        st.plotly_chart(fig, use_container_width=True)
+
+    def render_by_category(self):
+        st.subheader("🗂️ По категориям")
+        df_cat = self.index.counts(self.rows, "Category").sort_values("Жалоб", ascending=False)
+        fig = px.bar(df_cat, x="Category", y="Жалоб", labels={"Category": "Категория"},
+                     title="Жалобы по категориям")
+        st.plotly_chart(fig, use_container_width=True)
+
+    def render_top_terms(self):
+        st.subheader("🔥 Частые темы")
+        totals, series = self.index.top_terms(self.start, self.end, self.categories, top=TOP_TERMS)
+        if totals.empty:
+            st.info("Нет жалоб за выбранный период")
+            return
+        col1, col2 = st.columns([1, 2])
+        col1.dataframe(totals, hide_index=True, use_container_width=True)
+        fig = px.line(series, x="Date", y="docs", color="Термин",
+                      labels={"Date": "Дата", "docs": "Жалоб с термином"},
+                      title=f"Топ-{TOP_TERMS} терминов по дням")
+        col2.plotly_chart(fig, use_container_width=True)
 
+    def render_results(self):
+        st.subheader("📝 Жалобы")
+        docs = self.index.docs.iloc[self.rows]
+        latest = docs.sort_values("Date", ascending=False, na_position="last").head(MAX_RESULTS)
+        st.dataframe(latest.rename(columns={"Date": "Дата", "Category": "Категория", "Text": "Текст"}),
+                     hide_index=True, use_container_width=True)
+        if len(docs) > MAX_RESULTS:
+            st.caption(f"Показаны {MAX_RESULTS} самых свежих из {len(docs):,}")
 
     def run(self):
         st.title("🗣️ Жалобы")
+        self.render_sidebar_filters()
         self.load_data()
-        pass
+        if len(self.index) == 0:
+            st.info("Жалоб пока нет")
+            return
+        self.render_main_metrics()
+        self.render_by_day()
+        self.render_by_category()
+        self.render_top_terms()
+        self.render_results()
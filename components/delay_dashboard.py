@@ -3,18 +3,127 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from utils.preprocessing import load_passenger_data
+import plotly.graph_objects as go
+from utils.downsample import line_trace
+from utils.ingest import get_passenger_snapshot
+from utils.metrics import instrumented, tracked_cache
+from utils.sketch import MIN_VALUE, RELATIVE_ACCURACY, sketch_from_counts, sketch_quantiles
+from utils import db
 
+QUANTILES = (0.5, 0.9, 0.99)
+QUANTILE_COLUMNS = ["p50", "p90", "p99"]
 
+
+@tracked_cache(st.cache_data(ttl=600))
+def load_db_delay_options(column):
+    return db.distinct_values(column)
+
+
+@tracked_cache(st.cache_data(ttl=600))
+def load_db_delay_counts(by, selection):
+    # Частоты задержек по группам; в скетч они сворачиваются уже в процессе
+    counts = db.value_counts(list(by) + ["DelayTime"], selection)
+    if "Date" in counts.columns:
+        counts["Date"] = pd.to_datetime(counts["Date"])
+    return counts
+
+
+@instrumented
 class DelayDashboard:
+    # Перцентили задержек считаются по скетчам ячеек дата × авиакомпания × час (utils/sketch.py):
+    # фильтры отбирают ячейки, квантили получаются слиянием их корзин без просмотра рейсов
+
     def __init__(self):
-        pass
+        self.use_db = db.is_configured()
+        self.snapshot = None
+        self.filtered_sketch = None
+        if not self.use_db:
+            self.snapshot = get_passenger_snapshot()
+
+    def metric_rows(self):
+        return int(self.filtered_sketch["rows"].sum()) if self.filtered_sketch is not None else None
+
+    def render_sidebar_filters(self):
+        st.sidebar.header("🔎 Фильтры")
+        options = load_db_delay_options if self.use_db else self.snapshot.sketch_index.options
+
+        years = st.sidebar.multiselect("Год", sorted(options("Year")), default=sorted(options("Year")))
+        months = st.sidebar.multiselect("Месяц", sorted(options("Month")), default=sorted(options("Month")))
+        weekdays = st.sidebar.multiselect("День недели", sorted(options("DayOfWeek")),
+                                          default=sorted(options("DayOfWeek")))
+        airlines = st.sidebar.multiselect("Авиакомпания", sorted(options("Airline_name")), default=None)
+        dep_arr = st.sidebar.multiselect("Вылет / Прилет", options("Departure_Arrival"),
+                                         default=options("Departure_Arrival"))
+        # У отменённых рейсов задержки нет — по умолчанию они не учитываются
+        cancelled = st.sidebar.multiselect("Отменён", [True, False], default=[False])
+
+        self.selection = {
+            "Year": years,
+            "Month": months,
+            "DayOfWeek": weekdays,
+            "Airline_name": airlines or None,
+            "Departure_Arrival": dep_arr,
+            "IsCancelled": cancelled,
+        }
 
     def load_data(self):
-        pass
+        if not self.use_db:
+            sketch_index = self.snapshot.sketch_index
+            self.filtered_sketch = self.snapshot.sketch.iloc[sketch_index.select(self.selection)]
+
+    def _quantiles(self, by):
+        # p50 / p90 / p99 задержки по группам by
+        if self.use_db:
+            sketch = sketch_from_counts(load_db_delay_counts(tuple(by), self.selection), by)
+        else:
+            sketch = self.filtered_sketch
+        return sketch_quantiles(sketch, by, QUANTILES)
+
+    def render_main_metrics(self):
+        st.subheader("📌 Перцентили задержки")
+        overall = self._quantiles([])
+        if overall.empty:
+            st.info("Нет рейсов для выбранных фильтров")
+            return
+
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("🛫 Рейсов", f"{int(overall['rows'].iloc[0]):,}")
+        col2.metric("⏱ Медиана (p50)", f"{overall['p50'].iloc[0]:.1f} мин")
+        col3.metric("⏱ p90", f"{overall['p90'].iloc[0]:.1f} мин")
+        col4.metric("⏱ p99", f"{overall['p99'].iloc[0]:.1f} мин")
+        st.caption(f"Перцентили считаются по скетчам: относительная ошибка не больше {RELATIVE_ACCURACY:.0%}, "
+                   f"задержки короче {MIN_VALUE} мин считаются нулевыми")
+
+    def render_by_airline(self):
+        st.subheader("🏢 По авиакомпаниям")
+        df_airline = self._quantiles(["Airline_name"]).sort_values("p90", ascending=False)
+        fig = px.bar(df_airline.melt(id_vars="Airline_name", value_vars=QUANTILE_COLUMNS),
+                     x="Airline_name", y="value", color="variable", barmode="group",
+                     labels={"Airline_name": "Авиакомпания", "value": "Задержка, мин", "variable": "Перцентиль"},
+                     title="Перцентили задержки по авиакомпаниям (по убыванию p90)")
+        st.plotly_chart(fig, use_container_width=True)
+
+    def render_by_hour(self):
+        st.subheader("⏰ По часам")
+        df_hour = self._quantiles(["Hour"])
+        fig = px.line(df_hour, x="Hour", y=QUANTILE_COLUMNS, markers=True,
+                      labels={"Hour": "Час", "value": "Задержка, мин", "variable": "Перцентиль"},
+                      title="Перцентили задержки по часу рейса")
+        st.plotly_chart(fig, use_container_width=True)
 
+    def render_by_day(self):
+        st.subheader("📅 По дням")
+        df_day = self._quantiles(["Date"])
+        fig = go.Figure([line_trace(df_day["Date"], df_day[col], name=col) for col in QUANTILE_COLUMNS])
+        fig.update_layout(title="Перцентили задержки по дням", xaxis_title="Дата", yaxis_title="Задержка, мин",
+                          legend_title="Перцентиль")
+        st.plotly_chart(fig, use_container_width=True)
 
     def run(self):
         st.title("✈️ Задержки")
+        self.render_sidebar_filters()
         self.load_data()
-        pass
+        self.render_main_metrics()
+        self.render_by_airline()
+        self.render_by_hour()
+        self.render_by_day()
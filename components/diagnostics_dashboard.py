@@ -0,0 +1,70 @@
+# components/diagnostics_dashboard.py
+
+import streamlit as st
+import plotly.express as px
+from utils import db
+from utils.metrics import (METRICS_PORT_ENV, WINDOW, cache_summary, pooled_percentile, process_rss, prometheus_text,
+                           stage_summary)
+
+
+class DiagnosticsDashboard:
+    # Замеры всех сессий процесса; сама страница не замеряется, чтобы не искажать картину
+
+    def __init__(self):
+        self.stages = None
+        self.caches = None
+
+    def load_data(self):
+        self.stages = stage_summary()
+        self.caches = cache_summary()
+
+    def render_overview(self):
+        reruns = self.stages[self.stages["stage"].str.endswith(".run")]
+        hits, misses = self.caches["hit"].sum(), self.caches["miss"].sum()
+
+        col1, col2, col3 = st.columns(3)
+        # Перцентиль по замерам всех страниц вместе: максимум постраничных p95 — не p95
+        p95 = pooled_percentile(reruns["stage"], 95)
+        col1.metric("⏱ p95 перезапуска страницы", f"{p95:,.0f} мс" if p95 is not None else "—",
+                    help="По объединённым замерам всех страниц")
+        col2.metric("💾 Память процесса", f"{process_rss() / 2 ** 20:,.0f} МБ")
+        col3.metric("🎯 Попадания в кэши", f"{hits / max(hits + misses, 1):.0%}")
+        st.caption(f"Перцентили по последним {WINDOW} вызовам каждого этапа, по всем сессиям")
+
+    def render_stages(self):
+        st.subheader("🧱 Этапы")
+        if self.stages.empty:
+            st.info("Замеров пока нет — откройте страницы дашборда")
+            return
+        reruns = self.stages[self.stages["stage"].str.endswith(".run")]
+        if not reruns.empty:
+            fig = px.bar(reruns.melt(id_vars="stage", value_vars=["p50_ms", "p95_ms", "p99_ms"]),
+                         x="stage", y="value", color="variable", barmode="group",
+                         labels={"stage": "Страница", "value": "мс", "variable": "Перцентиль"},
+                         title="Время перезапуска страниц")
+            st.plotly_chart(fig, use_container_width=True)
+        st.dataframe(self.stages, use_container_width=True, hide_index=True)
+
+    def render_caches(self):
+        st.subheader("💾 Кэши")
+        st.dataframe(self.caches, use_container_width=True, hide_index=True,
+                     column_config={"hit_ratio": st.column_config.ProgressColumn("hit_ratio", min_value=0, max_value=1)})
+        if db.is_configured():
+            st.subheader("🗄️ Запросы к БД")
+            st.dataframe(db.query_stats(), use_container_width=True, hide_index=True)
+
+    def render_export(self):
+        st.subheader("📤 Экспорт")
+        text = prometheus_text()
+        st.download_button("Скачать метрики (Prometheus)", text, file_name="metrics.txt", mime="text/plain")
+        st.caption(f"Для сбора Prometheus задайте {METRICS_PORT_ENV} — метрики будут доступны на /metrics")
+        with st.expander("Текстовый формат"):
+            st.code(text, language="text")
+
+    def run(self):
+        st.title("🩺 Диагностика")
+        self.load_data()
+        self.render_overview()
+        self.render_stages()
+        self.render_caches()
+        self.render_export()
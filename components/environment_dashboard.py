@@ -2,30 +2,151 @@
 
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+from utils.binning import DEFAULT_BINS, bin_edges, binned_relationship
+from utils.downsample import line_trace
+from utils.ingest import get_passenger_snapshot
+from utils.metrics import instrumented, tracked_cache
 from utils.preprocessing import load_temperature_data
 from utils.preprocessing import load_co2_data
+from utils.sensor_join import get_sensor_join
+from utils import db
 
+# Не больше стольких точек на помещение: по ним выбирается разрешение сводки
+MAX_POINTS_PER_ROOM = 2000
 
+
+@tracked_cache(st.cache_data(ttl=600))
+def load_db_hourly_cells():
+    return db.aggregate(["Date", "Hour", "Departure_Arrival"])
+
+
+@instrumented
 class EnvironmentDashboard:
     def __init__(self):
         self.df_temp = None
         self.df_co2 = None
+        self.df_joined = None
+        self.resolution = "hour"
+
+    def metric_rows(self):
+        if self.df_temp is None:
+            return None
+        return len(self.df_temp) + len(self.df_co2)
+
+    def render_sidebar_filters(self):
+        st.sidebar.header("🔎 Фильтры")
+
+        # Границы периода и список помещений берём из дневных сводок — они самые маленькие
+        daily = pd.concat([load_temperature_data("day"), load_co2_data("day")], ignore_index=True)
+        first_day = daily["Timestamp"].min().date()
+        last_day = daily["Timestamp"].max().date()
+        period = st.sidebar.date_input("Период", value=(first_day, last_day),
+                                       min_value=first_day, max_value=last_day)
+        self.start, self.end = (period if len(period) == 2 else (period[0], period[0]))
+        self.rooms = st.sidebar.multiselect("Помещения", sorted(daily["Room"].astype(str).unique()), default=None)
+
+        # Самое подробное разрешение, при котором график остаётся в пределах MAX_POINTS_PER_ROOM
+        span = pd.Timestamp(self.end) - pd.Timestamp(self.start) + pd.Timedelta(days=1)
+        if span / pd.Timedelta(minutes=1) <= MAX_POINTS_PER_ROOM:
+            self.resolution = "minute"
+        elif span / pd.Timedelta(hours=1) <= MAX_POINTS_PER_ROOM:
+            self.resolution = "hour"
+        else:
+            self.resolution = "day"
+
+    def _filter(self, df):
+        mask = ((df["Timestamp"] >= pd.Timestamp(self.start)) &
+                (df["Timestamp"] < pd.Timestamp(self.end) + pd.Timedelta(days=1)))
+        if self.rooms:
+            mask &= df["Room"].isin(self.rooms)
+        return df[mask]
 
     def load_data(self):
-        self.df_temp = load_temperature_data()
-        self.df_co2 = load_co2_data()
+        self.df_temp = self._filter(load_temperature_data(self.resolution))
+        self.df_co2 = self._filter(load_co2_data(self.resolution))
+
+        # Почасовая нагрузка × воздух: при перезапусках страницы выравнивание не повторяется
+        if db.is_configured():
+            version, cells, changed = None, load_db_hourly_cells(), None
+        else:
+            snapshot = get_passenger_snapshot()
+            version, cells, changed = snapshot.version, snapshot.cube, snapshot.changed
+        joined = get_sensor_join(tuple(self.rooms or ())).update(
+            version, cells, load_temperature_data("hour"), load_co2_data("hour"), changed)
+        mask = ((joined["Timestamp"] >= pd.Timestamp(self.start)) &
+                (joined["Timestamp"] < pd.Timestamp(self.end) + pd.Timedelta(days=1)))
+        self.df_joined = joined[mask]
+
+    @staticmethod
+    def _room_lines(df):
+        # Одна прореженная линия на помещение; min-max сохраняет кратковременные выбросы датчиков
+        fig = go.Figure()
+        for room, room_df in df.groupby("Room", observed=True):
+            fig.add_trace(line_trace(room_df["Timestamp"], room_df["mean"], name=str(room), method="minmax"))
+        return fig
 
     def render_temperature_chart(self):
-        # TODO: График температуры
-        pass
+        st.subheader("🌡️ Температура в помещениях")
+        fig = self._room_lines(self.df_temp)
+        fig.update_layout(title=f"Средняя температура (разрешение: {self.resolution})",
+                          xaxis_title="Время", yaxis_title="Температура, °C", legend_title="Помещение")
+        st.plotly_chart(fig, use_container_width=True)
 
     def render_co2_chart(self):
-        # TODO: График CO2
-        pass
+        st.subheader("🫁 Концентрация CO₂")
+        fig = self._room_lines(self.df_co2)
+        fig.update_layout(title=f"Средний CO₂ (разрешение: {self.resolution})",
+                          xaxis_title="Время", yaxis_title="CO₂, ppm", legend_title="Помещение")
+        st.plotly_chart(fig, use_container_width=True)
+
+    def render_load_vs_air(self):
+        st.subheader("👥 Пассажиропоток и качество воздуха")
+        df = self.df_joined.dropna(subset=["co2_mean", "temp_mean"], how="all")
+        if df.empty:
+            st.info("Нет часов, где есть и рейсы, и показания датчиков")
+            return
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Часов", f"{len(df):,}")
+        col2.metric("Корреляция с CO₂", f"{df['passengers'].corr(df['co2_mean']):.2f}")
+        col3.metric("Корреляция с температурой", f"{df['passengers'].corr(df['temp_mean']):.2f}")
+
+        fig = make_subplots(specs=[[{"secondary_y": True}]])
+        fig.add_trace(line_trace(df["Timestamp"], df["passengers"], name="Пассажиры"), secondary_y=False)
+        fig.add_trace(line_trace(df["Timestamp"], df["co2_mean"], name="CO₂, среднее"), secondary_y=True)
+        fig.add_trace(line_trace(df["Timestamp"], df["co2_max"], name="CO₂, максимум", method="minmax",
+                                 line=dict(dash="dot")), secondary_y=True)
+        fig.update_layout(title="Пассажиропоток и CO₂ по часам", xaxis_title="Время", legend_title="Ряд")
+        fig.update_yaxes(title_text="Пассажиров в час", secondary_y=False)
+        fig.update_yaxes(title_text="CO₂, ppm", secondary_y=True)
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Часы разбиваются на корзины по нагрузке; в каждой — медиана показаний с 95% интервалом
+        counts = df.assign(rows=1)
+        edges = bin_edges(counts["passengers"], counts["rows"], "quantile", DEFAULT_BINS)
+        fig = make_subplots(specs=[[{"secondary_y": True}]])
+        for column, name, secondary in [("co2_mean", "CO₂, ppm", False), ("temp_mean", "Температура, °C", True)]:
+            stats = binned_relationship(counts, "passengers", column, edges)
+            fig.add_trace(go.Scatter(x=stats["center"], y=stats["median"], mode="lines+markers", name=name,
+                                     error_y=dict(type="data", symmetric=False,
+                                                  array=stats["median_hi"] - stats["median"],
+                                                  arrayminus=stats["median"] - stats["median_lo"]),
+                                     customdata=stats[["left", "right", "rows"]],
+                                     hovertemplate="%{customdata[0]:.0f}–%{customdata[1]:.0f} пасс./ч: "
+                                                   "%{y:.1f}, часов %{customdata[2]:,}"),
+                          secondary_y=secondary)
+        fig.update_layout(title="Показания датчиков в зависимости от нагрузки (медиана по часам)",
+                          xaxis_title="Пассажиров в час")
+        fig.update_yaxes(title_text="CO₂, ppm", secondary_y=False)
+        fig.update_yaxes(title_text="Температура, °C", secondary_y=True)
+        st.plotly_chart(fig, use_container_width=True)
 
     def run(self):
         st.title("🌡️ Температура и CO₂")
+        self.render_sidebar_filters()
         self.load_data()
         self.render_temperature_chart()
         self.render_co2_chart()
+        self.render_load_vs_air()
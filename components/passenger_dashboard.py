@@ -1,167 +1,303 @@
 # components/passenger_dashboard.py
 
+import os
+
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from utils.preprocessing import load_passenger_data  # реализуй эту функцию для чтения transformed.csv
-from statsmodels.tsa.seasonal import seasonal_decompose
+from utils.anomaly import AnomalyDetector, series_matrix
+from utils.binning import BIN_METHODS, DEFAULT_BINS, bin_edges, binned_relationship, parse_custom_edges
+from utils.cube import rollup, totals, weighted_quantile
+from utils.downsample import line_trace
+from utils.forecast import FORECASTS_PATH, TOTAL_SERIES, build_series, read_forecasts
+from utils.ingest import get_passenger_snapshot
+from utils.metrics import instrumented, tracked_cache
+from utils.preprocessing import CALENDAR_COLUMNS, QUARTER_DTYPE, SEASON_DTYPE, add_calendar_columns
+from utils.sections import depends_on, fragment
+from utils import db
+
+
+# При заданном AIRPORT_DB_URL фильтры и группировки выполняются в БД; кэш держим недолго,
+# чтобы подхватывать новые данные
+@tracked_cache(st.cache_data(ttl=600))
+def load_db_options(column):
+    return db.distinct_values(column)
+
+
+@tracked_cache(st.cache_data(ttl=600))
+def load_db_aggregate(by, selection):
+    return db.aggregate(list(by), selection)
+
+
+@tracked_cache(st.cache_data(ttl=600))
+def load_db_value_counts(columns, selection):
+    return db.value_counts(list(columns), selection)
+
+
+@tracked_cache(st.cache_data)
+def load_forecasts(mtime_ns):
+    # Прогнозы рассчитываются отдельно (python -m utils.forecast); ключ кэша — mtime файла
+    return read_forecasts()
+
+
+@tracked_cache(st.cache_resource(max_entries=4))
+def get_forecast_actuals(version, _cube):
+    # Фактические дневные ряды без учёта фильтров — в той же разбивке, что и прогноз
+    return build_series(_cube)
+
+
+@tracked_cache(st.cache_data(max_entries=64, ttl=600))
+def get_delay_relation(version, selection_key, method, n_bins, custom, _load_counts):
+    # Корзины по набору фильтров; частоты загружаются только при промахе кэша
+    counts = _load_counts()
+    edges = bin_edges(counts["Total_Passengers"], counts["rows"], method, n_bins, custom)
+    return binned_relationship(counts, "Total_Passengers", "DelayTime", edges)
+
 
+@tracked_cache(st.cache_resource(max_entries=32))
+def get_anomaly_detector(selection_key, granularity):
+    # Детектор на набор фильтров: при новых данных пересчитывает только хвост рядов
+    return AnomalyDetector(granularity)
 
+
+@instrumented
 class PassengerDashboard:
     def __init__(self):
-        self.df = load_passenger_data()
-        self.filtered_df = self.df.copy()
+        self.use_db = db.is_configured()
+        self.snapshot = None
+        self.df = None
+        # Сессия хранит только номера отобранных строк общей таблицы (массив из кэша индекса)
+        self.rows = None
+        self.cube_rows = None
+        # Входы секций (см. utils/sections.py): версия данных и набор фильтров
+        self.data_version = None
+        self.selection_key = None
+        if not self.use_db:
+            # Снимок общий для всех сессий: материализованная сборка или живое хранилище,
+            # которое при каждом перезапуске скрипта дочитывает только новые строки источника
+            self.snapshot = get_passenger_snapshot()
+            self.df = self.snapshot.df
+            self.data_version = self.snapshot.version
+
+    def metric_rows(self):
+        # Размер отфильтрованной выборки для метрик; в режиме БД строки в процесс не загружаются
+        return len(self.rows) if self.rows is not None else None
 
     def render_sidebar_filters(self):
         st.sidebar.header("🔎 Фильтры")
 
-        self.years = st.sidebar.multiselect("Год", sorted(self.df["Year"].unique()),
-                                            default=sorted(self.df["Year"].unique()))
-        # self.quarters = st.sidebar.multiselect("Квартал", ["Q1", "Q2", "Q3", "Q4"], default=["Q1", "Q2", "Q3", "Q4"])
-        # self.seasons = st.sidebar.multiselect("Сезон", ["Зима", "Весна", "Лето", "Осень"],
-        #                                       default=["Зима", "Весна", "Лето", "Осень"])
-
-        self.months = st.sidebar.multiselect("Месяц", sorted(self.df["Month"].unique()),
-                                             default=sorted(self.df["Month"].unique()))
-        self.weekdays = st.sidebar.multiselect("День недели", sorted(self.df["DayOfWeek"].unique()),
-                                               default=sorted(self.df["DayOfWeek"].unique()))
-        self.times_of_day = st.sidebar.multiselect("Время суток", self.df["TimeOfDay"].unique(),
-                                                   default=self.df["TimeOfDay"].unique())
-        self.airlines = st.sidebar.multiselect("Авиакомпания", sorted(self.df["Airline_name"].unique()), default=None)
-        self.dep_arr = st.sidebar.multiselect("Вылет / Прилет", self.df["Departure_Arrival"].unique(),
-                                              default=self.df["Departure_Arrival"].unique())
+        if self.use_db:
+            options = load_db_options
+            # Квартал и сезон выводятся из даты; в таблице БД их может не быть
+            calendar_filters = {"Quarter", "Season"} <= set(db.get_table().c.keys())
+        else:
+            calendar_filters = True
+            options = self.snapshot.cube_index.options
+            st.sidebar.caption(f"Данные по {self.snapshot.watermark:%d.%m.%Y}, "
+                               f"рейсов: {int(self.snapshot.cube['rows'].sum()):,}")
+
+        self.years = st.sidebar.multiselect("Год", sorted(options("Year")),
+                                            default=sorted(options("Year")))
+        self.quarters = self.seasons = None
+        if calendar_filters:
+            self.quarters = st.sidebar.multiselect("Квартал", list(QUARTER_DTYPE.categories),
+                                                   default=list(QUARTER_DTYPE.categories))
+            self.seasons = st.sidebar.multiselect("Сезон", list(SEASON_DTYPE.categories),
+                                                  default=list(SEASON_DTYPE.categories))
+
+        self.months = st.sidebar.multiselect("Месяц", sorted(options("Month")),
+                                             default=sorted(options("Month")))
+        self.weekdays = st.sidebar.multiselect("День недели", sorted(options("DayOfWeek")),
+                                               default=sorted(options("DayOfWeek")))
+        self.times_of_day = st.sidebar.multiselect("Время суток", options("TimeOfDay"),
+                                                   default=options("TimeOfDay"))
+        self.airlines = st.sidebar.multiselect("Авиакомпания", sorted(options("Airline_name")), default=None)
+        self.dep_arr = st.sidebar.multiselect("Вылет / Прилет", options("Departure_Arrival"),
+                                              default=options("Departure_Arrival"))
         # Аэропорт назначения / вылета
         # self.airports = st.sidebar.multiselect("Аэропорт назначения/вылета", sorted(self.df["Airport"].unique()),
         #                                        default=None)
-        self.reg_type = st.sidebar.multiselect("Тип рейса", self.df["Reg_type"].unique(),
-                                               default=self.df["Reg_type"].unique())
-        self.reg_sr_type = st.sidebar.multiselect("Регулярность", self.df["Reg_sr_type"].unique(),
-                                                  default=self.df["Reg_sr_type"].unique())
+        self.reg_type = st.sidebar.multiselect("Тип рейса", options("Reg_type"),
+                                               default=options("Reg_type"))
+        self.reg_sr_type = st.sidebar.multiselect("Регулярность", options("Reg_sr_type"),
+                                                  default=options("Reg_sr_type"))
         self.cancelled = st.sidebar.multiselect("Отменён", [True, False], default=[True, False])
-        self.delay_cat = st.sidebar.multiselect("Категория задержки", self.df["DelayCategory"].unique(),
-                                                default=self.df["DelayCategory"].unique())
-
-        self.filtered_df = self.df[
-            (self.df["Year"].isin(self.years)) &
-            (self.df["Month"].isin(self.months)) &
-            (self.df["DayOfWeek"].isin(self.weekdays)) &
-            (self.df["TimeOfDay"].isin(self.times_of_day)) &
-            (self.df["Departure_Arrival"].isin(self.dep_arr)) &
-            (self.df["Reg_type"].isin(self.reg_type)) &
-            (self.df["Reg_sr_type"].isin(self.reg_sr_type)) &
-            (self.df["IsCancelled"].isin(self.cancelled)) &
-            (self.df["DelayCategory"].isin(self.delay_cat))
-            ]
-
-        # Фильтрация по кварталу
-        # if self.quarters:
-        #     self.filtered_df = self.filtered_df[self.filtered_df['Quarter'].isin(self.quarters)]
-
-        # Фильтрация по сезону
-        # if self.seasons:
-        #     self.filtered_df = self.filtered_df[self.filtered_df['Season'].isin(self.seasons)]
+        self.delay_cat = st.sidebar.multiselect("Категория задержки", options("DelayCategory"),
+                                                default=options("DelayCategory"))
+
+        # Фильтрация по авиакомпании выполняется, только если что-то выбрано
+        self.selection = {
+            "Year": self.years,
+            "Quarter": self.quarters,
+            "Season": self.seasons,
+            "Month": self.months,
+            "DayOfWeek": self.weekdays,
+            "TimeOfDay": self.times_of_day,
+            "Departure_Arrival": self.dep_arr,
+            "Reg_type": self.reg_type,
+            "Reg_sr_type": self.reg_sr_type,
+            "IsCancelled": self.cancelled,
+            "DelayCategory": self.delay_cat,
+            "Airline_name": self.airlines or None,
+        }
+        # Хешируемый ключ набора фильтров для кэшей на уровне процесса
+        self.selection_key = tuple((col, None if values is None else tuple(values))
+                                   for col, values in self.selection.items())
+        if self.df is not None:
+            self.rows = self.snapshot.index.select(self.selection)
+        if not self.use_db:
+            # Те же фильтры применяем к кубу: KPI и графики считаются по ячейкам, а не по рейсам.
+            # Сессия хранит только номера ячеек; срез куба строится в _aggregate при промахе кэша
+            self.cube_rows = self.snapshot.cube_index.select(self.selection)
 
         # Фильтрация по аэропорту
         # if self.airports:
         #     self.filtered_df = self.filtered_df[self.filtered_df["Airport"].isin(self.airports)]
 
-        # Фильтрация по авиакомпании
-        if self.airlines:
-            self.filtered_df = self.filtered_df[self.filtered_df["Airline_name"].isin(self.airlines)]
+    @depends_on("data_version", "selection_key")
+    def _aggregate(self, by):
+        # Куб, свёрнутый до измерений by; при работе с БД GROUP BY выполняется на сервере
+        if self.use_db:
+            # Календарных колонок может не быть в таблице БД — тогда группируем по дате и выводим их здесь
+            derived = [col for col in by if col in CALENDAR_COLUMNS and col not in db.get_table().c]
+            query_by = [col for col in by if col not in derived]
+            if derived and "Date" not in query_by:
+                query_by.append("Date")
+            cells = load_db_aggregate(tuple(query_by), self.selection)
+            return rollup(add_calendar_columns(cells) if derived else cells, by)
+        cube = self.snapshot.cube
+        return rollup(cube if len(self.cube_rows) == len(cube) else cube.iloc[self.cube_rows], by)
+
+    @depends_on("data_version", "selection_key")
+    def _value_counts(self, columns):
+        # Частоты сочетаний значений отфильтрованных рейсов (для квантилей и медиан)
+        if self.use_db:
+            return load_db_value_counts(tuple(columns), self.selection)
+        if self.df is None:
+            # Материализованная сборка: подходящая таблица частот (и частоты строк, дописанных
+            # после сборки), каждая отфильтрована своим индексом
+            chunks = next(chunks for chunks in self.snapshot.counts.values()
+                          if set(columns) <= set(chunks[0][0].columns))
+            part = pd.concat([table.iloc[index.select(self.selection)] for table, index in chunks])
+            return part.groupby(columns, observed=True)["rows"].sum().reset_index()
+        return self.df.value_counts(columns, self.rows)
+
+    def _passengers_by(self, by, stat="sum"):
+        # Пассажиропоток (сумма или среднее на рейс) по измерениям из отфильтрованного куба
+        by = [by] if isinstance(by, str) else list(by)
+        df_stat = self._aggregate(by)
+        df_stat["Total_Passengers"] = df_stat[f"pax_{stat}"]
+        return df_stat[by + ["Total_Passengers"]]
+
+    @staticmethod
+    def _box_trace(counts, group, value):
+        # Boxplot по готовым квартилям: строки рейсов в браузер не передаются
+        stats = weighted_quantile(counts, [group], value, 0.5).rename(columns={value: "median"})
+        stats["q1"] = weighted_quantile(counts, [group], value, 0.25)[value]
+        stats["q3"] = weighted_quantile(counts, [group], value, 0.75)[value]
+        bounds = counts.merge(stats, on=group)
+        iqr = bounds["q3"] - bounds["q1"]
+        inside = bounds[(bounds[value] >= bounds["q1"] - 1.5 * iqr) & (bounds[value] <= bounds["q3"] + 1.5 * iqr)]
+        fences = inside.groupby(group, observed=True)[value].agg(lowerfence="min", upperfence="max").reset_index()
+        stats = stats.merge(fences, on=group)
+        return go.Box(x=stats[group], q1=stats["q1"], median=stats["median"], q3=stats["q3"],
+                      lowerfence=stats["lowerfence"], upperfence=stats["upperfence"], name=value)
 
     def render_main_metrics(self):
         st.subheader("📌 Основные показатели")
 
-        total_passengers = self.filtered_df["Total_Passengers"].sum()
-        avg_load = self.filtered_df["Total_Passengers"].mean()
-        total_cancellations = self.filtered_df["IsCancelled"].sum()
-        avg_delay = self.filtered_df["DelayTime"].mean()
-        top_airline = self.filtered_df.groupby("Airline_name")["Total_Passengers"].sum().idxmax()
-        top_day = self.filtered_df.groupby("Date")["Total_Passengers"].sum().idxmax()
+        kpi = totals(self._aggregate(["IsCancelled"]))
+        total_passengers = kpi["pax_sum"]
+        avg_load = kpi["pax_mean"]
+        total_cancellations = kpi["cancelled"]
+        avg_delay = kpi["delay_mean"]
 
         # Обработка случая, если данных нет
-        if not self.filtered_df.empty and "Airline_name" in self.filtered_df.columns:
-            top_airline = self.filtered_df.groupby("Airline_name")["Total_Passengers"].sum().idxmax()
-        else:
-            top_airline = "—"
-
-        if not self.filtered_df.empty and "Date" in self.filtered_df.columns:
-            top_day = self.filtered_df.groupby("Date")["Total_Passengers"].sum().idxmax()
+        if kpi["rows"] > 0:
+            top_airline = self._passengers_by("Airline_name").set_index("Airline_name")["Total_Passengers"].idxmax()
+            top_day = self._passengers_by("Date").set_index("Date")["Total_Passengers"].idxmax()
             top_day_str = top_day.strftime("%d.%m.%Y")
         else:
+            top_airline = "—"
             top_day_str = "—"
 
         col1, col2, col3 = st.columns(3)
-        col1.metric("🎫 Общий пассажиропоток", f"{total_passengers:,}")
+        col1.metric("🎫 Общий пассажиропоток", f"{total_passengers:,.0f}")
         col2.metric("🧍‍♂️ Средняя загрузка борта", f"{avg_load:.0f} чел")
         col3.metric("❌ Кол-во отмен", f"{int(total_cancellations):,}")
 
         col4, col5, col6 = st.columns(3)
         col4.metric("⏱ Средняя задержка", f"{avg_delay:.1f} мин")
         col5.metric("🏆 Топ авиакомпания", top_airline)
-        col6.metric("📈 Пиковый день", top_day.strftime("%d.%m.%Y"))
+        col6.metric("📈 Пиковый день", top_day_str)
 
+    @fragment
     def render_by_time(self):
         st.subheader("📅 Пассажиропоток во времени")
 
-        tab1, tab2, tab3, tab4, tab5 = st.tabs(
-            ["📈 Динамика по времени (drill-down)",
-             "📊 По дням недели",
-             "⏰ По времени суток",
-             "🔥 Тепловая карта",
-             "📅 Сравнение по месяцам"])
+        # Вместо вкладок — переключатель: считается только выбранное представление
+        views = ["📈 Динамика по времени (drill-down)",
+                 "📊 По дням недели",
+                 "⏰ По времени суток",
+                 "🔥 Тепловая карта",
+                 "📅 Сравнение по месяцам"]
+        view = st.radio("Представление", views, horizontal=True, label_visibility="collapsed")
 
         # Drilldown: Год → Месяц → Неделя → День
-        with tab1:
+        if view == views[0]:
             level = st.selectbox("Уровень детализации", ["Год", "Месяц", "Неделя", "День"])
 
             if level == "Год":
-                df_time = self.filtered_df.groupby("Year")["Total_Passengers"].sum().reset_index()
+                df_time = self._passengers_by("Year")
                 fig = px.bar(df_time, x="Year", y="Total_Passengers", title="Пассажиропоток по годам")
 
             elif level == "Месяц":
-                df_time = self.filtered_df.groupby("YearMonth")["Total_Passengers"].sum().reset_index()
+                df_time = self._passengers_by("YearMonth")
                 fig = px.line(df_time, x="YearMonth", y="Total_Passengers", title="По месяцам", markers=True)
 
             elif level == "Неделя":
-                self.filtered_df["Week"] = self.filtered_df["Date"].dt.isocalendar().week
-                df_time = self.filtered_df.groupby(["Year", "Week"])["Total_Passengers"].sum().reset_index()
+                # Номер недели предрасчитан при загрузке и входит в ключи куба
+                df_time = self._passengers_by(["Year", "Week"])
                 df_time["YearWeek"] = df_time["Year"].astype(str) + "-W" + df_time["Week"].astype(str)
                 fig = px.line(df_time, x="YearWeek", y="Total_Passengers", title="По неделям", markers=True)
 
             elif level == "День":
-                df_time = self.filtered_df.groupby("Date")["Total_Passengers"].sum().reset_index()
-                fig = px.line(df_time, x="Date", y="Total_Passengers", title="По дням", markers=True)
+                df_time = self._passengers_by("Date")
+                # Длинная история прореживается до бюджета точек с сохранением пиков и провалов
+                fig = go.Figure(line_trace(df_time["Date"], df_time["Total_Passengers"], name="Total_Passengers",
+                                           mode="lines+markers" if len(df_time) <= 365 else "lines"))
+                fig.update_layout(title="По дням", xaxis_title="Date", yaxis_title="Total_Passengers")
 
             st.plotly_chart(fig, use_container_width=True)
 
         # Bar chart по дням недели
-        with tab2:
-            df_weekday = self.filtered_df.groupby("DayOfWeek")["Total_Passengers"].mean().reset_index()
+        if view == views[1]:
+            df_weekday = self._passengers_by("DayOfWeek", stat="mean")
             fig = px.bar(df_weekday, x="DayOfWeek", y="Total_Passengers", title="Средний пассажиропоток по дням недели")
             st.plotly_chart(fig, use_container_width=True)
 
         # Boxplot пассажиропотока по времени суток
-        with tab3:
-            # Удаление экстремальных выбросов
-            q1 = self.filtered_df["Total_Passengers"].quantile(0.25)
-            q3 = self.filtered_df["Total_Passengers"].quantile(0.75)
+        if view == views[2]:
+            # Удаление экстремальных выбросов; квартили считаем по частотам значений
+            counts = self._value_counts(["TimeOfDay", "Total_Passengers"])
+            quartiles = [weighted_quantile(counts, [], "Total_Passengers", q)["Total_Passengers"]
+                         for q in (0.25, 0.75)]
+            q1, q3 = (quartiles[0].iloc[0], quartiles[1].iloc[0]) if not counts.empty else (0.0, 0.0)
             iqr = q3 - q1
-            filtered_no_outliers = self.filtered_df[
-                (self.filtered_df["Total_Passengers"] >= q1 - 1.5 * iqr) &
-                (self.filtered_df["Total_Passengers"] <= q3 + 1.5 * iqr)
+            filtered_no_outliers = counts[
+                (counts["Total_Passengers"] >= q1 - 1.5 * iqr) &
+                (counts["Total_Passengers"] <= q3 + 1.5 * iqr)
                 ]
 
-            fig = px.box(filtered_no_outliers,
-                         x="TimeOfDay",
-                         y="Total_Passengers",
-                         title="Распределение по времени суток (без выбросов)")
+            fig = go.Figure(data=self._box_trace(filtered_no_outliers, "TimeOfDay", "Total_Passengers"))
+            fig.update_layout(title="Распределение по времени суток (без выбросов)",
+                              xaxis_title="TimeOfDay", yaxis_title="Total_Passengers")
             st.plotly_chart(fig, use_container_width=True)
 
         # Тепловая карта: день недели vs час
-        with tab4:
-            heat_df = self.filtered_df.groupby(["DayOfWeek", "Hour"])["Total_Passengers"].mean().reset_index()
+        if view == views[3]:
+            heat_df = self._passengers_by(["DayOfWeek", "Hour"], stat="mean")
             heatmap_data = heat_df.pivot(index="DayOfWeek", columns="Hour", values="Total_Passengers")
             fig = go.Figure(data=go.Heatmap(
                 z=heatmap_data.values,
@@ -173,50 +309,66 @@ class PassengerDashboard:
             st.plotly_chart(fig, use_container_width=True)
 
         # Линейный график пассажиропотока по месяцам с наложением по годам
-        with tab5:
-            df_month_year = self.filtered_df.groupby(["Year", "Month"])["Total_Passengers"].sum().reset_index()
+        if view == views[4]:
+            df_month_year = self._passengers_by(["Year", "Month"])
             fig = px.line(df_month_year, x="Month", y="Total_Passengers", color="Year",
                           title="Пассажиропоток по месяцам (по годам наложением)",
                           labels={"Total_Passengers": "Пассажиропоток", "Month": "Месяц"})
             st.plotly_chart(fig, use_container_width=True)
 
+    @fragment
     def render_delay_relation(self):
         st.subheader("🔗 Связь с задержками и отменами")
 
-        # Вычисляем статистики для каждого значения пассажиропотока
-        df_stats = self.filtered_df.groupby("Total_Passengers")["DelayTime"].agg(
-            mean_delay="mean",
-            median_delay="median",
-            # max_delay="max"
-        ).reset_index()
-
-        # Построение одного графика с тремя линиями для каждой статистики
-        fig = px.line(df_stats,
-                      x="Total_Passengers",
-                      y=["mean_delay",
-                         "median_delay",
-                         # "max_delay"
-                         ],
-                      title="Зависимость задержки от пассажиропотока",
-                      labels={"mean_delay": "Средняя задержка",
-                              "median_delay": "Медианная задержка",
-                              # "max_delay": "Максимальная задержка"
-                              })
+        # Пассажиропоток разбивается на корзины; в каждой — средняя и медианная задержка с интервалами
+        col1, col2 = st.columns([2, 1])
+        method = col1.radio("Разбиение пассажиропотока", list(BIN_METHODS), horizontal=True,
+                            format_func=BIN_METHODS.get)
+        n_bins, custom = DEFAULT_BINS, ()
+        if method == "custom":
+            text = col2.text_input("Границы через запятую", "50, 100, 150, 200")
+            try:
+                custom = parse_custom_edges(text)
+            except ValueError:
+                col2.warning("Границы должны быть числами")
+        else:
+            n_bins = col2.slider("Число корзин", 5, 50, DEFAULT_BINS)
 
+        df_stats = get_delay_relation(None if self.use_db else self.snapshot.version, self.selection_key,
+                                      method, n_bins, custom,
+                                      lambda: self._value_counts(["Total_Passengers", "DelayTime"]))
+        if df_stats.empty:
+            st.info("Нет рейсов для выбранных фильтров")
+            return
+
+        fig = go.Figure()
+        for stat, name, color in [("mean", "Средняя задержка", "31, 119, 180"),
+                                  ("median", "Медианная задержка", "255, 127, 14")]:
+            fig.add_trace(go.Scatter(x=df_stats["center"], y=df_stats[f"{stat}_hi"], mode="lines",
+                                     line=dict(width=0), showlegend=False, hoverinfo="skip"))
+            fig.add_trace(go.Scatter(x=df_stats["center"], y=df_stats[f"{stat}_lo"], mode="lines",
+                                     line=dict(width=0), fill="tonexty", fillcolor=f"rgba({color}, 0.2)",
+                                     name=f"95% интервал: {name.lower()}", hoverinfo="skip"))
+            fig.add_trace(go.Scatter(x=df_stats["center"], y=df_stats[stat], mode="lines+markers", name=name,
+                                     line=dict(color=f"rgb({color})"), customdata=df_stats[["left", "right", "rows"]],
+                                     hovertemplate="%{customdata[0]:.0f}–%{customdata[1]:.0f} пасс.: "
+                                                   "%{y:.1f} мин, рейсов %{customdata[2]:,}"))
+        fig.update_layout(title="Зависимость задержки от пассажиропотока", xaxis_title="Пассажиров на рейсе",
+                          yaxis_title="Задержка, мин")
         st.plotly_chart(fig, use_container_width=True)
 
     def render_airline_comparison(self):
         st.subheader("✈️ Сравнение авиакомпаний")
 
-        df_airlines = self.filtered_df.groupby("Airline_name")["Total_Passengers"].sum().reset_index().sort_values(
-            by="Total_Passengers", ascending=False).head(10)
+        df_airlines = self._passengers_by("Airline_name").sort_values(by="Total_Passengers", ascending=False).head(10)
         fig = px.bar(df_airlines, x="Airline_name", y="Total_Passengers",
                      title="Топ-10 авиакомпаний по пассажиропотоку")
         st.plotly_chart(fig, use_container_width=True)
 
         # Группировка по авиакомпаниям и подсчёт количества отменённых рейсов
-        df_cancel = self.filtered_df[self.filtered_df["IsCancelled"] == 1]
-        df_cancel = df_cancel.groupby("Airline_name").size().reset_index(name="Cancelled_Count")
+        df_cancel = self._aggregate(["Airline_name", "IsCancelled"])
+        df_cancel = df_cancel[df_cancel["IsCancelled"] == 1]
+        df_cancel = df_cancel.groupby("Airline_name", observed=True)["rows"].sum().reset_index(name="Cancelled_Count")
 
         # Удаление авиакомпаний с нулём отмен (на всякий случай) и сортировка по убыванию
         df_cancel = df_cancel[df_cancel["Cancelled_Count"] > 0].sort_values(by="Cancelled_Count", ascending=False)
@@ -228,17 +380,96 @@ class PassengerDashboard:
 
         st.plotly_chart(fig2, use_container_width=True)
 
+    @fragment
     def render_anomaly_detection(self):
         st.subheader("⚠️ Выявление аномалий")
 
-        df_date = self.filtered_df.groupby("Date")["Total_Passengers"].sum().reset_index()
-        df_date["rolling"] = df_date["Total_Passengers"].rolling(window=7).mean()
-        df_date["diff"] = df_date["Total_Passengers"] - df_date["rolling"]
+        granularity = st.radio("Шаг", ["day", "hour"], horizontal=True,
+                               format_func={"day": "По дням", "hour": "По часам"}.get)
+
+        version = None if self.use_db else self.snapshot.version
+        detector = get_anomaly_detector(self.selection_key, granularity)
+        # Детектор общий для сессий: дальше читается только один неизменяемый снимок
+        state = detector.state
+        if version is None or state.version != version:
+            # Ряды итога и каждой авиакомпании на полной сетке времени
+            if granularity == "day":
+                df_series = self._aggregate(["Date", "Airline_name"])
+                df_series["Timestamp"] = df_series["Date"]
+            else:
+                df_series = self._aggregate(["Date", "Hour", "Airline_name"])
+                df_series["Timestamp"] = df_series["Date"] + pd.to_timedelta(df_series["Hour"], unit="h")
+            matrix = series_matrix(df_series, "Timestamp", "Airline_name", "pax_sum",
+                                   detector.params["freq"], "Итого")
+            state = detector.sync(matrix, version)
+
+        if len(state.index) == 0:
+            st.info("Нет данных для выбранных фильтров")
+            return
+
+        flags = state.flags(detector.params["threshold"])
+        total_flags = flags[flags["Series"] == "Итого"].drop_duplicates("Timestamp")
+
+        fig = go.Figure()
+        fig.add_trace(line_trace(state.index, state.values[:, 0], name='Пассажиры'))
+        fig.add_trace(line_trace(state.index, state.expected[:, 0], name='Ожидаемое'))
+        fig.add_trace(go.Scatter(x=total_flags["Timestamp"], y=total_flags["Value"], mode='markers',
+                                 name='Аномалии', marker=dict(color="red", size=8),
+                                 text=total_flags["Method"]))
+        fig.update_layout(title="Аномалии пассажиропотока (скользящая z-оценка, тот же день недели, "
+                                "сезонная декомпозиция)")
+        st.plotly_chart(fig, use_container_width=True)
 
+        # Самые сильные отклонения по авиакомпаниям
+        airline_flags = flags[flags["Series"] != "Итого"]
+        airline_flags = airline_flags.reindex(airline_flags["Score"].abs().sort_values(ascending=False).index).head(20)
+        st.dataframe(airline_flags.rename(columns={"Timestamp": "Время", "Series": "Авиакомпания",
+                                                   "Value": "Пассажиры", "Expected": "Ожидание",
+                                                   "Method": "Метод", "Score": "z"}),
+                     hide_index=True, use_container_width=True)
+
+    @fragment
+    def render_forecast(self):
+        st.subheader("🔮 Прогноз пассажиропотока")
+
+        if not os.path.exists(FORECASTS_PATH):
+            st.info("Прогноз ещё не рассчитан: запустите `python -m utils.forecast`")
+            return
+        forecasts = load_forecasts(os.stat(FORECASTS_PATH).st_mtime_ns)
+        if forecasts is None or forecasts.empty:
+            st.info("Прогноз ещё не рассчитан: запустите `python -m utils.forecast`")
+            return
+
+        if self.use_db:
+            actuals = build_series(load_db_aggregate(("Date", "Airline_name", "Departure_Arrival"), None))
+        else:
+            actuals = get_forecast_actuals(self.snapshot.version, self.snapshot.cube)
+
+        names = sorted(forecasts["Series"].unique(), key=lambda name: (name != TOTAL_SERIES, name))
+        series = st.selectbox("Ряд (авиакомпания / направление, без учёта фильтров)", names)
+        df_fc = forecasts[forecasts["Series"] == series]
+        latest = df_fc[df_fc["Issued"] == df_fc["Issued"].max()]
+        actual = actuals[series] if series in actuals.columns else pd.Series(dtype="float64")
+
+        # Для каждой даты берём самый свежий прогноз, выпущенный до неё, и сравниваем с фактом
+        checked = (df_fc.sort_values("Issued").drop_duplicates("Date", keep="last")
+                   .merge(actual.rename("actual"), left_on="Date", right_index=True))
+        outside = checked[(checked["actual"] < checked["lower"]) | (checked["actual"] > checked["upper"])]
+        if not outside.empty:
+            st.warning(f"Факт вышел за доверительный интервал прогноза в {len(outside)} дн., "
+                       f"последний раз — {outside['Date'].max():%d.%m.%Y}")
+
+        recent = actual[actual.index >= latest["Date"].min() - pd.Timedelta(days=120)]
         fig = go.Figure()
-        fig.add_trace(go.Scatter(x=df_date["Date"], y=df_date["Total_Passengers"], mode='lines', name='Пассажиры'))
-        fig.add_trace(go.Scatter(x=df_date["Date"], y=df_date["rolling"], mode='lines', name='7-дн среднее'))
-        fig.update_layout(title="Отклонения от среднего (7 дней)")
+        fig.add_trace(go.Scatter(x=latest["Date"], y=latest["upper"], mode="lines", line=dict(width=0),
+                                 showlegend=False, hoverinfo="skip"))
+        fig.add_trace(go.Scatter(x=latest["Date"], y=latest["lower"], mode="lines", line=dict(width=0),
+                                 fill="tonexty", name="95% интервал"))
+        fig.add_trace(line_trace(recent.index, recent.to_numpy(), name="Факт"))
+        fig.add_trace(go.Scatter(x=latest["Date"], y=latest["yhat"], mode="lines", name="Прогноз"))
+        fig.add_trace(go.Scatter(x=outside["Date"], y=outside["actual"], mode="markers", name="Вне интервала",
+                                 marker=dict(color="red", size=8)))
+        fig.update_layout(title=f"Прогноз от {latest['Issued'].max():%d.%m.%Y}")
         st.plotly_chart(fig, use_container_width=True)
 
     def run(self):
@@ -248,6 +479,7 @@ class PassengerDashboard:
         self.render_delay_relation()
         self.render_airline_comparison()
         self.render_anomaly_detection()
+        self.render_forecast()
 
 
 
@@ -2,10 +2,13 @@
 
 import streamlit as st
 from components.passenger_dashboard import PassengerDashboard
+from utils.warmup import start_warmup
 
 
 def main():
     st.set_page_config(page_title="📊 Пассажиропоток", layout="wide")
+    # Первый посетитель любой страницы запускает прогрев остальных источников
+    start_warmup()
 
     st.title("📊 Анализ пассажиропотока")
     st.markdown("Интерактивный анализ на основе рейсовых данных")
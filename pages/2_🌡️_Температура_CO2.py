@@ -1,9 +1,12 @@
 # pages/2_🌡️_Температура_CO2.py
 
 from components.environment_dashboard import EnvironmentDashboard
+from utils.warmup import start_warmup
 
 
 def main():
+    # Первый посетитель любой страницы запускает прогрев остальных источников
+    start_warmup()
     dashboard = EnvironmentDashboard()
     dashboard.run()
 
@@ -1,9 +1,12 @@
 # pages/3_✈️_Задержки.py
 
 from components.delay_dashboard import DelayDashboard
+from utils.warmup import start_warmup
 
 
 def main():
+    # Первый посетитель любой страницы запускает прогрев остальных источников
+    start_warmup()
     dashboard = DelayDashboard()
     dashboard.run()
 
@@ -1,9 +1,12 @@
 # pages/4_🗣️_Жалобы.py
 
 from components.complaints_dashboard import ComplaintsDashboard
+from utils.warmup import start_warmup
 
 
 def main():
+    # Первый посетитель любой страницы запускает прогрев остальных источников
+    start_warmup()
     dashboard = ComplaintsDashboard()
     dashboard.run()
 
@@ -0,0 +1,14 @@
+# pages/5_🩺_Диагностика.py
+
+from components.diagnostics_dashboard import DiagnosticsDashboard
+from utils.metrics import serve_from_env
+
+
+def main():
+    serve_from_env()
+    dashboard = DiagnosticsDashboard()
+    dashboard.run()
+
+
+if __name__ == "__main__":
+    main()
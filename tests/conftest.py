@@ -0,0 +1,55 @@
+# tests/conftest.py
+
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import write_csv
+from utils.metrics import silence_bare_mode
+
+# Тесты работают без сервера Streamlit: кэши st.cache_* действуют, предупреждения bare mode не нужны
+silence_bare_mode()
+
+FLIGHT_ROWS = 3000
+FLIGHT_DAYS = 60
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Пути данных и кэшей в utils относительные (data/...) — каждый тест в своём каталоге
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("data")
+    yield tmp_path
+    import streamlit as st
+    st.cache_data.clear()
+    st.cache_resource.clear()
+
+
+@pytest.fixture
+def flights_csv(workdir):
+    return write_csv(os.path.join("data", "transformed.csv"), FLIGHT_ROWS, days=FLIGHT_DAYS)
+
+
+@pytest.fixture
+def append_flights():
+    # Дописывает в CSV копию последних n строк (с заменой значений колонок), как новая выгрузка
+    def append(path, n, **changes):
+        rows = pd.read_csv(path).tail(n).copy()
+        for col, value in changes.items():
+            rows[col] = value
+        rows.to_csv(path, mode="a", header=False, index=False)
+        return rows
+    return append
+
+
+@pytest.fixture
+def flights_db(flights_csv, monkeypatch):
+    # Та же выгрузка рейсов в SQLite: режим БД (utils/db.py) без сервера
+    import sqlalchemy
+    from utils import db
+    engine = sqlalchemy.create_engine("sqlite:///data/airport.db")
+    pd.read_csv(flights_csv).to_sql(db.PASSENGER_TABLE, engine, index=False)
+    engine.dispose()
+    monkeypatch.setenv(db.DB_URL_ENV, "sqlite:///data/airport.db")
+    return pd.read_csv(flights_csv, parse_dates=["Date"])
@@ -0,0 +1,64 @@
+# tests/test_anomaly.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.anomaly import AnomalyDetector, GRANULARITY
+
+
+def _matrix(granularity, periods, seed=0):
+    # Итог с недельным и суточным циклом и трендом, плотная и редкая авиакомпании
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01", periods=periods, freq=GRANULARITY[granularity]["freq"])
+    step = np.arange(periods)
+    cycle = 1 + 0.3 * np.sin(2 * np.pi * step / 7) if granularity == "day" else \
+        1 + 0.5 * np.sin(2 * np.pi * step / 24)
+    dense = rng.poisson(400 * cycle * (1 + 0.1 * step / periods)).astype(float)
+    sparse = np.where(rng.random(periods) < 0.05, 150.0, 0.0)
+    return pd.DataFrame({"Итого": dense + sparse, "A": dense, "B": sparse}, index=index)
+
+
+@pytest.mark.parametrize("granularity, periods, tails", [
+    ("day", 500, [1, 5, 40]),
+    ("hour", 2000, [1, 30, 300]),
+])
+def test_incremental_sync_matches_full_recompute(granularity, periods, tails):
+    matrix = _matrix(granularity, periods)
+    full = AnomalyDetector(granularity).sync(matrix)
+    for tail in tails:
+        detector = AnomalyDetector(granularity)
+        detector.sync(matrix.iloc[:-tail])
+        state = detector.sync(matrix)
+        for method, z in full.scores.items():
+            np.testing.assert_array_equal(state.scores[method], z)
+        np.testing.assert_array_equal(state.expected, full.expected)
+
+    # Правка в середине ряда пересчитывает хвост так же, как полный пересчёт
+    edited = matrix.copy()
+    edited.iloc[periods // 2] *= 3
+    detector = AnomalyDetector(granularity)
+    detector.sync(matrix)
+    state = detector.sync(edited)
+    expected = AnomalyDetector(granularity).sync(edited)
+    for method, z in expected.scores.items():
+        np.testing.assert_array_equal(state.scores[method], z)
+
+
+def test_snapshot_is_immutable_and_sparse_series_skipped():
+    matrix = _matrix("hour", 2000)
+    detector = AnomalyDetector("hour")
+    state = detector.sync(matrix, "v1")
+    with pytest.raises(ValueError):
+        state.values[0, 0] = 1
+
+    # Следующий sync подменяет снимок, прочитанный ранее снимок не меняется
+    scores = state.scores["rolling"].copy()
+    detector.sync(matrix.iloc[:-100], "v0")
+    np.testing.assert_array_equal(state.scores["rolling"], scores)
+    assert state.version == "v1" and detector.state.version == "v0"
+
+    # Редкий ряд (рейс в 5% часов) не оценивается; плотные отмечаются редко
+    flags = state.flags(detector.params["threshold"])
+    assert not (flags["Series"] == "B").any()
+    assert (flags["Series"] == "A").sum() < 0.01 * len(matrix)
@@ -0,0 +1,57 @@
+# tests/test_api.py
+
+import json
+
+from utils import db
+from utils.api import AggregationApi
+from utils.metrics import stage_summary
+
+
+def _get(api, path, query="", etag=None):
+    status, headers, body = api.handle(path, query, if_none_match=etag)
+    return status, headers, json.loads(body) if body else None
+
+
+def test_repeated_requests_skip_filter_parsing(flights_csv):
+    api = AggregationApi()
+    status, headers, first = _get(api, "/series", "by=YearMonth&Year=2022")
+    assert status == 200 and first
+
+    # Повтор и If-None-Match обслуживаются по ключу из параметров, без разбора фильтров
+    def fail(*args):
+        raise AssertionError("фильтры не должны разбираться повторно")
+    api._selection = fail
+    assert _get(api, "/series", "by=YearMonth&Year=2022", headers["ETag"])[0] == 304
+    assert _get(api, "/series", "by=YearMonth&Year=2022")[2] == first
+    del api._selection
+
+    assert _get(api, "/series", "by=Foo")[0] == 400
+    assert _get(api, "/kpi", "Year=1999")[0] == 400
+
+
+def test_db_mode_caches_options_and_rejects_missing_columns(flights_db, monkeypatch):
+    api = AggregationApi()
+    assert api.use_db
+    calls = []
+    distinct_values = db.distinct_values
+    monkeypatch.setattr(db, "distinct_values", lambda col: calls.append(col) or distinct_values(col))
+
+    status, _, kpi = _get(api, "/kpi", "Year=2022")
+    assert status == 200 and kpi["rows"] == int((flights_db["Year"] == 2022).sum())
+    assert _get(api, "/airlines", "Year=2022&top=3")[0] == 200
+    assert calls == ["Year"]
+
+    # Производных календарных колонок в выгрузке нет: 400, а не KeyError
+    status, _, error = _get(api, "/series", "by=Week")
+    assert status == 400 and "Week" in error["error"]
+    assert _get(api, "/series", "Season=Лето")[0] == 400
+    assert _get(api, "/delay-quantiles", "by=Quarter")[0] == 400
+
+
+def test_unknown_paths_share_one_metric_label(flights_csv):
+    api = AggregationApi()
+    for path in ["/nope", "/x/1", "/x/2", "/kpi/"]:
+        api.handle(path, "")
+    stages = set(stage_summary()["stage"])
+    assert {"api/unknown", "api/kpi"} <= stages
+    assert not any(stage.startswith("api/x") or stage == "api/nope" for stage in stages)
@@ -0,0 +1,75 @@
+# tests/test_binning.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.binning import bin_edges, binned_relationship, parse_custom_edges
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("50, 100, 150, 200", (50.0, 100.0, 150.0, 200.0)),
+    ("200;50 , 100,", (200.0, 50.0, 100.0)),
+    ("-5, 1e2", (-5.0, 100.0)),
+    ("", ()),
+    (None, ()),
+])
+def test_parse_custom_edges(text, expected):
+    assert parse_custom_edges(text) == expected
+
+
+@pytest.mark.parametrize("text", ["50, сто", "1,,x", "nan", "10, inf"])
+def test_parse_custom_edges_rejects_bad_input(text):
+    with pytest.raises(ValueError):
+        parse_custom_edges(text)
+
+
+def test_custom_edges_sorted_and_extended_to_data():
+    x = np.array([10, 60, 120, 400])
+    edges = bin_edges(x, np.ones(4), "custom", custom=(200, 50, 100, 100))
+    # Границы сортируются, повторы схлопываются, крайние корзины доходят до min и max данных
+    np.testing.assert_array_equal(edges, [10, 50, 100, 200, 400])
+    # Без границ — равные интервалы
+    np.testing.assert_array_equal(bin_edges(x, np.ones(4), "custom", n_bins=3, custom=()),
+                                  np.linspace(10, 400, 4))
+
+
+def test_quantile_edges_follow_weights():
+    x = np.arange(1, 101, dtype=float)
+    edges = bin_edges(x, np.ones(100), "quantile", n_bins=4)
+    np.testing.assert_array_equal(edges, [1, 25, 50, 75, 100])
+    # Вес значения — число рейсов: у x = 1 половина рейсов, две первые корзины сливаются в одну
+    weights = np.ones(100)
+    weights[0] = 100
+    np.testing.assert_array_equal(bin_edges(x, weights, "quantile", n_bins=4), [1, 51, 100])
+    # Мало различных значений: повторяющиеся границы схлопываются
+    np.testing.assert_array_equal(bin_edges([1, 1, 1, 2], np.ones(4), "quantile", n_bins=10), [1, 2])
+
+
+@pytest.mark.parametrize("x, weights", [
+    ([], []),
+    ([np.nan, np.inf, 5.0], [1, 1, 0]),
+    ([3.0, 3.0], [1, 2]),
+])
+def test_degenerate_input_gives_one_bin(x, weights):
+    edges = bin_edges(x, weights, "width", n_bins=5)
+    assert len(edges) == 2 and edges[1] > edges[0]
+
+
+def test_binned_relationship_matches_groupby():
+    rng = np.random.default_rng(0)
+    flights = pd.DataFrame({"x": rng.integers(0, 300, 5000), "y": rng.exponential(15, 5000).round()})
+    flights.loc[::50, "y"] = np.nan
+    counts = flights.groupby(["x", "y"], dropna=False).size().reset_index(name="rows")
+    edges = bin_edges(counts["x"], counts["rows"], "custom", custom=parse_custom_edges("50, 100, 200"))
+    result = binned_relationship(counts, "x", "y", edges)
+
+    valid = flights.dropna()
+    bins = pd.cut(valid["x"], edges, right=False, include_lowest=True, labels=False)
+    # Правая граница последней корзины включается
+    bins = bins.fillna(len(edges) - 2)
+    expected = valid.groupby(bins)["y"].agg(["size", "mean", "median"])
+    np.testing.assert_array_equal(result["rows"], expected["size"])
+    np.testing.assert_allclose(result["mean"], expected["mean"])
+    np.testing.assert_allclose(result["median"], expected["median"])
+    assert (result["mean_lo"] <= result["mean"]).all() and (result["median_hi"] >= result["median"]).all()
@@ -0,0 +1,73 @@
+# tests/test_complaints.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.complaints import ComplaintsStore, stem
+from utils.preprocessing import COMPLAINTS_CSV
+
+TEXTS = ["Потерян багаж на рейсе", "Долгая очередь на регистрации", "Багаж потеряли, никто не помог",
+         "Грязно в зале ожидания", "Задержка рейса без объяснений"]
+
+
+def _complaints(n, start, seed):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, 30, n), unit="D")
+    return pd.DataFrame({"Дата": dates.strftime("%d.%m.%Y"),
+                         "Категория": rng.choice(["Багаж", "Сервис"], n),
+                         "Текст жалобы": rng.choice(TEXTS, n)})
+
+
+@pytest.fixture
+def complaints_csv(workdir):
+    _complaints(300, "2024-01-01", 0).to_csv(COMPLAINTS_CSV, index=False)
+    return COMPLAINTS_CSV
+
+
+def test_appended_complaints_match_full_index(complaints_csv):
+    store = ComplaintsStore(complaints_csv)
+    assert store.index.docs["Date"].min() == pd.Timestamp("2024-01-01")
+
+    _complaints(50, "2024-02-01", 1).to_csv(complaints_csv, mode="a", header=False, index=False)
+    assert store.refresh() == 50
+    full = ComplaintsStore(complaints_csv)
+
+    pd.testing.assert_frame_equal(store.index.docs, full.index.docs)
+    for query in ["багаж", '"потерян багаж"', "рейс задержка", "очередь"]:
+        found = store.index.search(query)
+        assert len(found)
+        np.testing.assert_array_equal(found, full.index.search(query))
+    rows = store.index.select("2024-02-01", None, ["Багаж"])
+    assert len(rows) and (store.index.docs["Date"].iloc[rows] >= "2024-02-01").all()
+    totals, _ = store.index.top_terms(top=3)
+    pd.testing.assert_frame_equal(totals, full.index.top_terms(top=3)[0])
+
+
+def test_refresh_keeps_old_index_unchanged(complaints_csv):
+    store = ComplaintsStore(complaints_csv)
+    old = store.index
+    docs, doc_freq, stems = old.docs.copy(), old.vocabulary.doc_freq.copy(), len(old.vocabulary.stems)
+    found = old.search("багаж")
+
+    extra = _complaints(50, "2024-02-01", 1)
+    extra["Текст жалобы"] = "Сломанный чемодан " + extra["Текст жалобы"]
+    extra.to_csv(complaints_csv, mode="a", header=False, index=False)
+    assert store.refresh() == 50
+    # Сессия, прочитавшая индекс до обновления, видит его прежним
+    assert store.index is not old
+    pd.testing.assert_frame_equal(old.docs, docs)
+    np.testing.assert_array_equal(old.vocabulary.doc_freq, doc_freq)
+    assert len(old.vocabulary.stems) == stems and old.vocabulary.lookup([stem("чемодан")])[0] == -1
+    np.testing.assert_array_equal(old.search("багаж"), found)
+    assert len(store.index.search("чемодан")) == 50
+
+
+def test_rewritten_larger_file_reloads(complaints_csv):
+    store = ComplaintsStore(complaints_csv)
+    # Файл перезаписан другими жалобами и стал длиннее: дописыванием это не считается
+    _complaints(400, "2023-06-01", 2).to_csv(complaints_csv, index=False)
+    assert store.refresh() == 400
+    full = ComplaintsStore(complaints_csv)
+    pd.testing.assert_frame_equal(store.index.docs, full.index.docs)
+    assert store.index.docs["Date"].min() == pd.Timestamp("2023-06-01")
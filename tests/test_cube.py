@@ -0,0 +1,33 @@
+# tests/test_cube.py
+
+import pandas as pd
+
+from utils.cube import CUBE_KEYS, build_cube, merge_cube, rollup
+from utils.preprocessing import read_passenger_data
+from utils.sketch import build_sketch, merge_sketch
+
+
+def _cells(table, keys):
+    keys = [col for col in keys if col in table.columns]
+    return table.astype({col: str for col in keys}).sort_values(keys, ignore_index=True)
+
+
+def test_merged_cube_and_sketch_match_full_build(flights_csv):
+    df = read_passenger_data(flights_csv)
+    # Порция начинается посреди дня: ячейки этого дня сливаются со старыми
+    split = len(df) - 200
+    head, batch = df.iloc[:split], df.iloc[split:]
+
+    cube, keep = merge_cube(build_cube(head), build_cube(batch))
+    full = build_cube(df)
+    assert 0 < keep < len(cube)
+    assert cube.dtypes.equals(full.dtypes)
+    pd.testing.assert_frame_equal(_cells(cube, CUBE_KEYS), _cells(full, CUBE_KEYS))
+    assert cube["Date"].is_monotonic_increasing
+
+    sketch, _ = merge_sketch(build_sketch(head), build_sketch(batch))
+    keys = list(sketch.columns.drop("rows"))
+    pd.testing.assert_frame_equal(_cells(sketch, keys), _cells(build_sketch(df), keys))
+
+    by_month = rollup(cube, ["YearMonth"])
+    assert by_month["rows"].sum() == len(df)
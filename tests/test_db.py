@@ -0,0 +1,35 @@
+# tests/test_db.py
+
+import numpy as np
+import pandas as pd
+
+from utils import db
+from utils.cube import build_cube, rollup
+
+
+def test_aggregate_matches_pandas(flights_db):
+    df = flights_db
+    cells = db.aggregate(["Date", "Airline_name"], {"Year": [2022], "Departure_Arrival": None})
+    cells = cells.sort_values(["Date", "Airline_name"], ignore_index=True)
+    flights = df[df["Year"] == 2022]
+    expected = (flights.groupby(["Date", "Airline_name"])
+                .agg(rows=("Total_Passengers", "size"), pax_sum=("Total_Passengers", "sum"),
+                     delay_count=("DelayTime", "count"), delay_sum=("DelayTime", "sum"))
+                .reset_index())
+    for col in expected.columns:
+        np.testing.assert_array_equal(cells[col].to_numpy(), expected[col].to_numpy())
+
+    # Ячейки БД сворачиваются так же, как куб из памяти
+    by_airline = rollup(cells, ["Airline_name"]).set_index("Airline_name")
+    from_cube = rollup(build_cube(flights), ["Airline_name"]).set_index("Airline_name")
+    for col in ["rows", "pax_mean", "pax_std", "delay_mean", "delay_std"]:
+        np.testing.assert_allclose(by_airline[col], from_cube[col], rtol=1e-9)
+
+
+def test_value_counts_matches_pandas(flights_db):
+    counts = db.value_counts(["Airline_name", "DelayTime"], {"IsCancelled": [0]})
+    flights = flights_db[~flights_db["IsCancelled"]]
+    expected = flights.groupby(["Airline_name", "DelayTime"], dropna=False).size()
+    counts = counts.set_index(["Airline_name", "DelayTime"])["rows"]
+    pd.testing.assert_series_equal(counts.sort_index(), expected.sort_index(), check_names=False)
+    assert db.query_stats()["calls"].sum() >= 1
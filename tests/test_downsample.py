@@ -0,0 +1,34 @@
+# tests/test_downsample.py
+
+import numpy as np
+import pandas as pd
+
+from utils.downsample import downsample_indices
+
+
+def _series(n=20_000):
+    rng = np.random.default_rng(0)
+    x = pd.date_range("2024-01-01", periods=n, freq="min").to_numpy()
+    y = np.cumsum(rng.normal(0, 1, n))
+    y[123] = y.max() + 50
+    y[4567] = np.nan
+    return x, y
+
+
+def test_minmax_keeps_extremes_and_ends():
+    x, y = _series()
+    idx = downsample_indices(x, y, n_out=500, method="minmax")
+    assert len(idx) <= 502 and np.all(np.diff(idx) > 0)
+    assert idx[0] == 0 and idx[-1] == len(y) - 1 and 4567 not in idx
+    assert {int(np.nanargmax(y)), int(np.nanargmin(y))} <= set(idx.tolist())
+
+
+def test_lttb_picks_one_point_per_bucket():
+    x, y = _series()
+    idx = downsample_indices(x, y, n_out=500)
+    assert len(idx) == 500 and np.all(np.diff(idx) > 0)
+    assert idx[0] == 0 and idx[-1] == len(y) - 1 and 4567 not in idx
+    # Выброс образует наибольший треугольник в своей корзине
+    assert 123 in idx
+    # Короткий ряд возвращается без прореживания
+    assert len(downsample_indices(x[:100], y[:100], n_out=500)) == 100
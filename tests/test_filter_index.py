@@ -0,0 +1,55 @@
+# tests/test_filter_index.py
+
+import numpy as np
+
+from utils.filter_index import FILTER_COLUMNS, FilterIndex
+from utils.preprocessing import read_passenger_data
+
+SELECTIONS = [
+    {},
+    {"Year": [2022], "Departure_Arrival": ["Вылет"]},
+    {"Airline_name": ["Авиакомпания 01", "Авиакомпания 02"], "IsCancelled": [False]},
+    {"DelayCategory": ["Новая"]},
+]
+
+
+def _expected(df, selection):
+    mask = np.ones(len(df), dtype=bool)
+    for col, values in selection.items():
+        mask &= df[col].isin(values).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def test_extended_index_matches_fresh_build(flights_csv):
+    df = read_passenger_data(flights_csv)
+    df["DelayCategory"] = df["DelayCategory"].cat.add_categories(["Новая"])
+    df.loc[df.index[-50:], "DelayCategory"] = "Новая"
+    base = FilterIndex(df.iloc[:2000])
+    before = {i: base.select(selection) for i, selection in enumerate(SELECTIONS)}
+
+    # Две порции подряд пишутся в запас буфера; старый индекс своих строк не видит изменёнными
+    step = base.extended(df.iloc[2000:2500]).extended(df.iloc[2500:])
+    assert step.n_rows == len(df) and step.columns == [col for col in FILTER_COLUMNS if col in df.columns]
+    for i, selection in enumerate(SELECTIONS):
+        np.testing.assert_array_equal(step.select(selection), _expected(df, selection))
+        np.testing.assert_array_equal(base.select(selection), before[i])
+
+    # Ветвь от старого индекса (перезапись хвоста) не портит уже выданный индекс
+    branch = base.extended(df.iloc[1900:2100], keep_rows=1900)
+    for selection in SELECTIONS:
+        np.testing.assert_array_equal(branch.select(selection), _expected(df.iloc[:2100], selection))
+        np.testing.assert_array_equal(step.select(selection), _expected(df, selection))
+
+    rows = step.select(SELECTIONS[1])
+    assert step.select(dict(SELECTIONS[1])) is rows and not rows.flags.writeable
+
+
+def test_bool_selection_matches_integer_column(flights_csv):
+    # Выгрузка, где IsCancelled — 0/1: выбор боковой панели [True, False] работает как Series.isin
+    df = read_passenger_data(flights_csv)
+    df["IsCancelled"] = df["IsCancelled"].astype("int8")
+    index = FilterIndex(df)
+    for selected in ([True, False], [False], [True]):
+        np.testing.assert_array_equal(index.select({"IsCancelled": selected}),
+                                      _expected(df, {"IsCancelled": selected}))
+    assert len(index.select({"IsCancelled": [False]})) == (df["IsCancelled"] == 0).sum() > 0
@@ -0,0 +1,24 @@
+# tests/test_forecast.py
+
+import pandas as pd
+
+from utils import forecast
+from utils.cube import build_cube
+from utils.preprocessing import read_passenger_data
+
+
+def test_new_day_refits_only_changed_series(flights_csv):
+    df = read_passenger_data(flights_csv)
+    fitted, unchanged = forecast.run(forecast.build_series(build_cube(df)), workers=1)
+    assert fitted > 2 and unchanged == 0
+
+    # Один рейс на следующий день: сетка дат растёт у всех рядов, но наблюдения — только у двух
+    row = df.tail(1).copy()
+    row["Date"] += pd.Timedelta(days=1)
+    series = f"{row['Airline_name'].iloc[0]} / {row['Departure_Arrival'].iloc[0]}"
+    matrix = forecast.build_series(build_cube(pd.concat([df, row], ignore_index=True)))
+    assert forecast.run(matrix, workers=1) == (2, fitted - 2)
+
+    table = forecast.read_forecasts()
+    latest = table.groupby("Series")["Issued"].max()
+    assert latest[series] == latest[forecast.TOTAL_SERIES] == row["Date"].iloc[0]
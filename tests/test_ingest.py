@@ -0,0 +1,89 @@
+# tests/test_ingest.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.cube import build_cube, rollup, totals
+from utils.filter_index import FilterIndex
+from utils.ingest import PassengerStore
+from utils.preprocessing import read_passenger_data
+
+
+def _sorted(frame, keys):
+    frame = frame.astype({col: str for col in keys if isinstance(frame[col].dtype, pd.CategoricalDtype)})
+    return frame.sort_values(keys, ignore_index=True)
+
+
+def test_append_with_unseen_categories(flights_csv, append_flights):
+    # Новые значения колонок, которых нет в скетче (Reg_type, DelayCategory), и в скетче (Airline_name)
+    store = PassengerStore(flights_csv)
+    rows = store.snapshot.cube["rows"].sum()
+    append_flights(flights_csv, 5, Reg_type="Грузовой", DelayCategory="Новая", Airline_name="Новая авиакомпания")
+
+    assert store.refresh() == 5
+    snapshot = store.snapshot
+    assert snapshot.cube["rows"].sum() == rows + 5
+    assert "Грузовой" in snapshot.cube_index.options("Reg_type")
+    assert "Новая авиакомпания" in snapshot.sketch_index.options("Airline_name")
+    selected = snapshot.cube.iloc[snapshot.cube_index.select({"DelayCategory": ["Новая"]})]
+    assert totals(selected)["rows"] == 5
+
+
+def test_failed_append_keeps_watermark(flights_csv, append_flights):
+    store = PassengerStore(flights_csv)
+    offset = store.offset
+    append_flights(flights_csv, 7)
+
+    def broken(batch):
+        raise RuntimeError("сбой при дописывании")
+
+    store._append = broken
+    with pytest.raises(RuntimeError):
+        store.refresh()
+    assert store.offset == offset
+
+    del store._append
+    assert store.refresh() == 7
+    assert len(store.snapshot.df) == store.snapshot.index.n_rows == 3007
+
+
+def test_chunked_appends_match_full_load(flights_csv, append_flights):
+    store = PassengerStore(flights_csv)
+    for n, changes in [(3, {}), (4, {"TimeOfDay": "Полночь"}), (5, {"Airline_name": "Новая авиакомпания"})]:
+        append_flights(flights_csv, n, **changes)
+        store.refresh()
+    snapshot = store.snapshot
+    assert len(snapshot.df.chunks) == 4
+
+    full = read_passenger_data(flights_csv)
+    selection = {"Departure_Arrival": ["Вылет"], "TimeOfDay": ["Утро", "Полночь"]}
+    rows = snapshot.index.select(selection)
+    expected_rows = FilterIndex(full).select(selection)
+    np.testing.assert_array_equal(rows, expected_rows)
+
+    columns = ["TimeOfDay", "Total_Passengers"]
+    counts = snapshot.df.value_counts(columns, rows)
+    keys = [full[col].take(expected_rows) for col in columns]
+    expected = keys[0].groupby(keys, observed=True).size().reset_index(name="rows")
+    # Новые категории дописываются в конец списка категорий, при полной загрузке — сортируются
+    pd.testing.assert_frame_equal(_sorted(counts, columns), _sorted(expected, columns))
+    assert counts["TimeOfDay"].dtype == snapshot.df.chunks[-1]["TimeOfDay"].dtype
+
+    cube = rollup(snapshot.cube.iloc[snapshot.cube_index.select(selection)], ["Date", "Airline_name"])
+    expected_cube = rollup(build_cube(full.take(expected_rows)), ["Date", "Airline_name"])
+    pd.testing.assert_frame_equal(_sorted(cube, ["Date", "Airline_name"]),
+                                  _sorted(expected_cube, ["Date", "Airline_name"]))
+
+
+def test_snapshot_rewrite_after_many_rows(flights_csv, append_flights):
+    store = PassengerStore(flights_csv)
+    append_flights(flights_csv, 1000)
+    assert store.refresh() == 1000
+    # Дописано больше SNAPSHOT_REWRITE_RATIO — снимок переписан, таблица снова одной порцией
+    assert len(store.snapshot.df.chunks) == 1
+    assert store.snapshot_rows == 4000
+
+    reopened = PassengerStore(flights_csv)
+    assert reopened.offset == store.offset
+    assert reopened.snapshot.cube["rows"].sum() == 4000
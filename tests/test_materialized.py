@@ -0,0 +1,74 @@
+# tests/test_materialized.py
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils import materialize
+from utils.ingest import PassengerStore, get_passenger_snapshot
+from utils.materialized import materialized_sensor_rollups
+from utils.sensors import TEMPERATURE_CSV
+
+
+@pytest.fixture
+def temperature_csv(workdir):
+    stamps = pd.date_range("2022-01-01", periods=2000, freq="10min")
+    rng = np.random.default_rng(1)
+    pd.DataFrame({"Timestamp": stamps.strftime("%Y-%m-%d %H:%M"), "Room": "Зал 1",
+                  "Value": rng.normal(21, 1, len(stamps))}).to_csv(TEMPERATURE_CSV, index=False)
+    return TEMPERATURE_CSV
+
+
+@pytest.fixture
+def build(flights_csv, temperature_csv):
+    return materialize.run(flights_csv, workers=1)
+
+
+def _counts(snapshot, columns, selection):
+    parts = [table.iloc[index.select(selection)] for table, index in snapshot.counts["flight_counts"]]
+    counts = pd.concat(parts).groupby(columns, observed=True)["rows"].sum()
+    return counts[counts > 0].sort_index()
+
+
+def test_build_is_base_for_appended_rows(build, flights_csv, append_flights):
+    snapshot = get_passenger_snapshot()
+    assert snapshot.version == f"materialized:{build}"
+    assert snapshot.df is None
+
+    append_flights(flights_csv, 20, DelayCategory="Новая")
+    snapshot = get_passenger_snapshot()
+    assert snapshot.version == f"materialized:{build}+3020"
+    assert "Новая" in snapshot.cube_index.options("DelayCategory")
+
+    live = PassengerStore(flights_csv).snapshot
+    pd.testing.assert_series_equal(
+        snapshot.cube.groupby("Date")["pax_sum"].sum(), live.cube.groupby("Date")["pax_sum"].sum())
+    selection = {"DelayCategory": ["Новая", "Без задержки"], "Departure_Arrival": ["Вылет"]}
+    columns = ["Total_Passengers", "DelayTime"]
+    expected = live.df.value_counts(columns, live.index.select(selection)).set_index(columns)["rows"]
+    pd.testing.assert_series_equal(_counts(snapshot, columns, selection), expected.sort_index())
+    # Частоты пассажиропотока — свёртка той же таблицы, вместе с отменёнными рейсами
+    columns = ["TimeOfDay", "Total_Passengers"]
+    expected = live.df.value_counts(columns, live.index.select(selection)).set_index(columns)["rows"]
+    pd.testing.assert_series_equal(_counts(snapshot, columns, selection), expected.sort_index(),
+                                   check_categorical=False)
+
+
+def test_rewritten_source_falls_back_to_csv(build, flights_csv):
+    rows = pd.read_csv(flights_csv)
+    rows.iloc[:-100].to_csv(flights_csv, index=False)
+    snapshot = get_passenger_snapshot()
+    assert snapshot.df is not None
+    assert snapshot.cube["rows"].sum() == len(rows) - 100
+
+
+def test_sensor_rollups_follow_source(build, temperature_csv):
+    assert materialized_sensor_rollups("temperature", temperature_csv) is not None
+    with open(temperature_csv, "a", encoding="utf-8") as f:
+        f.write("2022-01-20 00:00,Зал 1,22.5\n")
+    assert materialized_sensor_rollups("temperature", temperature_csv) is None
+    # Без файла-источника остаются только сводки сборки
+    os.remove(temperature_csv)
+    assert materialized_sensor_rollups("temperature", temperature_csv) is not None
@@ -0,0 +1,87 @@
+# tests/test_metrics.py
+
+import numpy as np
+import pytest
+
+from utils.metrics import (Stage, instrumented, observe, pooled_percentile, prometheus_text, record_cache,
+                           stage_summary, timed)
+
+# Реестр метрик общий для процесса: у каждого теста свои имена этапов
+
+
+def _row(stage):
+    summary = stage_summary()
+    return summary[summary["stage"] == stage].iloc[0]
+
+
+def test_stage_and_timed_register_calls_and_rows():
+    with Stage("test_metrics.stage", rows_in=10) as stage:
+        stage.rows_out = 3
+    with Stage("test_metrics.stage", rows_in=20) as stage:
+        stage.rows_out = 5
+    row = _row("test_metrics.stage")
+    assert row["calls"] == 2 and row["rows_in"] == 15 and row["rows_out"] == 4
+    assert 0 <= row["p50_ms"] <= row["p95_ms"] <= row["max_ms"]
+
+    @timed("test_metrics.timed", rows_in=lambda values: len(values))
+    def head(values):
+        return np.asarray(values[:2])
+
+    head([1, 2, 3])
+    row = _row("test_metrics.timed")
+    assert row["calls"] == 1 and row["rows_in"] == 3 and row["rows_out"] == 2
+
+
+def test_instrumented_registers_render_methods():
+    @instrumented
+    class MetricsDashboard:
+        def __init__(self):
+            self.rows = 42
+
+        def metric_rows(self):
+            return self.rows
+
+        def render_chart(self):
+            return "chart"
+
+        def helper(self):
+            return "helper"
+
+    dashboard = MetricsDashboard()
+    assert dashboard.render_chart() == "chart" and dashboard.helper() == "helper"
+    stages = set(stage_summary()["stage"])
+    assert {"MetricsDashboard.__init__", "MetricsDashboard.render_chart"} <= stages
+    assert "MetricsDashboard.helper" not in stages
+    assert _row("MetricsDashboard.render_chart")["rows_in"] == 42
+
+
+def test_pooled_percentile_over_all_samples():
+    fast = np.linspace(0.001, 0.010, 90)
+    slow = np.linspace(0.100, 0.200, 10)
+    for seconds in fast:
+        observe("test_metrics.fast", seconds)
+    for seconds in slow:
+        observe("test_metrics.slow", seconds)
+
+    pooled = pooled_percentile(["test_metrics.fast", "test_metrics.slow"], 95)
+    assert pooled == pytest.approx(np.percentile(np.concatenate([fast, slow]), 95) * 1000)
+    # Не максимум перцентилей этапов: у медленного этапа p95 около 195 мс
+    assert pooled < _row("test_metrics.slow")["p95_ms"]
+    assert pooled_percentile(["test_metrics.unknown"], 95) is None
+
+
+def test_prometheus_text_exposes_stages_and_caches():
+    observe("test_metrics.export", 0.02, rows_in=7, rows_out=4, memory_delta=1024)
+    observe("test_metrics.export", 0.2)
+    record_cache("test_metrics_cache", hit=True)
+    record_cache("test_metrics_cache", hit=False)
+    record_cache("test_metrics_cache", hit=False)
+
+    lines = set(prometheus_text().splitlines())
+    assert 'airport_stage_seconds_count{stage="test_metrics.export"} 2.0' in lines
+    assert 'airport_stage_seconds_bucket{le="0.025",stage="test_metrics.export"} 1.0' in lines
+    assert 'airport_stage_rows_total{direction="in",stage="test_metrics.export"} 7.0' in lines
+    assert 'airport_stage_rows_total{direction="out",stage="test_metrics.export"} 4.0' in lines
+    assert 'airport_stage_memory_delta_bytes{stage="test_metrics.export"} 1024.0' in lines
+    assert 'airport_cache_requests_total{cache="test_metrics_cache",result="miss"} 2.0' in lines
+    assert any(line.startswith("airport_process_rss_bytes ") for line in lines)
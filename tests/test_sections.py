@@ -0,0 +1,19 @@
+# tests/test_sections.py
+
+from utils.sections import fragment
+
+
+class Section:
+    def __init__(self):
+        self.calls = 0
+
+    @fragment
+    def render(self, step):
+        self.calls += step
+
+
+def test_fragment_runs_body_without_streamlit_server():
+    section = Section()
+    section.render(2)
+    section.render(3)
+    assert section.calls == 5
@@ -0,0 +1,36 @@
+# tests/test_sensor_join.py
+
+import numpy as np
+import pandas as pd
+
+from utils.ingest import PassengerStore
+from utils.sensor_join import SensorPassengerJoin
+
+
+def _sensor(cells, seed):
+    # Часовая сводка датчиков (как в utils/sensors.py) на весь период рейсов
+    rng = np.random.default_rng(seed)
+    stamps = pd.date_range(cells["Date"].min(), cells["Date"].max() + pd.Timedelta(hours=23), freq="h")
+    values = rng.normal(20, 3, len(stamps))
+    return pd.DataFrame({"Timestamp": stamps, "Room": "Зал", "sum": values, "count": 1, "max": values})
+
+
+def test_late_rows_recompute_from_their_day(flights_csv, append_flights):
+    store = PassengerStore(flights_csv)
+    snapshot = store.snapshot
+    temperature, co2 = _sensor(snapshot.cube, 0), _sensor(snapshot.cube, 1)
+    join = SensorPassengerJoin()
+    join.update(snapshot.version, snapshot.cube, temperature, co2, snapshot.changed)
+
+    # Опоздавшие рейсы за давно объединённый день и обычные — за последний
+    append_flights(flights_csv, 4, Date="2022-01-10", Hour=5)
+    store.refresh()
+    append_flights(flights_csv, 3)
+    store.refresh()
+    snapshot = store.snapshot
+    table = join.update(snapshot.version, snapshot.cube, temperature, co2, snapshot.changed)
+
+    expected = SensorPassengerJoin().update(snapshot.version, snapshot.cube, temperature, co2)
+    pd.testing.assert_frame_equal(table, expected)
+    late = table[table["Timestamp"] == pd.Timestamp("2022-01-10 05:00")]
+    assert late["departures"].iloc[0] + late["arrivals"].iloc[0] >= 4
@@ -0,0 +1,17 @@
+# tests/test_sensors.py
+
+import pandas as pd
+import pytest
+
+from utils.sensors import parse_timestamps
+
+
+@pytest.mark.parametrize("fmt", ["%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S", "%Y-%m-%d %H:%M:%S", "%d/%m/%Y"])
+def test_parse_timestamps_matches_mixed_parsing(fmt):
+    stamps = pd.Series(pd.date_range("2022-01-01", periods=500, freq="7h").strftime(fmt))
+    # Строки в другом формате и мусор разбираются запасным путём
+    stamps.iloc[3] = "not a date"
+    stamps.iloc[4] = None
+    stamps.iloc[5] = "2022-01-01 00:10:00.5"
+    expected = pd.to_datetime(stamps, dayfirst=True, errors="coerce", format="mixed")
+    pd.testing.assert_series_equal(parse_timestamps(stamps), expected)
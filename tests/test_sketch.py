@@ -0,0 +1,80 @@
+# tests/test_sketch.py
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.preprocessing import read_passenger_data
+from utils.sketch import (MIN_VALUE, RELATIVE_ACCURACY, bucket_of, bucket_value, build_sketch, sketch_from_counts,
+                          sketch_quantiles)
+
+QS = (0.01, 0.05, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999)
+
+
+def _delays(n, seed):
+    # Тяжёлый хвост задержек, ранние вылеты (отрицательные), нули и значения меньше MIN_VALUE
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(2.5, 1.2, n)
+    values[rng.random(n) < 0.3] *= -0.2
+    values[rng.random(n) < 0.05] = 0.0
+    values[rng.random(n) < 0.02] = rng.uniform(-MIN_VALUE, MIN_VALUE)
+    return values
+
+
+def _neighbours(values, q):
+    # Соседние порядковые статистики x_k, x_k+1, между которыми np.quantile интерполирует
+    ordered = np.sort(values)
+    k = int(np.floor((len(ordered) - 1) * q))
+    return ordered[k:k + 2]
+
+
+def test_bucket_representative_within_relative_accuracy():
+    values = np.concatenate([np.geomspace(MIN_VALUE, 1e5, 2000), -np.geomspace(MIN_VALUE, 1e5, 2000)])
+    approx = bucket_value(bucket_of(values))
+    assert (np.sign(approx) == np.sign(values)).all()
+    np.testing.assert_array_less(np.abs(approx - values), np.abs(values) * RELATIVE_ACCURACY + 1e-9)
+    np.testing.assert_array_equal(bucket_value(bucket_of([0.0, MIN_VALUE / 2, -MIN_VALUE / 2])), 0.0)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_quantiles_match_numpy_within_stated_error(seed):
+    values = _delays(20000, seed)
+    groups = np.random.default_rng(seed).choice(["A", "B", "C"], len(values))
+    counts = pd.DataFrame({"Airline_name": groups, "DelayTime": values, "rows": 1})
+    result = sketch_quantiles(sketch_from_counts(counts, ["Airline_name"]), ["Airline_name"], QS)
+
+    for _, row in result.iterrows():
+        group = values[groups == row["Airline_name"]]
+        assert row["rows"] == len(group)
+        for q in QS:
+            exact, approx = np.quantile(group, q), row[f"p{q * 100:g}"]
+            neighbours = _neighbours(group, q)
+            # Граница из utils/sketch.py: max(α·max(|x_k|, |x_k+1|), MIN_VALUE)
+            assert abs(approx - exact) <= max(RELATIVE_ACCURACY * np.abs(neighbours).max(), MIN_VALUE) + 1e-9
+            # Статистики одного знака и не меньше MIN_VALUE по модулю: ошибка не больше α·|квантиль|
+            if (np.abs(neighbours) >= MIN_VALUE).all() and len(np.unique(np.sign(neighbours))) == 1:
+                assert abs(approx - exact) <= RELATIVE_ACCURACY * abs(exact) + 1e-9
+
+def test_sketch_quantiles_within_relative_accuracy(flights_csv):
+    df = read_passenger_data(flights_csv)
+    result = sketch_quantiles(build_sketch(df), ["Airline_name"], (0.5, 0.9, 0.99)).set_index("Airline_name")
+    delays = df.dropna(subset=["DelayTime"]).groupby("Airline_name", observed=True)["DelayTime"]
+    for q, column in [(0.5, "p50"), (0.9, "p90"), (0.99, "p99")]:
+        exact = delays.quantile(q).reindex(result.index)
+        approx = result[column]
+        large = exact >= MIN_VALUE
+        np.testing.assert_array_less(np.abs(approx[large] - exact[large]), exact[large] * RELATIVE_ACCURACY + 1e-9)
+        assert (np.abs(approx[~large] - exact[~large]) < MIN_VALUE).all()
+    assert (result["rows"] == delays.size().reindex(result.index)).all()
+
+
+def test_sketch_keeps_negative_delays(flights_csv):
+    df = read_passenger_data(flights_csv)
+    # Ранние прилёты: треть задержек отрицательна
+    early = df.index[::3]
+    df.loc[early, "DelayTime"] = -df.loc[early, "DelayTime"].fillna(0) - 1
+    result = sketch_quantiles(build_sketch(df), [], (0.05, 0.2, 0.5, 0.95))
+    exact = df["DelayTime"].dropna().quantile([0.05, 0.2, 0.5, 0.95]).to_numpy()
+    approx = result[["p5", "p20", "p50", "p95"]].to_numpy()[0]
+    assert (approx[:2] < 0).all()
+    np.testing.assert_array_less(np.abs(approx - exact), np.maximum(np.abs(exact) * RELATIVE_ACCURACY, MIN_VALUE))
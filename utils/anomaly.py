@@ -0,0 +1,257 @@
+# utils/anomaly.py
+
+import threading
+import warnings
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+Z_THRESHOLD = 3.0
+# Ряд оценивается только там, где в окне window он был ненулевым хотя бы в такой доле точек:
+# у редких рядов (авиакомпания с рейсом раз в несколько часов) каждый рейс — «выброс»
+MIN_ACTIVE = 0.5
+
+# Параметры для дневного и часового рядов:
+# window — скользящее окно z-оценки, baseline_period/baseline_count — те же дни недели (часы недели)
+# в прошлом, period — период сезонной декомпозиции. Сезонные средние и медиана/MAD остатка
+# фиксируются поблочно: для блока из block точек они считаются по span предшествующим точкам
+# (block и span кратны period) и не меняются, когда приходят новые данные.
+# threshold — порог |z|: часовых точек в 24 раза больше, и при пороге 3 итог получал
+# отметку почти каждые два дня, при 4 — около раза в неделю, как дневной ряд при 3
+GRANULARITY = {
+    "day": {"freq": "D", "window": 28, "baseline_period": 7, "baseline_count": 8, "period": 7,
+            "block": 28, "span": 364, "threshold": Z_THRESHOLD},
+    "hour": {"freq": "h", "window": 168, "baseline_period": 168, "baseline_count": 4, "period": 24,
+             "block": 168, "span": 672, "threshold": 4.0},
+}
+
+METHODS = {
+    "rolling": "Скользящая z-оценка",
+    "weekday": "Отклонение от того же дня недели",
+    "seasonal": "Остаток сезонной декомпозиции",
+}
+
+
+def _trailing_stats(values, window):
+    # Среднее и std по window предыдущим точкам (без текущей) для всех рядов сразу
+    n = len(values)
+    padded = np.vstack([np.zeros((1, values.shape[1])), values])
+    cum = np.cumsum(padded, axis=0)
+    cum_sq = np.cumsum(padded * padded, axis=0)
+    mean = np.full(values.shape, np.nan)
+    std = np.full(values.shape, np.nan)
+    if n > window:
+        total = cum[window:n] - cum[:n - window]
+        total_sq = cum_sq[window:n] - cum_sq[:n - window]
+        mean[window:] = total / window
+        std[window:] = np.sqrt(np.maximum(total_sq / window - mean[window:] ** 2, 0) * window / (window - 1))
+    return mean, std
+
+
+def _zscore(values, mean, std):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = (values - mean) / std
+    z[~np.isfinite(z)] = np.nan
+    return z
+
+
+def rolling_zscore(values, window):
+    mean, std = _trailing_stats(values, window)
+    # Нижняя граница std как у пуассоновского счётчика: редкие ряды с почти постоянными
+    # значениями не должны давать бесконечные оценки
+    std = np.maximum(std, np.sqrt(np.maximum(np.abs(mean), 1.0)))
+    return _zscore(values, mean, std), mean
+
+
+def weekday_zscore(values, period, count, window):
+    # Сравнение с теми же фазами периода в прошлом: строки одной фазы идут с шагом period,
+    # поэтому для каждой фазы ожидание — обычное скользящее среднее длины count.
+    # Разброс по count точкам одной фазы слишком шумный (при count=4 |z| > 3 у каждой
+    # двадцатой точки), поэтому сдвиг и масштаб берутся по отклонениям от ожидания
+    # за window предыдущих точек: это же убирает смещение от роста или спада ряда
+    expected = np.full(values.shape, np.nan)
+    for phase in range(min(period, len(values))):
+        expected[phase::period], _ = _trailing_stats(values[phase::period], count)
+    z = np.full(values.shape, np.nan)
+    first = period * count
+    if len(values) > first:
+        resid = values[first:] - expected[first:]
+        shift, std = _trailing_stats(resid, window)
+        expected[first:] += np.nan_to_num(shift)
+        std = np.maximum(std, np.sqrt(np.maximum(np.abs(expected[first:]), 1.0)))
+        z[first:] = _zscore(resid, shift, std)
+    return z, expected
+
+
+def active_mask(values, window):
+    # Точки, где ряд в предыдущих window точках был ненулевым хотя бы в доле MIN_ACTIVE
+    share, _ = _trailing_stats((values != 0).astype("float64"), window)
+    return share >= MIN_ACTIVE
+
+
+def _trend_filter(period):
+    # Центрированное скользящее среднее, как в классической декомпозиции (statsmodels.seasonal_decompose)
+    if period % 2 == 0:
+        weights = np.r_[0.5, np.ones(period - 1), 0.5] / period
+    else:
+        weights = np.ones(period) / period
+    return weights
+
+
+def _trend(values, period):
+    # Центрированный тренд; первые и последние half точек остаются пустыми
+    weights = _trend_filter(period)
+    half = len(weights) // 2
+    trend = np.full(values.shape, np.nan)
+    if len(values) >= len(weights):
+        window = np.lib.stride_tricks.sliding_window_view(values, len(weights), axis=0)
+        trend[half:len(values) - half] = window @ weights
+    return trend
+
+
+def _median(values):
+    # nanmedian на порядок медленнее median, а пропуски бывают только в начале ряда (тренд)
+    return np.nanmedian(values, axis=0) if np.isnan(values).any() else np.median(values, axis=0)
+
+
+def seasonal_zscore(values, period, block, span, first=0):
+    # Аддитивная декомпозиция всех рядов разом: тренд — свёртка по времени, сезонность — средние
+    # по фазам периода, остаток — всё прочее; z-оценка остатка через медиану и MAD — устойчива
+    # к самим аномалиям. Средние и медиана/MAD для блока [b, b + block) берутся из span точек
+    # перед b, поэтому уже посчитанные блоки не зависят от новых данных.
+    # first — начало пересчёта (кратно block); возвращает оценки и ожидание для строк с first
+    half = len(_trend_filter(period)) // 2
+    lo = max(first - span - half, 0)
+    trend = _trend(values[lo:], period)
+    detrended = values[lo:] - trend
+    n, width = values.shape
+    z = np.full((n - first, width), np.nan)
+    expected = np.full((n - first, width), np.nan)
+    with warnings.catch_warnings():
+        # Начало ряда и ряды короче фильтра тренда целиком состоят из NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        for b in range(first, n, block):
+            history = detrended[max(b - span, 0) - lo:b - lo]
+            # history начинается с нулевой фазы: b и span кратны period
+            means = np.nanmean(history.reshape(-1, period, width), axis=0) if len(history) else \
+                np.full((period, width), np.nan)
+            means -= np.nanmean(means, axis=0)
+            resid = history - np.tile(means, (len(history) // period, 1))
+            median = _median(resid)
+            mad = _median(np.abs(resid - median)) * 1.4826
+
+            rows = slice(b - lo, min(b + block, n) - lo)
+            phases = np.arange(b, min(b + block, n)) % period
+            fitted = trend[rows] + means[phases]
+            expected[b - first:b - first + len(phases)] = fitted
+            z[b - first:b - first + len(phases)] = _zscore(values[lo:][rows] - fitted, median, mad)
+    return z, expected
+
+
+class AnomalyState(namedtuple("AnomalyState", "index columns values scores expected version")):
+    # Неизменяемый снимок рядов и оценок: детектор общий для сессий (st.cache_resource),
+    # поэтому sync() подменяет снимок целиком, а страница читает один снимок от начала до конца
+    __slots__ = ()
+
+    def flags(self, threshold=Z_THRESHOLD):
+        # Все отмеченные точки: время, ряд, значение, ожидание, метод, оценка
+        frames = []
+        for method, z in self.scores.items():
+            rows, cols = np.nonzero(np.abs(np.nan_to_num(z)) > threshold)
+            frames.append(pd.DataFrame({
+                "Timestamp": self.index[rows],
+                "Series": np.asarray(self.columns, dtype=object)[cols],
+                "Value": self.values[rows, cols],
+                "Expected": self.expected[rows, cols],
+                "Method": METHODS[method],
+                "Score": z[rows, cols],
+            }))
+        flags = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        return flags.sort_values("Timestamp", ignore_index=True) if not flags.empty else flags
+
+
+def _frozen(array):
+    array.flags.writeable = False
+    return array
+
+
+class AnomalyDetector:
+    # Хранит ряды (время × ряды: итог и каждая авиакомпания) и оценки всех методов.
+    # sync() сравнивает новые ряды с сохранёнными и пересчитывает только изменившийся хвост
+    # плюс запас истории, нужный окнам; все методы зависят лишь от прошлых точек (и half
+    # будущих для тренда), поэтому результат совпадает с полным пересчётом.
+
+    def __init__(self, granularity="day"):
+        self.params = GRANULARITY[granularity]
+        self.state = AnomalyState(pd.DatetimeIndex([]), [], np.empty((0, 0)), {}, np.empty((0, 0)), None)
+        self._lock = threading.Lock()
+
+    @property
+    def lookback(self):
+        p = self.params
+        return max(p["window"], p["baseline_period"] * p["baseline_count"] + p["window"])
+
+    def _first_changed(self, index, columns, values):
+        state = self.state
+        if columns != state.columns or len(state.index) == 0 or index[0] != state.index[0]:
+            return 0
+        common = min(len(index), len(state.index))
+        if not index[:common].equals(state.index[:common]):
+            return 0
+        differs = np.flatnonzero((values[:common] != state.values[:common]).any(axis=1))
+        return int(differs[0]) if len(differs) else common
+
+    def sync(self, series, version=None):
+        # series: DataFrame с DatetimeIndex (полная сетка времени) и колонками-рядами;
+        # version — версия набора данных: по state.version страница пропускает сборку рядов.
+        # Возвращает новый снимок (AnomalyState)
+        index, columns = series.index, list(series.columns)
+        values = series.to_numpy(dtype="float64")
+        p = self.params
+        with self._lock:
+            old = self.state
+            changed = self._first_changed(index, columns, values)
+            if changed == len(index) == len(old.index):
+                self.state = old._replace(version=version)
+                return self.state
+            # Оценки до keep не меняются. Центрированный тренд зависит от half будущих точек,
+            # поэтому keep отступает от changed и выравнивается на начало блока сезонных статистик
+            half = p["period"] // 2 + 1
+            keep = max(changed - half, 0) // p["block"] * p["block"]
+            start = max(keep - self.lookback, 0)
+            part = values[start:]
+            offset = keep - start
+
+            fresh = {}
+            fresh["rolling"], rolling_mean = rolling_zscore(part, p["window"])
+            fresh["weekday"], _ = weekday_zscore(part, p["baseline_period"], p["baseline_count"], p["window"])
+            fresh["seasonal"], expected = seasonal_zscore(values, p["period"], p["block"], p["span"], keep)
+            active = active_mask(part, p["window"])[offset:]
+            expected = np.where(np.isnan(expected), rolling_mean[offset:], expected)
+
+            scores = {}
+            for method, z in fresh.items():
+                z = np.where(active, z[offset:] if method != "seasonal" else z, np.nan)
+                head = old.scores[method][:keep] if changed > 0 else np.empty((0, len(columns)))
+                scores[method] = _frozen(np.vstack([head, z]))
+            head = old.expected[:keep] if changed > 0 else np.empty((0, len(columns)))
+            self.state = AnomalyState(index, columns, _frozen(values), scores,
+                                      _frozen(np.vstack([head, expected])), version)
+            return self.state
+
+    def flags(self):
+        return self.state.flags(self.params["threshold"])
+
+
+def series_matrix(rollup_df, time_col, series_col, value_col, freq, total_name):
+    # Сводка rollup → матрица время × ряды на полной сетке времени, пропуски — нули
+    matrix = rollup_df.pivot_table(index=time_col, columns=series_col, values=value_col,
+                                   aggfunc="sum", fill_value=0, observed=True)
+    if matrix.empty:
+        return pd.DataFrame({total_name: []}, index=pd.DatetimeIndex([]))
+    grid = pd.date_range(matrix.index.min(), matrix.index.max(), freq=freq)
+    matrix = matrix.reindex(grid, fill_value=0)
+    matrix.columns = [str(col) for col in matrix.columns]
+    matrix.insert(0, total_name, matrix.sum(axis=1))
+    return matrix
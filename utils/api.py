@@ -0,0 +1,320 @@
+# utils/api.py
+#
+# HTTP API с теми же числами, что и дашборд: python -m utils.api [--host 127.0.0.1] [--port 8600]
+#
+#   GET /meta                         версия данных, водяной знак, значения фильтров
+#   GET /kpi                          пассажиры, загрузка, отмены, средняя задержка
+#   GET /series?by=Date[,Hour...]     куб, свёрнутый до измерений by (rows, pax_*, delay_*)
+#   GET /airlines?top=10&order=pax_sum   рейтинг авиакомпаний
+#   GET /delay-quantiles?by=Airline_name p50 / p90 / p99 задержки по скетчам
+#
+# Фильтры — те же колонки, что на боковой панели (Year=2024&Year=2025&Airline_name=...);
+# формат — JSON или Arrow IPC (format=arrow или Accept: application/vnd.apache.arrow.stream).
+# Ответы кэшируются по (путь, фильтры и параметры запроса, формат, версия данных); ETag выводится
+# из того же ключа до разбора фильтров, поэтому If-None-Match и повторы обслуживаются без
+# обращений к БД. Значения фильтров для проверки запроса кэшируются на версию данных.
+
+import argparse
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+import pyarrow as pa
+
+from utils import db
+from utils.cube import CUBE_KEYS, rollup, totals
+from utils.filter_index import FILTER_COLUMNS
+from utils.ingest import get_passenger_snapshot
+from utils.metrics import observe, record_cache, serve_from_env, silence_bare_mode
+from utils.sketch import SKETCH_CELL, sketch_from_counts, sketch_quantiles
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8600
+# Бюджет памяти кэша ответов; самые давние ответы вытесняются первыми
+CACHE_BYTES = 64 << 20
+# В режиме БД версия данных неизвестна — ответы живут столько же, сколько кэши дашборда
+DB_TTL = 600
+QUANTILES = (0.5, 0.9, 0.99)
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+JSON_TYPE = "application/json; charset=utf-8"
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ResponseCache:
+    # LRU по суммарному размеру тел ответов
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+            return item
+
+    def put(self, key, item):
+        body = item[1]
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self._items[key] = item
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (_, evicted) = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class AggregationApi:
+    def __init__(self, cache_bytes=CACHE_BYTES):
+        self.use_db = db.is_configured()
+        self.cache = ResponseCache(cache_bytes)
+        self._options_version = None
+        self._options_cache = {}
+        self._lock = threading.Lock()
+        self.routes = {
+            "/meta": self.meta,
+            "/kpi": self.kpi,
+            "/series": self.series,
+            "/airlines": self.airlines,
+            "/delay-quantiles": self.delay_quantiles,
+        }
+
+    # --- данные ---------------------------------------------------------------------------
+
+    def _source(self):
+        # (версия, снимок); в режиме БД снимка нет, версия меняется раз в DB_TTL секунд
+        if self.use_db:
+            return f"db:{int(time.time() // DB_TTL)}", None
+        snapshot = get_passenger_snapshot()
+        return snapshot.version, snapshot
+
+    def _columns(self, snapshot):
+        # Колонки, по которым можно фильтровать и группировать
+        if snapshot is None:
+            return set(db.table_columns())
+        return set(snapshot.cube_index.columns)
+
+    def _options(self, snapshot, col):
+        # Значения колонки на версию данных: в режиме БД — один SELECT DISTINCT на версию, а не на запрос
+        version = self._source()[0] if snapshot is None else snapshot.version
+        with self._lock:
+            if version != self._options_version:
+                self._options_version, self._options_cache = version, {}
+            options = self._options_cache.get(col)
+        if options is None:
+            options = db.distinct_values(col) if snapshot is None else snapshot.cube_index.options(col)
+            with self._lock:
+                if version == self._options_version:
+                    self._options_cache[col] = options
+        return options
+
+    def _selection(self, snapshot, params):
+        # Значения параметров сопоставляются со значениями колонок по строковому виду;
+        # выбор всех значений равносилен отсутствию фильтра
+        selection = {}
+        columns = self._columns(snapshot)
+        for col in FILTER_COLUMNS:
+            if col not in params:
+                continue
+            if col not in columns:
+                raise ApiError(400, f"Фильтр {col} недоступен для этих данных")
+            options = {str(value): value for value in self._options(snapshot, col)}
+            unknown = [value for value in params[col] if value not in options]
+            if unknown:
+                raise ApiError(400, f"Неизвестные значения {col}: {', '.join(unknown)}")
+            chosen = sorted(set(params[col]))
+            if len(chosen) < len(options):
+                selection[col] = [options[value] for value in chosen]
+        return selection
+
+    def _cells(self, snapshot, by, selection):
+        if snapshot is None:
+            return db.aggregate(list(by), selection or None)
+        cube = snapshot.cube
+        return cube.iloc[snapshot.cube_index.select(selection)] if selection else cube
+
+    def _by(self, snapshot, params, allowed, default):
+        by = [col for value in params.get("by", [default]) for col in value.split(",") if col]
+        invalid = [col for col in by if col not in allowed]
+        if invalid:
+            raise ApiError(400, f"Нельзя группировать по {', '.join(invalid)}")
+        if snapshot is None:
+            missing = [col for col in by if col not in self._columns(snapshot)]
+            if missing:
+                raise ApiError(400, f"В таблице БД нет колонок {', '.join(missing)}")
+        return by
+
+    # --- эндпоинты ------------------------------------------------------------------------
+
+    def meta(self, snapshot, selection, params):
+        columns = self._columns(snapshot)
+        filters = {col: sorted(map(str, self._options(snapshot, col))) for col in FILTER_COLUMNS if col in columns}
+        return {
+            "watermark": None if snapshot is None else str(snapshot.watermark.date()),
+            "rows": None if snapshot is None else int(snapshot.cube["rows"].sum()),
+            "filters": filters,
+        }
+
+    def kpi(self, snapshot, selection, params):
+        result = totals(self._cells(snapshot, ["IsCancelled"], selection))
+        # Скаляры numpy → числа JSON, NaN (нет рейсов) → null
+        return {key: None if pd.isna(value) else getattr(value, "item", lambda: value)()
+                for key, value in result.items()}
+
+    def series(self, snapshot, selection, params):
+        by = self._by(snapshot, params, CUBE_KEYS, "Date")
+        result = rollup(self._cells(snapshot, by, selection), by).sort_values(by, ignore_index=True)
+        return result.drop(columns=[col for col in result.columns if col.endswith("_sq")])
+
+    def airlines(self, snapshot, selection, params):
+        order = params.get("order", ["pax_sum"])[0]
+        try:
+            top = int(params.get("top", ["10"])[0])
+        except ValueError:
+            raise ApiError(400, "top должен быть целым числом")
+        result = rollup(self._cells(snapshot, ["Airline_name"], selection), ["Airline_name"])
+        if order not in result.columns:
+            raise ApiError(400, f"Нельзя сортировать по {order}")
+        result = result.drop(columns=[col for col in result.columns if col.endswith("_sq")])
+        return result.sort_values(order, ascending=False, ignore_index=True).head(top)
+
+    def delay_quantiles(self, snapshot, selection, params):
+        by = self._by(snapshot, params, SKETCH_CELL, "Airline_name")
+        if snapshot is None:
+            sketch = sketch_from_counts(db.value_counts(by + ["DelayTime"], selection or None), by)
+        else:
+            index = snapshot.sketch_index
+            sketch = snapshot.sketch.iloc[index.select(selection)] if selection else snapshot.sketch
+        return sketch_quantiles(sketch, by, QUANTILES)
+
+    # --- ответы ---------------------------------------------------------------------------
+
+    @staticmethod
+    def _encode(result, fmt):
+        if fmt == "arrow":
+            if isinstance(result, dict):
+                raise ApiError(400, "Arrow доступен только для табличных ответов")
+            table = pa.Table.from_pandas(result, preserve_index=False)
+            sink = pa.BufferOutputStream()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            return ARROW_TYPE, sink.getvalue().to_pybytes()
+        if isinstance(result, dict):
+            body = json.dumps(result, ensure_ascii=False, default=str)
+        else:
+            body = result.to_json(orient="records", date_format="iso", force_ascii=False)
+        return JSON_TYPE, body.encode("utf-8")
+
+    def handle(self, path, query, accept="", if_none_match=None):
+        # Возвращает (статус, заголовки, тело)
+        started = time.perf_counter()
+        params = {key: values for key, values in parse_qs(query, keep_blank_values=False).items()}
+        fmt = params.pop("format", ["arrow" if ARROW_TYPE in accept else "json"])[0]
+        route = path.rstrip("/") or "/"
+        endpoint = self.routes.get(route)
+        try:
+            if endpoint is None:
+                raise ApiError(404, f"Нет такого ресурса: {path}")
+            if fmt not in ("json", "arrow"):
+                raise ApiError(400, "format: json или arrow")
+            version, snapshot = self._source()
+            # Ключ — из самих параметров: порядок и повторы значений фильтра не важны, порядок by важен
+            filters = tuple(sorted((col, tuple(sorted(set(values)))) for col, values in params.items()
+                                   if col in FILTER_COLUMNS))
+            extra = tuple(sorted((key, tuple(values)) for key, values in params.items() if key not in FILTER_COLUMNS))
+            key = (path, filters, extra, fmt, version)
+            etag = '"' + hashlib.sha1(repr(key).encode("utf-8")).hexdigest()[:24] + '"'
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+            if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+                record_cache("api_response", hit=True)
+                return 304, headers, b""
+
+            cached = self.cache.get(key)
+            record_cache("api_response", hit=cached is not None)
+            if cached is None:
+                selection = self._selection(snapshot, params)
+                content_type, body = self._encode(endpoint(snapshot, selection, params), fmt)
+                self.cache.put(key, (content_type, body))
+            else:
+                content_type, body = cached
+            headers["Content-Type"] = content_type
+            status = 200
+        except ApiError as error:
+            status, body = error.status, json.dumps({"error": str(error)}, ensure_ascii=False).encode("utf-8")
+            headers = {"Content-Type": JSON_TYPE}
+        # Метка — маршрут, а не сырой путь: произвольные адреса не плодят новые ряды метрик
+        observe(f"api{route}" if endpoint is not None else "api/unknown", time.perf_counter() - started)
+        return status, headers, body
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    api = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        try:
+            status, headers, body = self.api.handle(url.path, url.query, self.headers.get("Accept", ""),
+                                                    self.headers.get("If-None-Match"))
+        except Exception:
+            logger.exception("Ошибка при обработке %s", self.path)
+            status, headers = 500, {"Content-Type": JSON_TYPE}
+            body = json.dumps({"error": "внутренняя ошибка"}).encode("utf-8")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s", self.address_string(), format % args)
+
+
+def make_server(host="127.0.0.1", port=DEFAULT_PORT, cache_bytes=CACHE_BYTES):
+    handler = type("BoundApiHandler", (ApiHandler,), {"api": AggregationApi(cache_bytes)})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP API с агрегатами дашборда")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--cache-mb", type=int, default=CACHE_BYTES >> 20, help="бюджет кэша ответов, МБ")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    silence_bare_mode()
+    serve_from_env()
+    server = make_server(args.host, args.port, args.cache_mb << 20)
+    print(f"API слушает http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# utils/binning.py
+#
+# Связь двух метрик по корзинам: x разбивается на корзины (равные интервалы, квантили или
+# заданные границы), для y в каждой корзине считаются среднее, медиана и доверительные интервалы.
+# Вход — таблица частот (x, y, rows), поэтому стоимость и размер графика ограничены числом
+# корзин, а не числом различных значений x.
+
+import numpy as np
+import pandas as pd
+
+BIN_METHODS = {
+    "width": "Равные интервалы",
+    "quantile": "Квантили",
+    "custom": "Свои границы",
+}
+DEFAULT_BINS = 20
+Z_INTERVAL = 1.96
+
+
+def parse_custom_edges(text):
+    # Строка границ «50, 100; 150» → кортеж чисел; не числа и бесконечности — ValueError
+    edges = tuple(float(value) for value in (text or "").replace(";", ",").split(",") if value.strip())
+    if not all(np.isfinite(edges)):
+        raise ValueError("границы должны быть конечными числами")
+    return edges
+
+
+def bin_edges(x, weights, method="width", n_bins=DEFAULT_BINS, custom=None):
+    # Границы корзин по значениям x с весами (числом строк); повторяющиеся границы схлопываются
+    x = np.asarray(x, dtype="float64")
+    weights = np.asarray(weights, dtype="float64")
+    valid = np.isfinite(x) & (weights > 0)
+    x, weights = x[valid], weights[valid]
+    if len(x) == 0:
+        return np.array([0.0, 1.0])
+
+    if method == "custom" and custom:
+        edges = np.asarray(sorted(custom), dtype="float64")
+        # Значения за пределами заданных границ попадают в крайние корзины
+        edges = np.concatenate([[min(x.min(), edges[0])], edges, [max(x.max(), edges[-1])]])
+    elif method == "quantile":
+        order = np.argsort(x, kind="stable")
+        cum = np.cumsum(weights[order])
+        targets = np.linspace(0, cum[-1], n_bins + 1)[1:-1]
+        inner = x[order][np.minimum(np.searchsorted(cum, targets, side="left"), len(x) - 1)]
+        edges = np.concatenate([[x.min()], inner, [x.max()]])
+    else:
+        edges = np.linspace(x.min(), x.max(), n_bins + 1)
+    edges = np.unique(edges)
+    return edges if len(edges) > 1 else np.array([edges[0], edges[0] + 1.0])
+
+
+def _order_statistic(values, cum, start, total, rank):
+    # Значение с дробным рангом rank (от 0) внутри группы, интерполяция как у Series.quantile
+    rank = np.clip(rank, 0, total - 1)
+    lo = np.floor(rank).astype("int64")
+    hi = np.minimum(lo + 1, total - 1)
+    v_lo = values[np.searchsorted(cum, start + lo, side="right")]
+    v_hi = values[np.searchsorted(cum, start + hi, side="right")]
+    return v_lo + (rank - lo) * (v_hi - v_lo)
+
+
+def binned_relationship(counts, x, y, edges, weight="rows", z=Z_INTERVAL):
+    # Один проход по отсортированным массивам: корзина x → n, среднее y с интервалом
+    # по нормальному приближению, медиана y с интервалом по порядковым статистикам
+    data = counts.loc[counts[x].notna() & counts[y].notna() & (counts[weight] > 0)]
+    edges = np.asarray(edges, dtype="float64")
+    n_bins = len(edges) - 1
+    bins = np.clip(np.searchsorted(edges, data[x].to_numpy(dtype="float64"), side="right") - 1, 0, n_bins - 1)
+    values = data[y].to_numpy(dtype="float64")
+    weights = data[weight].to_numpy(dtype="int64")
+
+    order = np.lexsort([values, bins])
+    bins, values, weights = bins[order], values[order], weights[order]
+    cum = np.cumsum(weights)
+    total = np.bincount(bins, weights=weights, minlength=n_bins).astype("int64")
+    sums = np.bincount(bins, weights=values * weights, minlength=n_bins)
+    sumsq = np.bincount(bins, weights=values * values * weights, minlength=n_bins)
+    start = np.concatenate([[0], np.cumsum(total)[:-1]])
+
+    filled = total > 0
+    n = total[filled].astype("float64")
+    mean = sums[filled] / n
+    variance = np.clip(sumsq[filled] - n * mean * mean, 0, None) / np.maximum(n - 1, 1)
+    half_width = z * np.sqrt(variance / n)
+
+    def order_stat(rank):
+        return _order_statistic(values, cum, start[filled], total[filled], rank)
+
+    # Доверительный интервал медианы без предположений о распределении: ранги n/2 ± z·√n / 2
+    median_offset = z * np.sqrt(n) / 2
+    left, right = edges[:-1][filled], edges[1:][filled]
+    return pd.DataFrame({
+        "left": left,
+        "right": right,
+        "center": (left + right) / 2,
+        "rows": total[filled],
+        "mean": mean,
+        "mean_lo": mean - half_width,
+        "mean_hi": mean + half_width,
+        "median": order_stat((n - 1) / 2),
+        "median_lo": order_stat(np.floor((n - 1) / 2 - median_offset)),
+        "median_hi": order_stat(np.ceil((n - 1) / 2 + median_offset)),
+    })
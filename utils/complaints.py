@@ -0,0 +1,363 @@
+# utils/complaints.py
+#
+# Поиск и аналитика по жалобам пассажиров.
+#
+# Текст жалобы → токены (нижний регистр, ё → е) → основы (лёгкий стеммер: отсекается самое
+# длинное окончание, основа не короче MIN_STEM). Обратный индекс — сегменты с позиционными
+# списками (термин, жалоба, позиция), отсортированными по термину: поиск термина — двоичный
+# поиск по массиву, фраза — пересечение ключей «жалоба × (позиция − номер слова)».
+# Новые жалобы добавляются отдельным сегментом; сегменты сливаются, когда их становится много.
+# Индекс не меняется после сборки: порция жалоб даёт новый индекс, хранилище подменяет ссылку.
+#
+# Тренды терминов считаются по хешам основ (HASH_BUCKETS корзин): таблица
+# дата × категория × корзина → число жалоб растёт с числом дней, а не словаря.
+
+import io
+import os
+import re
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.file_cache import read_guard
+from utils.metrics import Stage, tracked_cache
+from utils.preprocessing import COMPLAINTS_CSV
+from utils.sensors import parse_timestamps
+
+TOKEN_PATTERN = r"[0-9a-zа-я]+"
+PHRASE_PATTERN = re.compile(r'"([^"]+)"|(\S+)')
+MIN_STEM = 3
+HASH_BUCKETS = 1 << 16
+# Позиция слова в жалобе; ключ фразы — жалоба * POSITION_BASE + позиция
+POSITION_BASE = 1 << 20
+# Сегменты сливаются в один, когда их больше
+MAX_SEGMENTS = 8
+UNCATEGORIZED = "Без категории"
+
+# Подсказки для поиска колонок по названию, как у датчиков
+DATE_HINTS = ("дата", "время", "date", "time")
+TEXT_HINTS = ("текст", "жалоб", "описан", "сообщ", "коммент", "text", "comment", "message")
+CATEGORY_HINTS = ("категор", "тема", "тип", "category", "topic", "type")
+
+# Окончания, от самых длинных; возвратные -ся/-сь отсекаются отдельно
+ENDINGS = sorted("""
+    иями ями ами иям ием иях ией ого его ому ему ыми ими ая яя ое ее ые ие ый ий ой ом ем ам ям ах ях
+    ую юю ию ья ье ьи ей ов ев ть ти ла ло ли ет ит ют ут ат ят ал ил ел ешь ишь ем им
+    а я о е ы и у ю ь й
+""".split(), key=len, reverse=True)
+STOPWORDS = set("""
+    и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было
+    вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас
+    нибудь опять уж вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их
+    чем была сам чтоб без будто чего раз тоже себе под будет ж тогда кто этот того потому этого какой
+    совсем ним здесь этом один почти мой тем чтобы нее сейчас были куда зачем всех никогда можно при
+    наконец два об другой хоть после над больше тот через эти нас про всего них какая много разве три
+    эту моя впрочем хорошо свою этой перед иногда лучше чуть том нельзя такой им более всегда конечно
+    всю между это очень также
+""".split())
+
+
+@lru_cache(maxsize=None)
+def stem(token):
+    base = token
+    for suffix in ("ся", "сь"):
+        if base.endswith(suffix) and len(base) - 2 >= MIN_STEM:
+            base = base[:-2]
+            break
+    for ending in ENDINGS:
+        if base.endswith(ending) and len(base) - len(ending) >= MIN_STEM:
+            return base[:-len(ending)]
+    return base
+
+
+# Стоп-слова сравниваются с основами терминов
+STOP_STEMS = STOPWORDS | {stem(word) for word in STOPWORDS}
+
+
+def tokenize(texts):
+    # Серия текстов → (номер текста, позиция, токен), без циклов по текстам
+    tokens = (texts.fillna("").astype(str).str.lower().str.replace("ё", "е", regex=False)
+              .str.findall(TOKEN_PATTERN).explode().dropna())
+    docs = tokens.index.to_numpy(dtype="int64")
+    positions = tokens.groupby(level=0).cumcount().to_numpy(dtype="int64")
+    return docs, positions, tokens.to_numpy(dtype=object)
+
+
+def parse_query(text):
+    # Слова и фразы в кавычках → список фраз (каждая — список основ); все условия объединяются через AND
+    phrases = []
+    for quoted, word in PHRASE_PATTERN.findall(text or ""):
+        _, _, tokens = tokenize(pd.Series([quoted or word]))
+        if len(tokens):
+            phrases.append([stem(token) for token in tokens])
+    return phrases
+
+
+def _matching(columns, hints):
+    return next((col for col in columns if any(hint in str(col).lower() for hint in hints)), None)
+
+
+def normalize_complaints(raw):
+    # Исходная таблица → Date, Category, Text (колонки находятся по названию)
+    date_col = _matching(raw.columns, DATE_HINTS)
+    text_col = _matching(raw.columns, TEXT_HINTS)
+    category_col = _matching([col for col in raw.columns if col not in (date_col, text_col)], CATEGORY_HINTS)
+    if text_col is None:
+        # Без подсказки берём самую «длинную» текстовую колонку
+        text_col = raw.select_dtypes(include="object").apply(lambda col: col.astype(str).str.len().mean()).idxmax()
+    return pd.DataFrame({
+        "Date": parse_timestamps(raw[date_col]).dt.normalize() if date_col is not None else pd.NaT,
+        "Category": (raw[category_col].fillna(UNCATEGORIZED).astype(str)
+                     if category_col is not None else UNCATEGORIZED),
+        "Text": raw[text_col].fillna("").astype(str),
+    })
+
+
+class Vocabulary:
+    # Основа ↔ номер термина; для каждого термина — хеш-корзина, число жалоб и частая словоформа
+    def __init__(self):
+        self.ids = {}
+        self.stems = []
+        self.surface = []
+        self.buckets = np.zeros(0, dtype=np.int32)
+        self.doc_freq = np.zeros(0, dtype=np.int64)
+        self.trend = np.zeros(0, dtype=bool)
+
+    def copy(self):
+        # Массивы в add заменяются, а не изменяются, поэтому копируются только словарь и списки
+        vocabulary = Vocabulary()
+        vocabulary.ids, vocabulary.stems, vocabulary.surface = dict(self.ids), list(self.stems), list(self.surface)
+        vocabulary.buckets, vocabulary.doc_freq, vocabulary.trend = self.buckets, self.doc_freq, self.trend
+        return vocabulary
+
+    def lookup(self, stems):
+        return np.array([self.ids.get(value, -1) for value in stems], dtype=np.int64)
+
+    def add(self, tokens):
+        # Токены порции → номера терминов; новые основы добавляются в словарь
+        codes, uniques = pd.factorize(tokens)
+        stems = [stem(token) for token in uniques]
+        new = []
+        term_ids = np.empty(len(uniques), dtype=np.int64)
+        for i, (token, value) in enumerate(zip(uniques, stems)):
+            term = self.ids.get(value)
+            if term is None:
+                term = self.ids[value] = len(self.stems)
+                self.stems.append(value)
+                self.surface.append(token)
+                new.append(value)
+            term_ids[i] = term
+        if new:
+            self.buckets = np.concatenate([self.buckets, [zlib.crc32(value.encode("utf-8")) % HASH_BUCKETS
+                                                          for value in new]]).astype(np.int32)
+            self.doc_freq = np.concatenate([self.doc_freq, np.zeros(len(new), dtype=np.int64)])
+            # Стоп-слова и короткие слова в трендах не участвуют
+            self.trend = np.concatenate([self.trend, [len(value) >= MIN_STEM and value not in STOP_STEMS
+                                                      for value in new]])
+        return term_ids[codes]
+
+    def label(self, bucket):
+        # Подпись хеш-корзины — словоформа самого частого термина в ней
+        terms = np.flatnonzero((self.buckets == bucket) & self.trend)
+        if len(terms) == 0:
+            return f"#{bucket}"
+        return self.surface[terms[np.argmax(self.doc_freq[terms])]]
+
+
+class Segment:
+    # Позиционные списки порции жалоб, упорядоченные по (термин, жалоба, позиция)
+    def __init__(self, term_ids, docs, positions):
+        order = np.lexsort((positions, docs, term_ids))
+        self.term_ids = term_ids[order]
+        self.docs = docs[order]
+        self.positions = positions[order].astype(np.int32)
+
+    def postings(self, term):
+        lo, hi = np.searchsorted(self.term_ids, [term, term + 1])
+        return self.docs[lo:hi], self.positions[lo:hi]
+
+    @staticmethod
+    def merge(segments):
+        return Segment(np.concatenate([s.term_ids for s in segments]), np.concatenate([s.docs for s in segments]),
+                       np.concatenate([s.positions for s in segments]))
+
+    def match(self, phrase):
+        # Номера жалоб, где основы phrase идут подряд
+        keys = None
+        for offset, term in enumerate(phrase):
+            if term < 0:
+                return np.zeros(0, dtype=np.int64)
+            docs, positions = self.postings(term)
+            valid = positions >= offset
+            term_keys = docs[valid] * POSITION_BASE + (positions[valid] - offset)
+            keys = np.unique(term_keys) if keys is None else np.intersect1d(keys, term_keys, assume_unique=False)
+            if len(keys) == 0:
+                break
+        return np.unique(keys // POSITION_BASE)
+
+
+class ComplaintIndex:
+    def __init__(self):
+        self.vocabulary = Vocabulary()
+        self.segments = []
+        self.docs = pd.DataFrame({"Date": pd.Series(dtype="datetime64[ns]"),
+                                  "Category": pd.Series(dtype="category"), "Text": pd.Series(dtype=object)})
+        self.term_days = pd.DataFrame({"Date": pd.Series(dtype="datetime64[ns]"),
+                                       "Category": pd.Series(dtype="category"),
+                                       "Bucket": pd.Series(dtype=np.int32), "docs": pd.Series(dtype=np.int64)})
+
+    def __len__(self):
+        return len(self.docs)
+
+    def add(self, complaints):
+        # Порция жалоб (Date, Category, Text) → новый индекс с ещё одним сегментом, частотами и трендами.
+        # Текущий индекс не меняется: сессии, читающие его во время обновления, видят прежнее состояние
+        if complaints.empty:
+            return self
+        complaints = complaints.reset_index(drop=True)
+        index = ComplaintIndex()
+        first = len(self.docs)
+        categories = self.docs["Category"].cat.categories.union(pd.Index(complaints["Category"].unique()))
+        category_dtype = pd.CategoricalDtype(categories)
+        index.docs = pd.concat([self.docs.astype({"Category": category_dtype}),
+                                complaints.astype({"Category": category_dtype})], ignore_index=True)
+
+        docs, positions, tokens = tokenize(complaints["Text"])
+        vocabulary = index.vocabulary = self.vocabulary.copy()
+        term_ids = vocabulary.add(tokens)
+        segments = self.segments + [Segment(term_ids, docs + first, positions)]
+        index.segments = [Segment.merge(segments)] if len(segments) > MAX_SEGMENTS else segments
+
+        # Документная частота и тренды: каждая пара (жалоба, термин) учитывается один раз
+        pairs = np.unique(docs * len(vocabulary.stems) + term_ids)
+        pair_docs, pair_terms = np.divmod(pairs, len(vocabulary.stems))
+        vocabulary.doc_freq = vocabulary.doc_freq + np.bincount(pair_terms, minlength=len(vocabulary.stems))
+        trend = vocabulary.trend[pair_terms]
+        counts = (pd.DataFrame({"Date": complaints["Date"].to_numpy()[pair_docs[trend]],
+                                "Category": complaints["Category"].to_numpy()[pair_docs[trend]],
+                                "Bucket": vocabulary.buckets[pair_terms[trend]]})
+                  .groupby(["Date", "Category", "Bucket"], sort=False).size().reset_index(name="docs"))
+        counts["Category"] = counts["Category"].astype(category_dtype)
+        term_days = self.term_days.astype({"Category": category_dtype})
+        index.term_days = (pd.concat([term_days, counts], ignore_index=True)
+                           .groupby(["Date", "Category", "Bucket"], observed=True, sort=False)["docs"].sum()
+                           .reset_index())
+        return index
+
+    def search(self, query, rows=None):
+        # Номера жалоб, подходящих под все слова и фразы запроса (внутри rows, если задано)
+        phrases = parse_query(query)
+        if not phrases:
+            return np.arange(len(self.docs)) if rows is None else rows
+        result = rows
+        for phrase in phrases:
+            terms = self.vocabulary.lookup(phrase)
+            matched = np.concatenate([segment.match(terms) for segment in self.segments] or [np.zeros(0, np.int64)])
+            result = matched if result is None else np.intersect1d(result, matched, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result
+
+    def select(self, start=None, end=None, categories=None):
+        # Номера жалоб за период и в категориях
+        mask = np.ones(len(self.docs), dtype=bool)
+        if start is not None:
+            mask &= (self.docs["Date"] >= pd.Timestamp(start)).to_numpy()
+        if end is not None:
+            mask &= (self.docs["Date"] < pd.Timestamp(end) + pd.Timedelta(days=1)).to_numpy()
+        if categories:
+            mask &= self.docs["Category"].isin(categories).to_numpy()
+        return np.flatnonzero(mask)
+
+    def counts(self, rows, by):
+        # Число жалоб по дням или категориям среди rows
+        return (self.docs.iloc[rows].groupby(by, observed=True).size().reset_index(name="Жалоб"))
+
+    def top_terms(self, start=None, end=None, categories=None, top=10):
+        # Самые частые термины периода и их ряды по дням (по хеш-корзинам)
+        table = self.term_days
+        mask = pd.Series(True, index=table.index)
+        if start is not None:
+            mask &= table["Date"] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= table["Date"] < pd.Timestamp(end) + pd.Timedelta(days=1)
+        if categories:
+            mask &= table["Category"].isin(categories)
+        table = table[mask]
+        totals = table.groupby("Bucket")["docs"].sum().nlargest(top)
+        series = (table[table["Bucket"].isin(totals.index)]
+                  .groupby(["Date", "Bucket"])["docs"].sum().reset_index())
+        labels = {bucket: self.vocabulary.label(bucket) for bucket in totals.index}
+        series["Термин"] = series["Bucket"].map(labels)
+        totals = totals.rename(index=labels).rename_axis("Термин").reset_index(name="Жалоб")
+        return totals, series
+
+
+class ComplaintsStore:
+    # Журнал жалоб, который только дописывается: как и PassengerStore (utils/ingest.py),
+    # помнит смещение после последней прочитанной строки и индексирует только новые строки.
+    # Перезапись файла распознаётся по размеру и по GUARD_BYTES байтам перед смещением
+
+    def __init__(self, source_path=COMPLAINTS_CSV):
+        self.source_path = source_path
+        self._lock = threading.Lock()
+        self._load_full()
+
+    def _load_full(self):
+        with open(self.source_path, "rb") as f:
+            data = f.read()
+        self.columns = list(pd.read_csv(io.BytesIO(data), nrows=0).columns)
+        self.offset = 0
+        # Прежний индекс остаётся доступен читателям, пока новый не собран
+        self._append(data, header=True, index=ComplaintIndex())
+
+    def _read_guard(self):
+        return read_guard(self.source_path, self.offset)
+
+    def refresh(self):
+        # Дочитывает новые строки; возвращает число добавленных жалоб
+        with self._lock, Stage("ComplaintsStore.refresh") as stage:
+            size = os.path.getsize(self.source_path)
+            if size == self.offset:
+                stage.rows_out = 0
+            elif size < self.offset or self._read_guard() != self._guard:
+                # Файл перезаписан, а не дописан — полная перезагрузка
+                self._load_full()
+                stage.rows_out = len(self.index)
+            else:
+                with open(self.source_path, "rb") as f:
+                    f.seek(self.offset)
+                    stage.rows_out = self._append(f.read(), header=False, index=self.index)
+            return stage.rows_out
+
+    def _append(self, chunk, header, index):
+        # Строки chunk дописываются к index; только завершённые строки, перевод строки внутри
+        # кавычек (многострочный текст) концом не считается
+        end = chunk.rfind(b"\n")
+        while end >= 0 and chunk.count(b'"', 0, end) % 2:
+            end = chunk.rfind(b"\n", 0, end)
+        rows = 0
+        if end >= 0:
+            chunk = chunk[:end + 1]
+            if header:
+                raw = pd.read_csv(io.BytesIO(chunk))
+            else:
+                raw = pd.read_csv(io.BytesIO(chunk), names=self.columns, header=None)
+            index = index.add(normalize_complaints(raw))
+            # Смещение сдвигается только после успешной индексации: иначе строки потерялись бы
+            self.offset += len(chunk)
+            rows = len(raw)
+        # Ссылка на индекс подменяется целиком
+        self.index = index
+        self._guard = self._read_guard()
+        return rows
+
+
+@tracked_cache(st.cache_resource)
+def get_complaints_store():
+    # Одно хранилище на процесс, общее для всех сессий
+    return ComplaintsStore()
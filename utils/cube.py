@@ -0,0 +1,122 @@
+# utils/cube.py
+
+import numpy as np
+import pandas as pd
+
+from utils.filter_index import FILTER_COLUMNS
+
+# Ключи куба: дата и час рейса плюс все измерения фильтров.
+# Year, Quarter, Season, Month, YearMonth, Week и DayOfWeek однозначно определяются датой
+# и не увеличивают число ячеек.
+CUBE_KEYS = ["Date", "Hour", "YearMonth", "Week"] + FILTER_COLUMNS
+
+# Метрики, для которых в каждой ячейке хранятся count, sum и сумма квадратов
+CUBE_MEASURES = {"pax": "Total_Passengers", "delay": "DelayTime"}
+# Счётчики ячейки помещаются в int32; суммы остаются float64, чтобы итоги по кубу были точными
+COUNT_DTYPE = "int32"
+
+
+def build_cube(df):
+    # Один проход по рейсам: каждая ячейка хранит число рейсов и count/sum/sumsq по метрикам
+    keys = [col for col in CUBE_KEYS if col in df.columns]
+    columns = {}
+    for name, col in CUBE_MEASURES.items():
+        values = df[col].to_numpy(dtype="float64")
+        columns[name] = values
+        columns[f"{name}_sq"] = values * values
+    measures = pd.DataFrame(columns, index=df.index)
+
+    aggs = {"rows": ("pax", "size")}
+    for name in CUBE_MEASURES:
+        aggs[f"{name}_count"] = (name, "count")
+        aggs[f"{name}_sum"] = (name, "sum")
+        aggs[f"{name}_sq"] = (f"{name}_sq", "sum")
+
+    cube = (measures.groupby([df[col] for col in keys], observed=True, sort=False, dropna=False)
+            .agg(**aggs)
+            .reset_index())
+    counts = ["rows"] + [f"{name}_count" for name in CUBE_MEASURES]
+    cube = cube.astype(dict.fromkeys(counts, COUNT_DTYPE))
+    # Ячейки упорядочены по дате: новые дни дописываются в конец куба (см. merge_cube)
+    return cube.sort_values("Date", kind="stable", ignore_index=True)
+
+
+def merge_cube(cube, batch_cube, keys=None):
+    # Добавляет к кубу ячейки новой порции рейсов. Пересчитываются только ячейки начиная
+    # с первой даты порции; возвращает новый куб и число ячеек, оставшихся без изменений.
+    # keys — ключи ячеек, если таблица устроена иначе, чем куб (например, скетчи)
+    keep = int(np.searchsorted(cube["Date"].to_numpy(), batch_cube["Date"].min().to_datetime64(), side="left"))
+    keys = keys or [col for col in CUBE_KEYS if col in cube.columns]
+    tail = pd.concat([cube.iloc[keep:], batch_cube], ignore_index=True)
+    tail = (tail.groupby(keys, observed=True, sort=False, dropna=False).sum()
+            .reset_index()
+            .sort_values("Date", kind="stable"))
+    # Сумма по группам расширяет целые типы; возвращаем типы куба, чтобы склейка не копировала его в int64
+    tail = tail.astype({col: cube[col].dtype for col in tail.columns if col not in keys})
+    return pd.concat([cube.iloc[:keep], tail], ignore_index=True), keep
+
+
+def rollup(cube, by):
+    # Свёртка куба до нужных измерений; mean и std восстанавливаются из count/sum/sumsq
+    sum_cols = ["rows"] + [f"{name}_{stat}" for name in CUBE_MEASURES for stat in ("count", "sum", "sq")]
+    result = cube.groupby(by, observed=True)[sum_cols].sum().reset_index()
+    for name in CUBE_MEASURES:
+        count = result[f"{name}_count"]
+        total = result[f"{name}_sum"]
+        result[f"{name}_mean"] = total / count.where(count > 0)
+        variance = (result[f"{name}_sq"] - total * total / count.where(count > 0)) / (count - 1).where(count > 1)
+        result[f"{name}_std"] = np.sqrt(variance.clip(lower=0))
+    return result
+
+
+def totals(cube):
+    # KPI по всему (отфильтрованному) кубу
+    result = {"rows": int(cube["rows"].sum())}
+    for name in CUBE_MEASURES:
+        count = cube[f"{name}_count"].sum()
+        total = cube[f"{name}_sum"].sum()
+        result[f"{name}_sum"] = total
+        result[f"{name}_mean"] = total / count if count else np.nan
+    result["cancelled"] = int(cube.loc[cube["IsCancelled"] == 1, "rows"].sum())
+    return result
+
+
+def _sorted_counts(counts, by, value, weight):
+    data = counts.loc[counts[value].notna() & (counts[weight] > 0), by + [value, weight]].dropna(subset=by)
+    return data.sort_values(by + [value], kind="stable")
+
+
+def weighted_mean(counts, by, value, weight="rows"):
+    # Среднее по таблице частот (значение, число строк)
+    data = _sorted_counts(counts, by, value, weight)
+    data = data.assign(_product=data[value].astype("float64") * data[weight])
+    grouped = data.groupby(by, observed=True, sort=True)[["_product", weight]].sum()
+    return (grouped["_product"] / grouped[weight]).rename(value).reset_index()
+
+
+def weighted_quantile(counts, by, value, q, weight="rows"):
+    # Квантиль с линейной интерполяцией, как у Series.quantile, но по таблице частот:
+    # для каждой группы находим соседние порядковые статистики через searchsorted по накопленным весам
+    data = _sorted_counts(counts, by, value, weight)
+    if data.empty:
+        return pd.DataFrame(columns=by + [value])
+
+    weights = data[weight].to_numpy(dtype="int64")
+    values = data[value].to_numpy(dtype="float64")
+    cum = np.cumsum(weights)
+    if by:
+        groups = data.groupby(by, observed=True, sort=True).ngroup().to_numpy()
+    else:
+        groups = np.zeros(len(data), dtype=np.int64)
+    group_total = np.bincount(groups, weights=weights).astype("int64")
+    group_start = np.concatenate([[0], np.cumsum(group_total)[:-1]])
+
+    h = (group_total - 1) * q
+    lo = np.floor(h).astype("int64")
+    hi = np.minimum(lo + 1, group_total - 1)
+    v_lo = values[np.searchsorted(cum, group_start + lo, side="right")]
+    v_hi = values[np.searchsorted(cum, group_start + hi, side="right")]
+
+    result = data.drop_duplicates(by)[by].reset_index(drop=True) if by else pd.DataFrame(index=[0])
+    result[value] = v_lo + (h - lo) * (v_hi - v_lo)
+    return result
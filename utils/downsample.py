@@ -0,0 +1,87 @@
+# utils/downsample.py
+
+import numpy as np
+import plotly.graph_objects as go
+
+# Бюджет точек на линию: примерно ширина графика в пикселях
+DEFAULT_POINTS = 1500
+# Начиная с этого числа точек трасса рисуется через WebGL
+WEBGL_THRESHOLD = 1000
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if np.issubdtype(values.dtype, np.datetime64):
+        return values.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return values.astype(np.float64)
+
+
+def minmax_indices(y, n_out):
+    # Min-max: ряд режется на n_out / 2 равных корзин, из каждой берутся минимум и максимум.
+    # Корзины дополняются NaN до прямоугольного массива, поэтому всё считается одной операцией.
+    y = np.asarray(y, dtype=np.float64)
+    n_buckets = max(n_out // 2, 1)
+    size = int(np.ceil(len(y) / n_buckets))
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:len(y)] = y
+    padded = padded.reshape(n_buckets, size)
+
+    filled = ~np.isnan(padded).all(axis=1)
+    rows = np.flatnonzero(filled)
+    offsets = rows * size
+    lows = offsets + np.nanargmin(padded[filled], axis=1)
+    highs = offsets + np.nanargmax(padded[filled], axis=1)
+    return np.unique(np.concatenate([[0, len(y) - 1], lows, highs]))
+
+
+def lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: из каждой корзины берётся точка, образующая наибольший
+    # треугольник с точкой, выбранной в предыдущей корзине, и средним следующей корзины
+    x = _as_float(x)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+
+    # Средние всех корзин считаются сразу через накопленные суммы
+    cum_x = np.concatenate([[0.0], np.cumsum(x)])
+    cum_y = np.concatenate([[0.0], np.cumsum(y)])
+    starts, ends = edges[:-1], edges[1:]
+    counts = np.maximum(ends - starts, 1)
+    mean_x = (cum_x[ends] - cum_x[starts]) / counts
+    mean_y = (cum_y[ends] - cum_y[starts]) / counts
+    # Для последней корзины «следующей» служит последняя точка ряда
+    next_x = np.append(mean_x[1:], x[-1])
+    next_y = np.append(mean_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    prev = 0
+    for i, (start, end) in enumerate(zip(starts, ends)):
+        bx, by = x[start:end], y[start:end]
+        area = np.abs((x[prev] - next_x[i]) * (by - y[prev]) - (x[prev] - bx) * (next_y[i] - y[prev]))
+        prev = start + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def downsample_indices(x, y, n_out=DEFAULT_POINTS, method="lttb"):
+    # Номера точек, которые достаточно отправить в браузер; пропуски в y отбрасываются
+    y = np.asarray(y, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(y))
+    if len(valid) <= n_out or n_out < 3:
+        return valid
+    if method == "minmax":
+        chosen = minmax_indices(y[valid], n_out)
+    else:
+        chosen = lttb_indices(np.asarray(x)[valid], y[valid], n_out)
+    return valid[chosen]
+
+
+def line_trace(x, y, name=None, n_out=DEFAULT_POINTS, method="lttb", **kwargs):
+    # Линия с прореживанием до бюджета точек; плотные ряды рисуются через Scattergl
+    x = np.asarray(x)
+    y = np.asarray(y)
+    idx = downsample_indices(x, y, n_out=n_out, method=method)
+    trace_type = go.Scattergl if len(idx) > WEBGL_THRESHOLD else go.Scatter
+    kwargs.setdefault("mode", "lines")
+    return trace_type(x=x[idx], y=y[idx], name=name, **kwargs)
@@ -0,0 +1,82 @@
+# utils/file_cache.py
+
+import hashlib
+import json
+import os
+
+# Колоночные кэши источников лежат рядом с данными
+CACHE_DIR = "data/.cache"
+# Сколько байт перед водяным знаком запоминаем, чтобы заметить перезапись файла вместо дописывания
+GUARD_BYTES = 256
+
+
+def sha256_of(path, size=None):
+    # sha256 файла целиком или только первых size байт
+    sha = hashlib.sha256()
+    remaining = os.path.getsize(path) if size is None else size
+    with open(path, "rb") as f:
+        while remaining > 0:
+            block = f.read(min(1 << 20, remaining))
+            if not block:
+                break
+            sha.update(block)
+            remaining -= len(block)
+    return sha.hexdigest()
+
+
+def read_guard(path, offset):
+    # Последние GUARD_BYTES байт перед смещением offset
+    with open(path, "rb") as f:
+        f.seek(max(offset - GUARD_BYTES, 0))
+        return f.read(min(offset, GUARD_BYTES))
+
+
+def file_signature(path, with_hash=True):
+    # Подпись файла-источника: mtime и размер проверяются быстро, sha256 — только при необходимости
+    stat = os.stat(path)
+    signature = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    if with_hash:
+        signature["sha256"] = sha256_of(path, stat.st_size)
+    return signature
+
+
+def cache_paths(source_path, suffix):
+    name = os.path.splitext(os.path.basename(source_path))[0]
+    return (os.path.join(CACHE_DIR, f"{name}.{suffix}"),
+            os.path.join(CACHE_DIR, f"{name}.meta.json"))
+
+
+def read_meta(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_meta(meta_path, meta):
+    tmp_path = meta_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def cached_source_version(source_path, cache_path, meta_path, schema=None):
+    # Возвращает sha256 источника, если колоночный кэш актуален, иначе None.
+    # Если изменился только mtime (файл перезаписали тем же содержимым), кэш остаётся валидным.
+    # schema — версия формата кэша: кэш, записанный другой версией, считается устаревшим.
+    meta = read_meta(meta_path)
+    if meta is None or not os.path.exists(cache_path) or meta.get("schema") != schema:
+        return None
+
+    quick = file_signature(source_path, with_hash=False)
+    if quick["mtime_ns"] == meta["mtime_ns"] and quick["size"] == meta["size"]:
+        return meta["sha256"]
+    if quick["size"] != meta["size"]:
+        return None
+
+    full = file_signature(source_path)
+    if full["sha256"] != meta["sha256"]:
+        return None
+    write_meta(meta_path, {**full, "schema": schema})
+    return full["sha256"]
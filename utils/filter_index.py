@@ -0,0 +1,149 @@
+# utils/filter_index.py
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Колонки, по которым фильтрует боковая панель дашборда
+FILTER_COLUMNS = [
+    "Year", "Quarter", "Season", "Month", "DayOfWeek", "TimeOfDay", "Departure_Arrival",
+    "Reg_type", "Reg_sr_type", "IsCancelled", "DelayCategory", "Airline_name",
+]
+
+
+# Запас ёмкости массивов кодов при дописывании строк: копирование истории — раз на рост в GROWTH раз
+GROWTH = 1.5
+
+
+def _smallest_int_dtype(n_values):
+    for dtype in (np.int8, np.int16, np.int32):
+        if n_values < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+class FilterIndex:
+    # Индекс для фильтров боковой панели. Строится один раз на версию набора данных:
+    # каждая колонка кодируется компактными целочисленными кодами значений.
+    # Выбор в колонке превращается в булеву таблицу по кодам (OR значений внутри колонки),
+    # маски колонок объединяются через AND. Колонки, где выбраны все значения, пропускаются.
+    # Последние комбинации фильтров хранятся в LRU-кэше в виде массивов номеров строк.
+
+    def __init__(self, df, columns=FILTER_COLUMNS, cache_size=64):
+        self.n_rows = len(df)
+        self.columns = [col for col in columns if col in df.columns]
+        self.codes = {}
+        self.values = {}
+        # Массивы кодов с запасом ёмкости и число занятых строк; общие с индексами из extended()
+        self._buffers = {}
+        for col in self.columns:
+            codes, uniques = pd.factorize(df[col], use_na_sentinel=False)
+            self.codes[col] = codes.astype(_smallest_int_dtype(len(uniques)))
+            self.values[col] = pd.Index(np.asarray(uniques))
+            self._buffers[col] = [self.codes[col], self.n_rows]
+
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def options(self, col):
+        # Уникальные значения колонки в порядке первого появления, как у Series.unique()
+        return list(self.values[col])
+
+    def _selected_codes(self, col, selected):
+        # Сравнение как у Series.isin: выбор [True, False] совпадает с колонкой из 0/1
+        return np.flatnonzero(self.values[col].isin(list(selected)))
+
+    def _normalize(self, selection):
+        # Ключ кэша: для каждой ограничивающей колонки — отсортированные коды выбранных значений.
+        # None означает «без фильтра»; выбор всех значений эквивалентен отсутствию фильтра.
+        key = []
+        for col in self.columns:
+            selected = selection.get(col)
+            if selected is None:
+                continue
+            codes = self._selected_codes(col, selected)
+            if len(codes) == len(self.values[col]):
+                continue
+            key.append((col, tuple(codes.tolist())))
+        return tuple(key)
+
+    def _compute(self, key):
+        mask = None
+        for col, codes in key:
+            lut = np.zeros(len(self.values[col]), dtype=bool)
+            lut[list(codes)] = True
+            col_mask = lut[self.codes[col]]
+            if mask is None:
+                mask = col_mask
+            else:
+                np.logical_and(mask, col_mask, out=mask)
+
+        rows = np.arange(self.n_rows) if mask is None else np.flatnonzero(mask)
+        # Результат разделяется между сессиями, поэтому запрещаем его изменение
+        rows.setflags(write=False)
+        return rows
+
+    def select(self, selection):
+        # selection: {колонка: список выбранных значений или None}. Возвращает номера строк.
+        key = self._normalize(selection)
+        with self._lock:
+            rows = self._cache.get(key)
+            if rows is not None:
+                self._cache.move_to_end(key)
+                return rows
+
+        rows = self._compute(key)
+        with self._lock:
+            self._cache[key] = rows
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rows
+
+    def cache_clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def extended(self, df, keep_rows=None):
+        # Новый индекс: первые keep_rows строк берутся из текущего, строки df дописываются в конец.
+        # Текущий индекс не меняется, поэтому им можно продолжать пользоваться из других сессий.
+        keep_rows = self.n_rows if keep_rows is None else keep_rows
+        result = FilterIndex.__new__(FilterIndex)
+        result.n_rows = keep_rows + len(df)
+        result.columns = self.columns
+        result.codes = {}
+        result.values = {}
+        result._buffers = {}
+        for col in self.columns:
+            batch = np.asarray(df[col])
+            values = self.values[col]
+            codes = values.get_indexer(batch)
+            if (codes < 0).any():
+                values = values.append(pd.Index(pd.unique(batch[codes < 0])))
+                codes = values.get_indexer(batch)
+            dtype = np.promote_types(self.codes[col].dtype, _smallest_int_dtype(len(values)))
+            result._buffers[col] = self._append_codes(col, keep_rows, codes.astype(dtype))
+            result.codes[col] = result._buffers[col][0][:result.n_rows]
+            result.values[col] = values
+
+        result.cache_size = self.cache_size
+        result._cache = OrderedDict()
+        result._lock = threading.Lock()
+        return result
+
+    def _append_codes(self, col, keep_rows, codes):
+        # Если за нашими строками в буфере никто не дописывал, новые коды пишутся в его запас:
+        # прежние индексы читают только свои первые n_rows строк и изменений не видят
+        buffer = self._buffers[col]
+        data, used = buffer
+        end = keep_rows + len(codes)
+        if keep_rows == used == self.n_rows and data.dtype == codes.dtype and end <= len(data):
+            data[keep_rows:end] = codes
+            buffer[1] = end
+            return buffer
+        data = np.empty(int(end * GROWTH) + 1, dtype=codes.dtype)
+        data[:keep_rows] = self.codes[col][:keep_rows]
+        data[keep_rows:end] = codes
+        return [data, end]
@@ -0,0 +1,178 @@
+# utils/forecast.py
+#
+# Пакетный прогноз пассажиропотока: python -m utils.forecast [--workers N] [--horizon 30] [--force]
+# Запускается по расписанию (cron) после поступления данных; дашборд только читает результат.
+
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from utils.anomaly import series_matrix
+from utils.cube import build_cube, rollup
+from utils.file_cache import CACHE_DIR, write_meta
+from utils.preprocessing import PASSENGER_CSV, read_passenger_data
+
+FORECAST_DIR = os.path.join(CACHE_DIR, "forecasts")
+FORECASTS_PATH = os.path.join(FORECAST_DIR, "forecasts.arrow")
+MANIFEST_PATH = os.path.join(FORECAST_DIR, "manifest.json")
+
+# Меняется при любом изменении модели — все ряды будут переобучены
+MODEL_VERSION = "ols-weekday-fourier-1"
+HORIZON_DAYS = 30
+TRAIN_DAYS = 730
+MIN_TRAIN_DAYS = 56
+FOURIER_TERMS = 2
+Z_INTERVAL = 1.96
+# Сколько прошлых выпусков прогноза хранить для сравнения с фактом
+KEEP_ISSUES = 12
+
+TOTAL_SERIES = "Итого"
+
+
+def _design(dates, origin):
+    # Признаки: тренд, дни недели (one-hot без понедельника), годовая сезонность рядами Фурье
+    t = ((dates - origin) / pd.Timedelta(days=365.25)).to_numpy(dtype="float64")
+    columns = [np.ones(len(dates)), t]
+    weekday = dates.dayofweek.to_numpy()
+    columns += [(weekday == day).astype("float64") for day in range(1, 7)]
+    angle = 2 * np.pi * dates.dayofyear.to_numpy() / 365.25
+    for k in range(1, FOURIER_TERMS + 1):
+        columns += [np.sin(k * angle), np.cos(k * angle)]
+    return np.column_stack(columns)
+
+
+def fit_series(task):
+    # Обучение одного ряда; функция верхнего уровня, чтобы её можно было отправить в процесс
+    key, dates, values, horizon = task
+    dates = pd.DatetimeIndex(dates)
+    origin = dates[0]
+    X = _design(dates, origin)
+    coef, *_ = np.linalg.lstsq(X, values, rcond=None)
+    resid = values - X @ coef
+    dof = max(len(values) - X.shape[1], 1)
+    sigma = np.sqrt(resid @ resid / dof)
+
+    future = pd.date_range(dates[-1] + pd.Timedelta(days=1), periods=horizon, freq="D")
+    X_future = _design(future, origin)
+    # Интервал прогноза учитывает и шум, и неопределённость коэффициентов
+    leverage = np.einsum("ij,jk,ik->i", X_future, np.linalg.pinv(X.T @ X), X_future)
+    yhat = X_future @ coef
+    half_width = Z_INTERVAL * sigma * np.sqrt(1 + leverage)
+    forecast = pd.DataFrame({
+        "Series": key,
+        "Date": future,
+        "Issued": dates[-1],
+        "yhat": np.maximum(yhat, 0),
+        "lower": np.maximum(yhat - half_width, 0),
+        "upper": yhat + half_width,
+    })
+    model = {"coef": coef.tolist(), "sigma": float(sigma), "origin": str(origin.date())}
+    return key, model, forecast
+
+
+def build_series(cube):
+    # Дневные ряды: итог и каждая пара авиакомпания / направление
+    daily = rollup(cube, ["Date", "Airline_name", "Departure_Arrival"])
+    daily["Series"] = daily["Airline_name"].astype(str) + " / " + daily["Departure_Arrival"].astype(str)
+    return series_matrix(daily, "Date", "Series", "pax_sum", "D", TOTAL_SERIES)
+
+
+def _series_hash(dates, values):
+    sha = hashlib.sha1()
+    sha.update(np.asarray(dates, dtype="datetime64[ns]").tobytes())
+    sha.update(np.asarray(values, dtype="float64").tobytes())
+    return sha.hexdigest()
+
+
+def read_manifest():
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"series": {}}
+
+
+def read_forecasts():
+    if not os.path.exists(FORECASTS_PATH):
+        return None
+    return feather.read_feather(FORECASTS_PATH)
+
+
+def run(matrix, horizon=HORIZON_DAYS, workers=None, force=False, dataset_version=None):
+    # Переобучаются только ряды, у которых изменилось обучающее окно, модель или горизонт
+    manifest = read_manifest()
+    previous = read_forecasts()
+    known = manifest["series"] if manifest.get("model_version") == MODEL_VERSION and not force else {}
+
+    tasks, models, unchanged = [], {}, []
+    for key in matrix.columns:
+        values = matrix[key].to_numpy(dtype="float64")
+        nonzero = np.flatnonzero(values)
+        if len(nonzero) == 0:
+            continue
+        # Окно ряда — по его собственным наблюдениям: от первого ненулевого дня (у новых авиакомпаний
+        # нет истории до запуска) до последнего, не длиннее TRAIN_DAYS. Нули общей сетки после
+        # последнего рейса в окно не входят, поэтому новый день в других рядах не меняет хеш этого ряда
+        end = nonzero[-1] + 1
+        start = max(nonzero[0], end - TRAIN_DAYS)
+        if end - start < MIN_TRAIN_DAYS:
+            continue
+        dates, values = matrix.index[start:end], values[start:end]
+        data_hash = _series_hash(dates, values)
+        entry = known.get(key)
+        if entry is not None and entry["hash"] == data_hash and entry.get("horizon") == horizon:
+            models[key] = entry
+            unchanged.append(key)
+        else:
+            tasks.append((key, dates.to_numpy(), values, horizon))
+            models[key] = {"hash": data_hash, "horizon": horizon}
+
+    forecasts = []
+    if tasks:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for key, model, forecast in pool.map(fit_series, tasks, chunksize=max(len(tasks) // 32, 1)):
+                models[key].update(model)
+                forecasts.append(forecast)
+
+    # Прошлые выпуски сохраняем, чтобы сравнивать их с поступившим фактом
+    if previous is not None:
+        history = previous[previous["Series"].isin(models)]
+        forecasts.insert(0, history)
+    table = pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame()
+    if not table.empty:
+        table = table.drop_duplicates(["Series", "Issued", "Date"], keep="last")
+        recent_issues = table.groupby("Series")["Issued"].transform(
+            lambda issued: issued.isin(np.sort(issued.unique())[-KEEP_ISSUES:]))
+        table = table[recent_issues].reset_index(drop=True)
+
+    os.makedirs(FORECAST_DIR, exist_ok=True)
+    tmp_path = FORECASTS_PATH + ".tmp"
+    feather.write_feather(table, tmp_path)
+    os.replace(tmp_path, FORECASTS_PATH)
+    write_meta(MANIFEST_PATH, {"model_version": MODEL_VERSION, "dataset_version": dataset_version,
+                               "series": models})
+    return len(tasks), len(unchanged)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный прогноз пассажиропотока")
+    parser.add_argument("--source", default=PASSENGER_CSV)
+    parser.add_argument("--horizon", type=int, default=HORIZON_DAYS)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="переобучить все ряды")
+    args = parser.parse_args()
+
+    df = read_passenger_data(args.source)
+    matrix = build_series(build_cube(df))
+    fitted, unchanged = run(matrix, args.horizon, args.workers, args.force, df.attrs["version"])
+    print(f"Прогноз обновлён: переобучено рядов {fitted}, без изменений {unchanged}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# utils/ingest.py
+
+import io
+import os
+import threading
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.cube import build_cube, merge_cube
+from utils.file_cache import cache_paths, file_signature, read_guard, read_meta, sha256_of
+from utils.filter_index import FilterIndex
+from utils.materialized import VALUE_COUNT_TABLES, current_version, read_manifest, read_table, value_count_table
+from utils.metrics import Stage, tracked_cache
+from utils.preprocessing import (PASSENGER_CATEGORIES, PASSENGER_CSV, PASSENGER_SCHEMA, parse_passenger_csv,
+                                 read_passenger_cache, read_passenger_data, write_passenger_cache)
+from utils.sketch import build_sketch, merge_sketch
+
+# Снимок в Arrow-кэше переписывается, когда дописанных строк становится больше этой доли
+SNAPSHOT_REWRITE_RATIO = 0.25
+# Сколько дописанных порций держим раздельно; сверх этого они склеиваются в одну (без снимка)
+MAX_CHUNKS = 16
+
+# Согласованное состояние набора данных; заменяется целиком, поэтому сессии читают его без блокировок.
+# В снимке из материализованных таблиц рейсов нет (df и index — None), вместо них — таблицы частот
+# counts: {имя: [(таблица, индекс фильтров), ...]} — таблица сборки (utils/materialized.py)
+# и таблица частот строк, дописанных после неё.
+# changed: первая дата ячеек куба, пересчитанных дописанной порцией → число строк после этой порции
+# (версия "<основа>+<строк>"); по нему производные таблицы находят самый ранний изменённый день
+PassengerSnapshot = namedtuple("PassengerSnapshot",
+                               "df version index cube cube_index sketch sketch_index watermark counts changed",
+                               defaults=(None, None))
+
+
+class ChunkedFrame:
+    # Таблица рейсов из неизменяемых порций: снимок из Arrow-кэша и дописанные после него порции.
+    # Дописывание не копирует историю; порции склеиваются в одну только при записи нового снимка.
+    # Категории только расширяются, поэтому dtype последней порции включает категории всех прежних.
+
+    def __init__(self, chunks):
+        self.chunks = tuple(chunks)
+        self.bounds = np.cumsum([0] + [len(chunk) for chunk in self.chunks])
+
+    def __len__(self):
+        return int(self.bounds[-1])
+
+    @property
+    def columns(self):
+        return self.chunks[-1].columns
+
+    def appended(self, batch):
+        chunks = self.chunks + (batch,)
+        if len(chunks) > MAX_CHUNKS:
+            chunks = (chunks[0], ChunkedFrame(chunks[1:]).to_frame())
+        return ChunkedFrame(chunks)
+
+    def _unified(self, part):
+        # Категориальные колонки части — к dtype последней порции (старые категории — его префикс)
+        dtypes = self.chunks[-1].dtypes
+        return part.astype({col: dtypes[col] for col in part.columns
+                            if isinstance(dtypes.get(col), pd.CategoricalDtype) and part[col].dtype != dtypes[col]})
+
+    def to_frame(self):
+        if len(self.chunks) == 1:
+            return self.chunks[0]
+        return pd.concat([self._unified(chunk) for chunk in self.chunks], ignore_index=True)
+
+    @staticmethod
+    def _chunk_counts(chunk, columns, local=None):
+        keys = [chunk[col] if local is None else chunk[col].take(local) for col in columns]
+        return keys[0].groupby(keys, observed=True).size().reset_index(name="rows")
+
+    def value_counts(self, columns, rows):
+        # Частоты сочетаний значений columns по номерам строк rows (по возрастанию):
+        # считаются по каждой порции отдельно и складываются, без склейки самих порций
+        parts = []
+        cuts = np.searchsorted(rows, self.bounds)
+        for chunk, start, lo, hi in zip(self.chunks, self.bounds, cuts[:-1], cuts[1:]):
+            if hi > lo:
+                local = None if hi - lo == len(chunk) else rows[lo:hi] - start
+                parts.append(self._chunk_counts(chunk, columns, local))
+        if len(parts) <= 1:
+            return parts[0] if parts else self._chunk_counts(self.chunks[-1], columns, [])
+        merged = pd.concat([self._unified(part) for part in parts], ignore_index=True)
+        return merged.groupby(columns, observed=True)["rows"].sum().reset_index()
+
+
+class PassengerStore:
+    # Набор рейсов из CSV, который только дописывается. Водяной знак — смещение в байтах после
+    # последней прочитанной строки; refresh() читает только новые строки и дописывает их
+    # в таблицу, индекс фильтров и куб, не пересчитывая историю.
+    # С материализованной сборкой (materialized — её версия) основа — куб, скетч и таблицы частот
+    # сборки без таблицы рейсов; дочитываются только строки, дописанные в источник после сборки.
+
+    def __init__(self, source_path=PASSENGER_CSV, materialized=None):
+        self.source_path = source_path
+        self.materialized = materialized
+        self._lock = threading.Lock()
+        self._load_full()
+
+    def _load_full(self):
+        if self.materialized is not None and self._load_materialized():
+            return
+        cache_path, meta_path = cache_paths(self.source_path, "arrow")
+        meta = read_meta(meta_path)
+        size = os.path.getsize(self.source_path)
+
+        # Файл вырос с момента записи снимка: если начало совпадает, дочитываем только хвост
+        if (meta is not None and meta.get("schema") == PASSENGER_SCHEMA and os.path.exists(cache_path)
+                and size > meta["size"] and sha256_of(self.source_path, meta["size"]) == meta["sha256"]):
+            df = read_passenger_cache(cache_path)
+            df.attrs["version"] = meta["sha256"]
+            offset = meta["size"]
+        else:
+            df = read_passenger_data(self.source_path)
+            offset = read_meta(meta_path)["size"]
+
+        self.base_version = df.attrs["version"]
+        # Имена колонок источника для чтения хвоста без заголовка (без выводимых календарных колонок)
+        self.columns = list(pd.read_csv(self.source_path, nrows=0).columns)
+        self.snapshot_rows = self.rows = len(df)
+        self.offset = offset
+        self._guard = self._read_guard()
+        cube = build_cube(df)
+        sketch = build_sketch(df)
+        self.snapshot = PassengerSnapshot(ChunkedFrame([df]), self.base_version, FilterIndex(df),
+                                          cube, FilterIndex(cube), sketch, FilterIndex(sketch), df["Date"].max())
+        self._append_tail()
+
+    def _load_materialized(self):
+        # Сборка — основа, только если источник с тех пор лишь дописывался; иначе (файл перезаписан,
+        # сборка устарела) — обычная полная загрузка CSV до следующей сборки
+        source = read_manifest(self.materialized)["sources"]["passengers"]
+        if os.path.getsize(self.source_path) < source["size"]:
+            return False
+        if "guard" in source:
+            unchanged = read_guard(self.source_path, source["size"]).hex() == source["guard"]
+        else:
+            unchanged = sha256_of(self.source_path, source["size"]) == source["sha256"]
+        if not unchanged:
+            return False
+
+        self.snapshot = load_materialized_snapshot(self.materialized)
+        self.base_version = self.snapshot.version
+        self.columns = list(pd.read_csv(self.source_path, nrows=0).columns)
+        self.snapshot_rows = None
+        self.rows = int(self.snapshot.cube["rows"].sum())
+        self.offset = source["size"]
+        self._guard = self._read_guard()
+        self._append_tail()
+        return True
+
+    def _read_guard(self):
+        return read_guard(self.source_path, self.offset)
+
+    def refresh(self):
+        # Дочитывает новые строки источника; возвращает число добавленных строк
+        with self._lock, Stage("PassengerStore.refresh") as stage:
+            size = os.path.getsize(self.source_path)
+            if size == self.offset:
+                stage.rows_out = 0
+            elif size < self.offset or self._read_guard() != self._guard:
+                # Файл перезаписан, а не дописан — полная перезагрузка
+                self._load_full()
+                stage.rows_out = self.rows
+            else:
+                stage.rows_out = self._append_tail()
+            return stage.rows_out
+
+    def _append_tail(self):
+        with open(self.source_path, "rb") as f:
+            f.seek(self.offset)
+            chunk = f.read()
+        # Незаконченную последнюю строку оставляем до следующего обновления
+        end = chunk.rfind(b"\n")
+        if end < 0:
+            return 0
+        chunk = chunk[:end + 1]
+        batch = parse_passenger_csv(io.BytesIO(chunk), names=self.columns, header=None)
+        # Водяной знак сдвигается только после успешного дописывания: при ошибке порция
+        # будет прочитана снова при следующем обновлении
+        if not batch.empty:
+            self._append(batch)
+        self.offset += len(chunk)
+        self._guard = self._read_guard()
+        # Снимок таблицы в Arrow-кэше пишется только при полной загрузке; основа сборки не меняется
+        if (self.snapshot.df is not None
+                and self.rows - self.snapshot_rows > SNAPSHOT_REWRITE_RATIO * max(self.snapshot_rows, 1)):
+            self._write_snapshot()
+        return len(batch)
+
+    def _append(self, batch):
+        old = self.snapshot
+        cube = old.cube
+        sketch = old.sketch
+        counts = old.counts
+        # Типы колонок — по последней порции таблицы, а в снимке сборки — по кубу
+        dtypes = (old.df.chunks[-1] if old.df is not None else cube).dtypes
+
+        # Категории порции, куба, скетча и таблиц частот расширяем значениями, впервые
+        # встретившимися в порции; прежние порции таблицы не трогаем (см. ChunkedFrame)
+        for col in PASSENGER_CATEGORIES:
+            if col not in dtypes:
+                continue
+            dtype = dtypes[col]
+            new_values = batch[col].cat.categories.difference(dtype.categories)
+            if len(new_values):
+                dtype = pd.CategoricalDtype(dtype.categories.append(new_values), ordered=dtype.ordered)
+                # Скетч хранит не все фильтры куба (нет Reg_type, Reg_sr_type, DelayCategory)
+                cube = _with_categories(cube, col, new_values)
+                sketch = _with_categories(sketch, col, new_values)
+                if counts is not None:
+                    counts = {name: [(_with_categories(table, col, new_values), index) for table, index in chunks]
+                              for name, chunks in counts.items()}
+            batch[col] = batch[col].astype(dtype)
+
+        rows = self.rows + len(batch)
+        df = index = None
+        if old.df is not None:
+            df = old.df.appended(batch)
+            index = old.index.extended(batch)
+        if counts is not None:
+            counts = {name: _appended_counts(chunks, value_count_table(batch, VALUE_COUNT_TABLES[name]))
+                      for name, chunks in counts.items()}
+
+        cube, keep = merge_cube(cube, build_cube(batch))
+        sketch, keep_sketch = merge_sketch(sketch, build_sketch(batch))
+        # Ячейки с позиции keep пересчитаны; опоздавшая строка сдвигает keep к своему дню
+        changed = old.changed.copy() if old.changed is not None else pd.Series(dtype="int64")
+        changed[cube["Date"].iloc[keep]] = rows
+        self.snapshot = PassengerSnapshot(
+            df, f"{self.base_version}+{rows}",
+            index,
+            cube,
+            old.cube_index.extended(cube.iloc[keep:], keep_rows=keep),
+            sketch,
+            old.sketch_index.extended(sketch.iloc[keep_sketch:], keep_rows=keep_sketch),
+            max(old.watermark, batch["Date"].max()),
+            counts,
+            changed,
+        )
+        self.rows = rows
+
+    def _write_snapshot(self):
+        # Снимок с водяным знаком: после перезапуска процесса дочитывается только хвост файла
+        signature = file_signature(self.source_path, with_hash=False)
+        signature.update(size=self.offset, sha256=sha256_of(self.source_path, self.offset))
+        write_passenger_cache(self.snapshot.df.to_frame(), signature, self.source_path)
+        # Склеенная таблица заменяется memory map только что записанного файла
+        df = read_passenger_cache(cache_paths(self.source_path, "arrow")[0])
+        self.snapshot = self.snapshot._replace(df=ChunkedFrame([df]))
+        self.snapshot_rows = len(df)
+
+
+def _with_categories(table, col, new_values):
+    if col not in table.columns:
+        return table
+    return table.assign(**{col: table[col].cat.add_categories(new_values)})
+
+
+def _appended_counts(chunks, batch_counts):
+    # Частоты дописанных строк копятся во второй, небольшой таблице рядом с таблицей сборки
+    base, *tail = chunks
+    if tail:
+        table = tail[0][0]
+        keys = [col for col in table.columns if col != "rows"]
+        batch_counts = (pd.concat([table, batch_counts], ignore_index=True)
+                        .groupby(keys, observed=True, sort=False, dropna=False)["rows"].sum().reset_index())
+    return [base, (batch_counts, FilterIndex(batch_counts))]
+
+
+@tracked_cache(st.cache_resource(max_entries=2))
+def get_passenger_store(materialized=None):
+    # Одно хранилище на процесс (и версию сборки): все сессии видят одни и те же данные и водяной знак
+    return PassengerStore(materialized=materialized)
+
+
+@tracked_cache(st.cache_resource(max_entries=2))
+def load_materialized_snapshot(version):
+    # Снимок из материализованной сборки: куб, скетч и таблицы частот без таблицы рейсов
+    manifest = read_manifest(version)
+    cube = read_table(version, "cube")
+    sketch = read_table(version, "sketch")
+    counts = {}
+    for name in VALUE_COUNT_TABLES:
+        table = read_table(version, name)
+        counts[name] = [(table, FilterIndex(table))]
+    return PassengerSnapshot(None, f"materialized:{version}", None, cube, FilterIndex(cube),
+                             sketch, FilterIndex(sketch), pd.Timestamp(manifest["watermark"]), counts)
+
+
+def get_passenger_snapshot():
+    # Основа — последняя материализованная сборка (python -m utils.materialize), а если её нет —
+    # CSV целиком; строки, дописанные в источник после основы, дочитываются при каждом вызове
+    version = current_version()
+    if version is not None and not os.path.exists(PASSENGER_CSV):
+        # Приложение развёрнуто только со сборкой, без источника
+        return load_materialized_snapshot(version)
+    store = get_passenger_store(version)
+    store.refresh()
+    return store.snapshot
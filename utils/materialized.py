@@ -0,0 +1,81 @@
+# utils/materialized.py
+#
+# Чтение материализованных агрегатов (их пишет python -m utils.materialize).
+# Каждая сборка — отдельный каталог data/.cache/materialized/<версия>/ с Parquet-таблицами
+# и manifest.json; current.json указывает на последнюю готовую сборку и заменяется атомарно.
+
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+from utils.file_cache import CACHE_DIR, read_meta
+from utils.filter_index import FILTER_COLUMNS
+
+MATERIALIZED_DIR = os.path.join(CACHE_DIR, "materialized")
+CURRENT_PATH = os.path.join(MATERIALIZED_DIR, "current.json")
+# Меняется при изменении состава или формата таблиц — старые сборки не читаются
+MATERIALIZED_SCHEMA = 3
+
+# Таблицы частот для квантилей и корзин: колонки фильтров + перечисленные значения + rows.
+# Одна таблица на оба графика: частоты пассажиропотока — её свёртка по DelayTime (отменённые
+# рейсы без задержки хранятся с пустым DelayTime), отдельная таблица почти того же размера не нужна
+VALUE_COUNT_TABLES = {
+    "flight_counts": ["Total_Passengers", "DelayTime"],
+}
+
+SENSOR_KINDS = ("temperature", "co2")
+
+
+def value_count_table(df, values):
+    # Частоты сочетаний колонок фильтров и values; так же считаются частоты дописанных строк
+    keys = [col for col in FILTER_COLUMNS if col in df.columns] + values
+    return df.groupby(keys, observed=True, sort=False, dropna=False).size().reset_index(name="rows")
+
+
+def current_version():
+    # Версия последней сборки или None, если материализация не запускалась
+    current = read_meta(CURRENT_PATH)
+    if current is None or current.get("schema") != MATERIALIZED_SCHEMA:
+        return None
+    if not os.path.exists(os.path.join(MATERIALIZED_DIR, current["version"], "manifest.json")):
+        return None
+    return current["version"]
+
+
+def read_manifest(version):
+    return read_meta(os.path.join(MATERIALIZED_DIR, version, "manifest.json"))
+
+
+def read_table(version, name):
+    # Таблица сборки или None, если её нет (например, не было файла датчиков)
+    manifest = read_manifest(version)
+    entry = manifest["tables"].get(name) if manifest else None
+    if entry is None:
+        return None
+    return pd.read_parquet(os.path.join(MATERIALIZED_DIR, version, entry["file"]))
+
+
+@lru_cache(maxsize=4)
+def _sensor_rollups(version, kind):
+    rollups = {}
+    for resolution in ("minute", "hour", "day"):
+        table = read_table(version, f"{kind}_{resolution}")
+        if table is None:
+            return None
+        rollups[resolution] = table
+    return rollups
+
+
+def materialized_sensor_rollups(kind, path):
+    # Сводки датчиков из последней сборки: {"minute" | "hour" | "day": таблица} или None.
+    # Если файл датчиков изменился после сборки, тоже None — сводки строятся из файла заново
+    version = current_version()
+    source = read_manifest(version)["sources"].get(kind) if version is not None else None
+    if source is None:
+        return None
+    if os.path.exists(path):
+        stat = os.stat(path)
+        if (stat.st_size, stat.st_mtime_ns) != (source["size"], source["mtime_ns"]):
+            return None
+    return _sensor_rollups(version, kind)
@@ -0,0 +1,243 @@
+# utils/metrics.py
+#
+# Замеры горячих путей: время, строки на входе и выходе, прирост RSS и попадания в кэши.
+# Данные общие для всех сессий процесса Streamlit. Страница «Диагностика» показывает перцентили
+# по последним замерам. prometheus_text() отдаёт те же метрики в текстовом формате Prometheus.
+# Если задан AIRPORT_METRICS_PORT, они дополнительно публикуются по HTTP на /metrics.
+
+import functools
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+import pandas as pd
+import psutil
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, start_http_server
+
+METRICS_PORT_ENV = "AIRPORT_METRICS_PORT"
+# Сколько последних замеров этапа храним для перцентилей
+WINDOW = 2000
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+REGISTRY = CollectorRegistry()
+STAGE_SECONDS = Histogram("airport_stage_seconds", "Время выполнения этапа", ["stage"],
+                          buckets=LATENCY_BUCKETS, registry=REGISTRY)
+STAGE_ROWS = Counter("airport_stage_rows", "Строки на входе и выходе этапа", ["stage", "direction"],
+                     registry=REGISTRY)
+STAGE_MEMORY = Gauge("airport_stage_memory_delta_bytes", "Прирост RSS за последний вызов этапа", ["stage"],
+                     registry=REGISTRY)
+CACHE_REQUESTS = Counter("airport_cache_requests", "Обращения к кэшам", ["cache", "result"], registry=REGISTRY)
+PROCESS_RSS = Gauge("airport_process_rss_bytes", "RSS процесса", registry=REGISTRY)
+
+_lock = threading.Lock()
+_samples = defaultdict(lambda: deque(maxlen=WINDOW))
+_calls = defaultdict(int)
+_cache_counts = defaultdict(lambda: {"hit": 0, "miss": 0})
+_process = psutil.Process()
+_server_started = False
+
+
+def process_rss():
+    return _process.memory_info().rss
+
+
+PROCESS_RSS.set_function(process_rss)
+
+
+def count_rows(result):
+    # Число строк результата: таблица, ряд или словарь таблиц (сводки по разрешениям)
+    if isinstance(result, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(result)
+    if isinstance(result, dict) and result and all(isinstance(v, pd.DataFrame) for v in result.values()):
+        return sum(len(v) for v in result.values())
+    return None
+
+
+def observe(stage, seconds, rows_in=None, rows_out=None, memory_delta=None):
+    with _lock:
+        _calls[stage] += 1
+        _samples[stage].append((time.time(), seconds, rows_in, rows_out, memory_delta))
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    if rows_in is not None:
+        STAGE_ROWS.labels(stage, "in").inc(rows_in)
+    if rows_out is not None:
+        STAGE_ROWS.labels(stage, "out").inc(rows_out)
+    if memory_delta is not None:
+        STAGE_MEMORY.labels(stage).set(memory_delta)
+
+
+class Stage:
+    # with Stage("имя", rows_in=n) as stage: ...; stage.rows_out = m
+    # Прирост RSS общий для процесса: при параллельных сессиях он приблизителен
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+    def __enter__(self):
+        self._rss = _process.memory_info().rss
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._started
+        observe(self.name, seconds, self.rows_in, self.rows_out, _process.memory_info().rss - self._rss)
+
+
+def timed(name=None, rows_in=None):
+    # Декоратор этапа; rows_in — функция от тех же аргументов, rows_out берётся из результата
+    def decorator(fn):
+        stage_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with Stage(stage_name, rows_in(*args, **kwargs) if rows_in else None) as stage:
+                result = fn(*args, **kwargs)
+                stage.rows_out = count_rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def instrumented(cls):
+    # Декоратор класса дашборда: замеряет __init__ (загрузка данных), load_data, каждый render_*
+    # и run (весь перезапуск страницы).
+    # Строки на входе — размер отфильтрованной выборки, если класс задаёт metric_rows()
+    for attr, method in list(vars(cls).items()):
+        if callable(method) and (attr.startswith("render_") or attr in ("__init__", "load_data", "run")):
+            setattr(cls, attr, _timed_method(f"{cls.__name__}.{attr}", method))
+    return cls
+
+
+def _timed_method(stage_name, method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        rows = getattr(self, "metric_rows", None)
+        with Stage(stage_name) as stage:
+            result = method(self, *args, **kwargs)
+            stage.rows_in = rows() if rows else None
+        return result
+    return wrapper
+
+
+def record_cache(cache, hit):
+    result = "hit" if hit else "miss"
+    with _lock:
+        _cache_counts[cache][result] += 1
+    CACHE_REQUESTS.labels(cache, result).inc()
+
+
+_miss_stack = threading.local()
+
+
+def tracked_cache(cache, name=None):
+    # Оборачивает кэширующий декоратор (st.cache_data, st.cache_resource, lru_cache) счётчиком
+    # попаданий: тело функции выполняется только при промахе, и тогда помечает текущий вызов.
+    # Флаги лежат в стеке потока, поэтому вложенные кэшированные вызовы не мешают друг другу.
+    def decorator(fn):
+        cache_name = name or fn.__qualname__
+
+        @functools.wraps(fn)
+        def body(*args, **kwargs):
+            flags = getattr(_miss_stack, "flags", None)
+            if flags:
+                flags[-1] = True
+            return fn(*args, **kwargs)
+
+        cached = cache(body)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            flags = _miss_stack.__dict__.setdefault("flags", [])
+            flags.append(False)
+            try:
+                result = cached(*args, **kwargs)
+            finally:
+                missed = flags.pop()
+            record_cache(cache_name, hit=not missed)
+            return result
+
+        # Методы очистки кэша остаются доступными через обёртку
+        for attr in ("clear", "cache_clear", "cache_info"):
+            if hasattr(cached, attr):
+                setattr(wrapper, attr, getattr(cached, attr))
+        return wrapper
+    return decorator
+
+
+def stage_summary():
+    # Перцентили по последним WINDOW замерам каждого этапа
+    with _lock:
+        samples = {stage: list(values) for stage, values in _samples.items()}
+        calls = dict(_calls)
+    rows = []
+    for stage, values in samples.items():
+        stamps, seconds, rows_in, rows_out, memory = zip(*values)
+        ms = np.asarray(seconds) * 1000
+        rows.append({
+            "stage": stage,
+            "calls": calls[stage],
+            "p50_ms": np.percentile(ms, 50),
+            "p95_ms": np.percentile(ms, 95),
+            "p99_ms": np.percentile(ms, 99),
+            "max_ms": ms.max(),
+            "rows_in": _mean(rows_in),
+            "rows_out": _mean(rows_out),
+            "memory_delta_mb": _mean(memory) / 2 ** 20 if _mean(memory) is not None else None,
+            "last_call": pd.Timestamp(max(stamps), unit="s"),
+        })
+    if not rows:
+        return pd.DataFrame(columns=["stage", "calls", "p50_ms", "p95_ms", "p99_ms", "max_ms",
+                                     "rows_in", "rows_out", "memory_delta_mb", "last_call"])
+    return pd.DataFrame(rows).sort_values("p95_ms", ascending=False, ignore_index=True)
+
+
+def pooled_percentile(stages, q):
+    # Перцентиль по объединённым замерам нескольких этапов, а не максимум их перцентилей
+    with _lock:
+        seconds = [value[1] for stage in stages for value in _samples.get(stage, ())]
+    return np.percentile(seconds, q) * 1000 if seconds else None
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return float(np.mean(values)) if values else None
+
+
+def cache_summary():
+    with _lock:
+        counts = {cache: dict(c) for cache, c in _cache_counts.items()}
+    stats = pd.DataFrame([{"cache": cache, **c} for cache, c in counts.items()],
+                         columns=["cache", "hit", "miss"])
+    stats["hit_ratio"] = stats["hit"] / (stats["hit"] + stats["miss"]).clip(lower=1)
+    return stats.sort_values("cache", ignore_index=True)
+
+
+def prometheus_text():
+    return generate_latest(REGISTRY).decode("utf-8")
+
+
+def silence_bare_mode():
+    # Для запуска без streamlit run (бенчмарки, API): в bare mode Streamlit предупреждает о каждом
+    # обращении к st.*, а уровень логгеров сбрасывается при чтении конфигурации — фильтр на логгере
+    # переживает этот сброс
+    from streamlit.runtime.scriptrunner_utils import script_run_context
+    script_run_context._LOGGER.addFilter(lambda record: "ScriptRunContext" not in record.getMessage())
+    logging.getLogger("streamlit.runtime.caching.cache_data_api").addFilter(
+        lambda record: "No runtime found" not in record.getMessage())
+
+
+def serve_from_env():
+    # HTTP-эндпоинт для Prometheus, один на процесс; порт из AIRPORT_METRICS_PORT.
+    # Запускается явно при старте приложения (start_warmup) и API, а не при импорте страниц
+    global _server_started
+    port = os.environ.get(METRICS_PORT_ENV)
+    with _lock:
+        if not port or _server_started:
+            return
+        _server_started = True
+    start_http_server(int(port), registry=REGISTRY)
@@ -1,29 +1,129 @@
 # utils/preprocessing.py
 
+import logging
+import os
+
+import numpy as np
 import streamlit as st
 import pandas as pd
+import pyarrow.feather as feather
+
+from utils.file_cache import CACHE_DIR, cache_paths, cached_source_version, file_signature, write_meta
+from utils.metrics import record_cache, timed, tracked_cache
+from utils.materialized import materialized_sensor_rollups
+from utils.sensors import CO2_CSV, TEMPERATURE_CSV, load_sensor_rollups
+
+logger = logging.getLogger(__name__)
+
+PASSENGER_CSV = "data/transformed.csv"
+COMPLAINTS_CSV = "data/Жалобы пассажиров.csv"
+
+# Колонки с небольшим числом уникальных значений храним как category
+PASSENGER_CATEGORIES = [
+    "Airline_name", "TimeOfDay", "DayOfWeek", "YearMonth",
+    "Departure_Arrival", "Reg_type", "Reg_sr_type", "DelayCategory",
+]
+
+# Узкие типы вместо int64 / float64: таблица держится в памяти один раз на процесс
+PASSENGER_DTYPES = {"Hour": "int8", "Year": "int16", "Month": "int8", "Total_Passengers": "int32",
+                    "DelayTime": "float32"}
+
+# Календарные колонки, которые выводятся из Date при загрузке
+QUARTER_DTYPE = pd.CategoricalDtype(["Q1", "Q2", "Q3", "Q4"], ordered=True)
+SEASON_DTYPE = pd.CategoricalDtype(["Зима", "Весна", "Лето", "Осень"], ordered=True)
+CALENDAR_COLUMNS = ["Week", "Quarter", "Season"]
+
+# Меняется при изменении состава или типов колонок — кэши старой схемы пересобираются
+PASSENGER_SCHEMA = 2
+
+
+def add_calendar_columns(df):
+    # Неделя ISO, квартал и сезон по дате; возвращает новую таблицу, исходная не меняется
+    dates = pd.DatetimeIndex(df["Date"])
+    month = dates.month.to_numpy()
+    return df.assign(
+        Week=dates.isocalendar().week.to_numpy(dtype="int8"),
+        Quarter=pd.Categorical.from_codes((month - 1) // 3, dtype=QUARTER_DTYPE),
+        Season=pd.Categorical.from_codes(month % 12 // 3, dtype=SEASON_DTYPE),
+    )
+
+
+def compact_passenger_df(passenger_df):
+    for col in PASSENGER_CATEGORIES:
+        if col in passenger_df.columns:
+            passenger_df[col] = passenger_df[col].astype("category")
+    for col, dtype in PASSENGER_DTYPES.items():
+        if col not in passenger_df.columns:
+            continue
+        # Пропуски в целых колонках не помещаются в int — такие колонки остаются float32
+        if np.dtype(dtype).kind == "i" and passenger_df[col].isna().any():
+            dtype = "float32"
+        passenger_df[col] = passenger_df[col].astype(dtype)
+    return add_calendar_columns(passenger_df)
+
+
+def write_passenger_cache(passenger_df, signature, source_path=PASSENGER_CSV):
+    # Arrow IPC без сжатия: чтение сводится к memory map, категории и datetime64 сохраняются
+    cache_path, meta_path = cache_paths(source_path, "arrow")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp_path = cache_path + ".tmp"
+    feather.write_feather(passenger_df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, cache_path)
+    write_meta(meta_path, {**signature, "schema": PASSENGER_SCHEMA})
+
+
+def read_passenger_cache(cache_path):
+    # Memory map и по блоку на колонку: при чтении нет промежуточной копии файла и склейки блоков
+    return feather.read_feather(cache_path, memory_map=True, split_blocks=True, self_destruct=True)
+
+
+def parse_passenger_csv(source, **kwargs):
+    passenger_df = pd.read_csv(source, parse_dates=["Date"], **kwargs)
+    return compact_passenger_df(passenger_df)
+
+
+def _convert_passenger_csv(source_path):
+    signature = file_signature(source_path)
+    passenger_df = parse_passenger_csv(source_path)
+    write_passenger_cache(passenger_df, signature, source_path)
+    return passenger_df, signature["sha256"]
+
 
+@timed()
+def read_passenger_data(source_path=PASSENGER_CSV):
+    cache_path, meta_path = cache_paths(source_path, "arrow")
+    version = cached_source_version(source_path, cache_path, meta_path, schema=PASSENGER_SCHEMA)
+    record_cache("passenger_arrow", hit=version is not None)
+    if version is not None:
+        passenger_df = read_passenger_cache(cache_path)
+        logger.info("Датасет '%s' загружен из кэша '%s'", source_path, cache_path)
+    else:
+        passenger_df, version = _convert_passenger_csv(source_path)
+        logger.info("Датасет '%s' загружен и сохранён в кэш '%s'", source_path, cache_path)
 
-@st.cache_data
-def load_passenger_data():
-    passenger_df = pd.read_csv("data/transformed.csv", parse_dates=["Date"])
-    print("Датасет 'data/transformed.csv' загружен!")
+    # Версия набора данных — ключ для производных структур (индексы, агрегаты)
+    passenger_df.attrs["version"] = version
     return passenger_df
 
 
-def load_temperature_data():
-    temperature_df = pd.read_excel("data/Средняя_температура_в_помещениях_Аэровокзала Приведенная.csv")
-    print("Датасет 'data/Средняя_температура_в_помещениях_Аэровокзала Приведенная.csv' загружен!")
-    return temperature_df
+@timed()
+def load_temperature_data(resolution="hour"):
+    # Температура по помещениям, агрегированная до minute / hour / day;
+    # материализованные сводки, если файл с тех пор не менялся, иначе — из файла датчиков
+    rollups = materialized_sensor_rollups("temperature", TEMPERATURE_CSV) or load_sensor_rollups(TEMPERATURE_CSV)
+    return rollups[resolution]
 
 
-def load_co2_data():
-    co2_df = pd.read_excel("data/Средняя_CO2_в_помещениях_Аэровокзала Приведенная.csv")
-    print("Датасет 'data/Средняя_CO2_в_помещениях_Аэровокзала Приведенная.csv' загружен!")
-    return co2_df
+@timed()
+def load_co2_data(resolution="hour"):
+    # CO2 по помещениям, агрегированный до minute / hour / day
+    rollups = materialized_sensor_rollups("co2", CO2_CSV) or load_sensor_rollups(CO2_CSV)
+    return rollups[resolution]
 
 
+@timed()
+@tracked_cache(st.cache_data)
 def load_complaints():
-    complaints_df = pd.read_csv("data/Жалобы пассажиров.csv")
-    print("Датасет 'data/Жалобы пассажиров.csv' загружен!")
+    complaints_df = pd.read_csv(COMPLAINTS_CSV)
+    logger.info("Датасет '%s' загружен", COMPLAINTS_CSV)
     return complaints_df
@@ -0,0 +1,90 @@
+# utils/sections.py
+#
+# Секции дашборда с объявленными зависимостями:
+# @depends_on("data_version", "selection_key") — вычисление зависит только от этих атрибутов
+#   дашборда и своих аргументов; результат берётся из общего LRU-кэша процесса, пока они не менялись.
+# @fragment — секция с локальными виджетами: их изменение перезапускает только эту секцию
+#   (st.fragment), а не всю страницу. Вне сервера Streamlit (бенчмарки, тесты) st.fragment тело
+#   не выполняет, поэтому там секция выполняется напрямую.
+
+import functools
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from utils.metrics import Stage, record_cache
+
+SECTION_CACHE_SIZE = 256
+
+# Кэши всех секций процесса — для clear_section_caches()
+_section_caches = []
+
+
+def _hashable(value):
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(item) for item in value)
+    if isinstance(value, dict):
+        return tuple((key, _hashable(item)) for key, item in value.items())
+    return value
+
+
+def depends_on(*inputs, cache_size=SECTION_CACHE_SIZE):
+    # Если какой-то из атрибутов равен None (например, версия данных в режиме БД), кэш не используется.
+    # Вызывающий получает копию таблицы и может её изменять.
+    def decorator(method):
+        cache = OrderedDict()
+        lock = threading.Lock()
+        name = method.__qualname__
+        _section_caches.append((cache, lock))
+
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            values = tuple(getattr(self, attr) for attr in inputs)
+            if any(value is None for value in values):
+                return method(self, *args)
+
+            key = (values, _hashable(args))
+            with lock:
+                result = cache.get(key)
+                if result is not None:
+                    cache.move_to_end(key)
+            record_cache(name, hit=result is not None)
+            if result is None:
+                result = method(self, *args)
+                with lock:
+                    cache[key] = result
+                    while len(cache) > cache_size:
+                        cache.popitem(last=False)
+            return result.copy() if isinstance(result, (pd.DataFrame, pd.Series)) else result
+        return wrapper
+    return decorator
+
+
+def clear_section_caches():
+    for cache, lock in _section_caches:
+        with lock:
+            cache.clear()
+
+
+def fragment(method):
+    # Тело секции выполняется как фрагмент; время каждого выполнения (полного или только фрагмента)
+    # пишется в метрики под именем <Класс>.<метод>.fragment
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        stage_name = f"{type(self).__name__}.{method.__name__}.fragment"
+
+        def body():
+            with Stage(stage_name):
+                method(self, *args, **kwargs)
+
+        # Идентификатор фрагмента строится из имени функции и места вызова
+        body.__qualname__ = f"{method.__qualname__}.fragment"
+        body.__module__ = method.__module__
+        if get_script_run_ctx(suppress_warning=True) is None:
+            body()
+        else:
+            st.fragment(body)()
+    return wrapper
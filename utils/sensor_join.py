@@ -0,0 +1,126 @@
+# utils/sensor_join.py
+#
+# Почасовая таблица «нагрузка × воздух»: пассажиропоток и рейсы из куба и сводки датчиков
+# выравниваются на общую часовую сетку. Обе стороны отсортированы по времени, поэтому
+# сопоставление — один проход merge_asof (последнее показание не старше SENSOR_TOLERANCE),
+# без перекрёстных соединений и поиска по строкам.
+
+import threading
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.metrics import tracked_cache
+
+DEPARTURE = "Вылет"
+ARRIVAL = "Прилет"
+# Пропуск в показаниях датчиков дольше этого остаётся пустым, а не заполняется старым значением
+SENSOR_TOLERANCE = pd.Timedelta(hours=1)
+
+JOIN_COLUMNS = ["Timestamp", "passengers", "departures", "arrivals",
+                "temp_mean", "temp_max", "co2_mean", "co2_max"]
+
+
+def passenger_hourly(cells, start=None):
+    # Ячейки куба (или GROUP BY из БД) с Date, Hour, Departure_Arrival → почасовая сетка без пропусков
+    # (начиная со start, если задан): часы без рейсов входят в таблицу с нулями
+    direction = cells["Departure_Arrival"].astype(str)
+    frame = pd.DataFrame({
+        "Timestamp": cells["Date"] + pd.to_timedelta(cells["Hour"].astype("int64"), unit="h"),
+        "passengers": cells["pax_sum"].fillna(0),
+        "departures": cells["rows"].where(direction == DEPARTURE, 0),
+        "arrivals": cells["rows"].where(direction == ARRIVAL, 0),
+    })
+    hourly = frame.groupby("Timestamp", sort=True).sum()
+    if hourly.empty:
+        return hourly.reset_index()
+    first = hourly.index[0] if start is None else min(start, hourly.index[0])
+    grid = pd.date_range(first, hourly.index[-1], freq="h", name="Timestamp")
+    return (hourly.reindex(grid, fill_value=0)
+            .astype({"passengers": "int64", "departures": "int32", "arrivals": "int32"})
+            .reset_index())
+
+
+def sensor_hourly(rollup, prefix, rooms=None):
+    # Часовая сводка датчиков (utils/sensors.py) → среднее и максимум по выбранным помещениям
+    if rooms:
+        rollup = rollup[rollup["Room"].isin(rooms)]
+    grouped = rollup.groupby("Timestamp", sort=True).agg(sum=("sum", "sum"), count=("count", "sum"),
+                                                          max=("max", "max"))
+    return pd.DataFrame({
+        "Timestamp": grouped.index,
+        f"{prefix}_mean": (grouped["sum"] / grouped["count"]).astype(np.float32).to_numpy(),
+        f"{prefix}_max": grouped["max"].astype(np.float32).to_numpy(),
+    })
+
+
+def hourly_join(passengers, temperature, co2):
+    table = passengers
+    for sensor in (temperature, co2):
+        table = pd.merge_asof(table, sensor, on="Timestamp", direction="backward", tolerance=SENSOR_TOLERANCE)
+    return table[JOIN_COLUMNS]
+
+
+def _sensor_version(rollup):
+    # Сводки датчиков пересобираются целиком; их размер, граница и число показаний — дешёвая подпись
+    if rollup.empty:
+        return 0, None, 0
+    return len(rollup), rollup["Timestamp"].max(), int(rollup["count"].sum())
+
+
+def _changed_since(changed, version):
+    # Самый ранний день, ячейки которого изменились после версии version, или None, если неизвестно
+    if changed is None:
+        return None
+    _, _, rows = version.partition("+")
+    days = changed.index[changed.to_numpy() > (int(rows) if rows else -1)]
+    return days.min() if len(days) else None
+
+
+class SensorPassengerJoin:
+    # Объединённая таблица для набора помещений. Куб рейсов только дописывается (utils/ingest.py),
+    # поэтому при новых рейсах пересчитываются часы начиная с самого раннего дня, ячейки которого
+    # изменились (опоздавшая строка может попасть в давно объединённый день); при изменении датчиков
+    # или перезаписи источника рейсов таблица строится заново.
+
+    def __init__(self, rooms=None):
+        self.rooms = list(rooms) if rooms else None
+        self.table = None
+        self._passenger_version = None
+        self._sensor_versions = None
+        self._lock = threading.Lock()
+
+    def update(self, passenger_version, cells, temperature, co2, changed=None):
+        # passenger_version — версия снимка рейсов ("<sha256>" или "<sha256>+<строк>"); None — без кэша.
+        # changed — PassengerSnapshot.changed; без него таблица строится заново
+        sensor_versions = (_sensor_version(temperature), _sensor_version(co2))
+        with self._lock:
+            if (self.table is not None and passenger_version is not None
+                    and passenger_version == self._passenger_version and sensor_versions == self._sensor_versions):
+                return self.table
+
+            temp = sensor_hourly(temperature, "temp", self.rooms)
+            co2_hourly = sensor_hourly(co2, "co2", self.rooms)
+            appended = (self.table is not None and not self.table.empty and passenger_version is not None
+                        and self._passenger_version is not None and sensor_versions == self._sensor_versions
+                        and passenger_version.split("+")[0] == self._passenger_version.split("+")[0])
+            since = _changed_since(changed, self._passenger_version) if appended else None
+            if since is not None:
+                start = int(np.searchsorted(cells["Date"].to_numpy(), since.to_datetime64(), side="left"))
+                tail = hourly_join(passenger_hourly(cells.iloc[start:], since), temp, co2_hourly)
+                head = self.table[self.table["Timestamp"] < since]
+                table = pd.concat([head, tail], ignore_index=True)
+            else:
+                table = hourly_join(passenger_hourly(cells), temp, co2_hourly)
+
+            self.table = table
+            self._passenger_version = passenger_version
+            self._sensor_versions = sensor_versions
+            return table
+
+
+@tracked_cache(st.cache_resource(max_entries=16))
+def get_sensor_join(rooms):
+    # Объединённая таблица на набор помещений, общая для сессий; обновляется инкрементально
+    return SensorPassengerJoin(rooms)
@@ -0,0 +1,195 @@
+# utils/sensors.py
+
+import csv
+import logging
+import os
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import pyarrow.feather as feather
+
+from utils.file_cache import CACHE_DIR, cache_paths, cached_source_version, file_signature, write_meta
+from utils.metrics import record_cache, timed, tracked_cache
+
+logger = logging.getLogger(__name__)
+
+TEMPERATURE_CSV = "data/Средняя_температура_в_помещениях_Аэровокзала Приведенная.csv"
+CO2_CSV = "data/Средняя_CO2_в_помещениях_Аэровокзала Приведенная.csv"
+
+CHUNK_ROWS = 500_000
+
+# Разрешения предрасчитанных сводок по помещениям
+RESOLUTIONS = {"minute": "min", "hour": "h", "day": "D"}
+
+# Подсказки для поиска колонок времени и помещения по названию
+TIME_HINTS = ("дата", "время", "date", "time", "timestamp")
+ROOM_HINTS = ("помещение", "зона", "room", "датчик", "sensor", "location")
+
+# Форматы времени в выгрузках; формат выбирается по первому значению колонки
+TIME_FORMATS = ("%d.%m.%Y %H:%M:%S", "%d.%m.%Y %H:%M", "%d.%m.%Y",
+                "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M:%S", "%Y-%m-%d",
+                "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y")
+
+
+def _is_excel(path):
+    # Часть выгрузок — это xlsx с расширением .csv
+    with open(path, "rb") as f:
+        return f.read(2) == b"PK"
+
+
+def _csv_options(path):
+    with open(path, encoding="utf-8-sig", errors="replace") as f:
+        header = f.readline()
+    sep = csv.Sniffer().sniff(header, delimiters=",;\t").delimiter
+    # Русские выгрузки с разделителем «;» используют десятичную запятую
+    return {"sep": sep, "decimal": "," if sep == ";" else ".", "encoding": "utf-8-sig"}
+
+
+def _matching(columns, hints):
+    return [col for col in columns if any(hint in str(col).lower() for hint in hints)]
+
+
+def _iter_chunks(path):
+    if _is_excel(path):
+        yield pd.read_excel(path)
+        return
+    options = _csv_options(path)
+    header = pd.read_csv(path, nrows=0, **options).columns
+    time_cols = _matching(header, TIME_HINTS)
+    room_cols = _matching(header, ROOM_HINTS)
+    # Явные типы: время и помещение — строки, остальное — float32
+    dtypes = {col: (str if col in time_cols or col in room_cols else np.float32) for col in header}
+    yield from pd.read_csv(path, dtype=dtypes, chunksize=CHUNK_ROWS, **options)
+
+
+def _guess_format(sample):
+    for fmt in TIME_FORMATS:
+        try:
+            datetime.strptime(sample, fmt)
+            return fmt
+        except ValueError:
+            continue
+    return None
+
+
+def parse_timestamps(values):
+    # Явный формат разбирается векторно, format="mixed" угадывает формат каждой строки
+    # и на порядок медленнее — им разбираются только строки, не подошедшие под формат
+    strings = values.astype(str).str.strip()
+    present = values.notna() & ~strings.isin(["", "nan", "NaT", "nan nan"])
+    sample = strings[present]
+    fmt = _guess_format(sample.iloc[0]) if len(sample) else None
+    parsed = (pd.to_datetime(strings, format=fmt, errors="coerce") if fmt is not None
+              else pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]"))
+    failed = parsed.isna() & present
+    if failed.any():
+        parsed[failed] = pd.to_datetime(strings[failed], dayfirst=True, errors="coerce", format="mixed")
+    return parsed
+
+
+def _to_long(chunk):
+    # Приводим порцию к длинному виду Timestamp / Room / Value
+    time_cols = _matching(chunk.columns, TIME_HINTS)
+    room_cols = _matching(chunk.columns, ROOM_HINTS)
+    if not time_cols:
+        raise ValueError(f"Не найдена колонка времени среди {list(chunk.columns)}")
+
+    stamp = chunk[time_cols[0]].astype(str)
+    if len(time_cols) > 1:
+        # Дата и время в отдельных колонках
+        stamp = stamp + " " + chunk[time_cols[1]].astype(str)
+    timestamp = parse_timestamps(stamp)
+
+    value_cols = [col for col in chunk.columns if col not in time_cols and col not in room_cols]
+    if room_cols:
+        long_df = pd.DataFrame({
+            "Timestamp": timestamp,
+            "Room": chunk[room_cols[0]].astype(str),
+            "Value": pd.to_numeric(chunk[value_cols[0]], errors="coerce"),
+        })
+    else:
+        # Широкий формат: каждая числовая колонка — отдельное помещение
+        long_df = (chunk[value_cols].apply(pd.to_numeric, errors="coerce")
+                   .assign(Timestamp=timestamp)
+                   .melt(id_vars="Timestamp", var_name="Room", value_name="Value"))
+    long_df["Value"] = long_df["Value"].astype(np.float32)
+    return long_df.dropna(subset=["Timestamp", "Value"])
+
+
+def _partial_rollup(long_df, freq):
+    # Частичные агрегаты, которые можно складывать между порциями: sum, count, min, max
+    bucket = long_df["Timestamp"].dt.floor(freq)
+    return (long_df.groupby([long_df["Room"], bucket], observed=True)["Value"]
+            .agg(sum="sum", count="count", min="min", max="max")
+            .reset_index())
+
+
+def _combine(partials, freq):
+    bucket = partials["Timestamp"].dt.floor(freq)
+    combined = (partials.groupby([partials["Room"], bucket], observed=True)
+                .agg(sum=("sum", "sum"), count=("count", "sum"), min=("min", "min"), max=("max", "max"))
+                .reset_index())
+    return _compact(combined)
+
+
+def _compact(rollup):
+    return pd.DataFrame({
+        "Room": rollup["Room"].astype("category"),
+        "Timestamp": rollup["Timestamp"],
+        "mean": (rollup["sum"] / rollup["count"]).astype(np.float32),
+        "min": rollup["min"].astype(np.float32),
+        "max": rollup["max"].astype(np.float32),
+        "count": rollup["count"].astype(np.int32),
+        "sum": rollup["sum"].astype(np.float64),
+    })
+
+
+@timed("build_sensor_rollups")
+def build_rollups(path):
+    # Потоковое чтение: в памяти держим только текущую порцию и поминутные частичные агрегаты
+    partials = []
+    for chunk in _iter_chunks(path):
+        long_df = _to_long(chunk)
+        partials.append(_partial_rollup(long_df, RESOLUTIONS["minute"]))
+    partials = pd.concat(partials, ignore_index=True)
+
+    minute = _combine(partials, RESOLUTIONS["minute"])
+    rollups = {"minute": minute}
+    for name in ("hour", "day"):
+        rollups[name] = _combine(minute, RESOLUTIONS[name])
+    return rollups
+
+
+def _rollup_paths(path):
+    return {name: cache_paths(path, f"{name}.arrow")[0] for name in RESOLUTIONS}
+
+
+@tracked_cache(lru_cache(maxsize=8), "sensor_rollups")
+def _load_rollups(path, mtime_ns, size):
+    # Ключ кэша — идентичность файла (путь, mtime, размер), поэтому изменённый файл перечитывается
+    paths = _rollup_paths(path)
+    _, meta_path = cache_paths(path, "minute.arrow")
+    cached = (cached_source_version(path, paths["minute"], meta_path) is not None
+              and all(map(os.path.exists, paths.values())))
+    record_cache("sensor_arrow", hit=cached)
+    if cached:
+        rollups = {name: feather.read_feather(file) for name, file in paths.items()}
+        logger.info("Датасет '%s' загружен из кэша сводок", path)
+        return rollups
+
+    signature = file_signature(path)
+    rollups = build_rollups(path)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for name, frame in rollups.items():
+        feather.write_feather(frame, paths[name], compression="uncompressed")
+    write_meta(meta_path, signature)
+    logger.info("Датасет '%s' загружен, сводки по помещениям сохранены в кэш", path)
+    return rollups
+
+
+def load_sensor_rollups(path):
+    # Сводки по помещениям: {"minute" | "hour" | "day": Room, Timestamp, mean, min, max, count, sum}
+    stat = os.stat(path)
+    return _load_rollups(path, stat.st_mtime_ns, stat.st_size)
@@ -0,0 +1,99 @@
+# utils/sketch.py
+#
+# Квантильные скетчи задержек в духе DDSketch. Значение попадает в логарифмическую корзину
+# i = ceil(log_γ(x)), где γ = (1 + α) / (1 − α); представитель корзины — 2γ^i / (γ + 1).
+# Скетч ячейки — таблица частот корзин, скетчи сливаются простым сложением частот. Поэтому
+# квантиль при любом наборе фильтров считается по слитым корзинам, без просмотра рейсов.
+#
+# Отрицательные задержки (ранний вылет или прилёт) хранятся в отдельном диапазоне корзин
+# NEGATIVE_OFFSET + ceil(log_γ(−x)) с представителем −2γ^i / (γ + 1).
+#
+# Гарантия точности. Каждая порядковая статистика x с |x| >= MIN_VALUE заменяется
+# представителем своей корзины того же знака с ошибкой не больше α|x|; значения с |x| < MIN_VALUE
+# считаются нулём (ошибка меньше MIN_VALUE). Квантиль с линейной интерполяцией (как у
+# Series.quantile) — выпуклая комбинация двух соседних статистик, поэтому для статистик одного
+# знака ошибка не больше α относительно квантиля, а в общем случае — не больше
+# max(α·max(|x_k|, |x_k+1|), MIN_VALUE).
+
+import numpy as np
+import pandas as pd
+
+from utils.cube import merge_cube, weighted_quantile
+
+RELATIVE_ACCURACY = 0.01
+GAMMA = (1 + RELATIVE_ACCURACY) / (1 - RELATIVE_ACCURACY)
+# Минуты: всё, что меньше по модулю, попадает в нулевую корзину
+MIN_VALUE = 0.5
+ZERO_BUCKET = np.iinfo(np.int16).min
+# Начало диапазона отрицательных корзин. Номера положительных корзин по модулю меньше
+# NEGATIVE_OFFSET // 2 для любых значений до γ^8192, поэтому диапазоны не пересекаются
+NEGATIVE_OFFSET = 1 << 14
+
+# Ячейка скетча — дата × авиакомпания × час, плюс направление и отмена для фильтров страницы задержек.
+# Календарные колонки определяются датой и часом и не увеличивают число ячеек.
+SKETCH_CELL = ["Date", "Hour", "Year", "Quarter", "Season", "Month", "YearMonth", "Week", "DayOfWeek",
+               "TimeOfDay", "Airline_name", "Departure_Arrival", "IsCancelled"]
+SKETCH_KEYS = SKETCH_CELL + ["Bucket"]
+SKETCH_VALUE = "DelayTime"
+
+
+def bucket_of(values):
+    values = np.asarray(values, dtype="float64")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        buckets = np.ceil(np.log(np.abs(values)) / np.log(GAMMA))
+    buckets = np.select([values >= MIN_VALUE, values <= -MIN_VALUE],
+                        [buckets, NEGATIVE_OFFSET + buckets], ZERO_BUCKET)
+    return buckets.astype(np.int16)
+
+
+def bucket_value(buckets):
+    buckets = np.asarray(buckets).astype("int64")
+    negative = buckets >= NEGATIVE_OFFSET // 2
+    exponent = np.where(negative, buckets - NEGATIVE_OFFSET, buckets).astype("float64")
+    values = 2 * GAMMA ** exponent / (GAMMA + 1)
+    return np.select([buckets == ZERO_BUCKET, negative], [0.0, -values], values)
+
+
+def _bucket_counts(df, keys, value, weight=None):
+    # Частоты корзин по ключам; строки без значения не учитываются
+    df = df[df[value].notna()]
+    data = df[keys].assign(Bucket=bucket_of(df[value]),
+                           rows=df[weight].to_numpy(dtype="int64") if weight else 1)
+    return data.groupby(keys + ["Bucket"], observed=True, sort=False, dropna=False)["rows"].sum().reset_index()
+
+
+def build_sketch(df):
+    # Скетч по всем рейсам: ячейки × корзины задержки, упорядочен по дате, как куб
+    keys = [col for col in SKETCH_CELL if col in df.columns]
+    sketch = _bucket_counts(df, keys, SKETCH_VALUE)
+    return sketch.sort_values("Date", kind="stable", ignore_index=True)
+
+
+def merge_sketch(sketch, batch_sketch):
+    # Дописывает скетч новой порции; как и merge_cube, возвращает (скетч, число неизменных строк)
+    return merge_cube(sketch, batch_sketch, keys=[col for col in SKETCH_KEYS if col in sketch.columns])
+
+
+def sketch_from_counts(counts, by, weight="rows"):
+    # Скетч из таблицы частот значений (например, GROUP BY в БД): by + DelayTime + rows
+    return _bucket_counts(counts, list(by), SKETCH_VALUE, weight=weight)
+
+
+def sketch_quantiles(sketch, by, qs=(0.5, 0.9, 0.99)):
+    # Квантили задержки по группам by из слитых корзин: колонки by, rows, p50, p90, ...
+    by = list(by)
+    columns = [f"p{q * 100:g}" for q in qs]
+    merged = sketch.groupby(by + ["Bucket"], observed=True)["rows"].sum().reset_index()
+    merged = merged[merged["rows"] > 0]
+    if merged.empty:
+        return pd.DataFrame(columns=by + ["rows"] + columns)
+    merged = merged.assign(**{SKETCH_VALUE: bucket_value(merged["Bucket"])})
+
+    if by:
+        result = merged.groupby(by, observed=True, sort=True)["rows"].sum().reset_index()
+    else:
+        result = pd.DataFrame({"rows": [merged["rows"].sum()]})
+    for q, column in zip(qs, columns):
+        # weighted_quantile возвращает группы в том же порядке сортировки по by
+        result[column] = weighted_quantile(merged, by, SKETCH_VALUE, q)[SKETCH_VALUE].to_numpy()
+    return result
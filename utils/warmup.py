@@ -0,0 +1,108 @@
+# utils/warmup.py
+#
+# Прогрев при старте: все источники загружаются параллельно в пуле потоков, производные
+# структуры (индексы, куб, скетчи, объединение с датчиками) строятся, как только готовы их входы.
+# Страницы обращаются к тем же кэшам (st.cache_resource / st.cache_data), поэтому после прогрева
+# первый посетитель получает готовые данные, а время до первой полезной страницы ограничено
+# самым медленным источником, а не суммой всех.
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import streamlit as st
+
+from utils import db
+from utils.ingest import get_passenger_snapshot
+from utils.metrics import Stage, serve_from_env, silence_bare_mode
+from utils.complaints import get_complaints_store
+from utils.preprocessing import load_co2_data, load_temperature_data
+from utils.sensor_join import get_sensor_join
+
+logger = logging.getLogger(__name__)
+
+WARMUP_WORKERS = 4
+
+PENDING, RUNNING, DONE, FAILED = "ожидает", "загружается", "готово", "ошибка"
+
+
+def _sensor_join(passengers, temperature, co2):
+    return get_sensor_join(()).update(passengers.version, passengers.cube, temperature, co2, passengers.changed)
+
+
+# Задача: (название, функция, задачи-входы). Входы передаются функции по порядку.
+# В режиме БД рейсы не загружаются в процесс, поэтому их задачи пропускаются.
+TASKS = {
+    "passengers": ("Рейсы: таблица, индексы фильтров, куб и скетчи", get_passenger_snapshot, ()),
+    "temperature": ("Температура: сводки по помещениям", partial(load_temperature_data, "hour"), ()),
+    "co2": ("CO₂: сводки по помещениям", partial(load_co2_data, "hour"), ()),
+    "complaints": ("Жалобы: поисковый индекс и тренды терминов", get_complaints_store, ()),
+    "sensor_join": ("Нагрузка × воздух: почасовое объединение", _sensor_join,
+                    ("passengers", "temperature", "co2")),
+}
+DB_SKIPPED = {"passengers", "sensor_join"}
+
+
+class WarmUp:
+    def __init__(self, tasks=TASKS, workers=WARMUP_WORKERS):
+        self.tasks = {name: task for name, task in tasks.items()
+                      if not (db.is_configured() and name in DB_SKIPPED)}
+        self.status = {name: PENDING for name in self.tasks}
+        self.seconds = {}
+        self.errors = {}
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._futures = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warmup")
+        # Задачи отправляются в порядке зависимостей; задача с входами ждёт их в своём потоке
+        for name in self.tasks:
+            self._futures[name] = self._pool.submit(self._run, name)
+        self._pool.shutdown(wait=False)
+
+    def _run(self, name):
+        title, fn, inputs = self.tasks[name]
+        started = None
+        try:
+            args = [self._futures[dep].result() for dep in inputs]
+            with self._lock:
+                self.status[name] = RUNNING
+            started = time.perf_counter()
+            with Stage(f"warmup.{name}"):
+                result = fn(*args)
+        except Exception as error:
+            logger.exception("Прогрев '%s' не удался", title)
+            with self._lock:
+                self.status[name] = FAILED
+                self.errors[name] = f"{type(error).__name__}: {error}"
+                if started is not None:
+                    self.seconds[name] = time.perf_counter() - started
+            raise
+        with self._lock:
+            self.status[name] = DONE
+            self.seconds[name] = time.perf_counter() - started
+        return result
+
+    @property
+    def finished(self):
+        return all(status in (DONE, FAILED) for status in self.status.values())
+
+    def progress(self):
+        # Доля завершённых задач и таблица состояния для страницы
+        with self._lock:
+            rows = [{"Источник": self.tasks[name][0], "Состояние": status,
+                     "Время, с": round(self.seconds[name], 2) if name in self.seconds else None,
+                     "Ошибка": self.errors.get(name, "")}
+                    for name, status in self.status.items()]
+        done = sum(row["Состояние"] in (DONE, FAILED) for row in rows)
+        return done / max(len(rows), 1), rows
+
+
+@st.cache_resource
+def start_warmup():
+    # Один прогрев на процесс; вызывается с любой страницы и сразу возвращает управление.
+    # Потоки пула работают вне сеанса Streamlit — предупреждения об этом отключаем
+    silence_bare_mode()
+    serve_from_env()
+    return WarmUp()